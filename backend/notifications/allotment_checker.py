@@ -0,0 +1,274 @@
+"""
+Allotment results for subscribers with the "Allotment Out" preference.
+
+Around allotment day (utils/ipocalendar.py), every PAN or application
+number saved by a subscriber (`allotmentIds`) is checked with the IPO's
+registrar in batches. Batches run concurrently, paced by the host rate
+limiter in utils/http.py. Results are cached in `allotment_results`;
+final ones (allotted / not allotted) are never requested again, and each
+subscriber is emailed once per IPO when all their results are final.
+
+Registrars are reached through ALLOTMENT_API_URL, a service answering
+
+    POST <url>/check  {"registrar", "ipo", "ids": [...]}
+      -> {"results": [{"id", "status", "shares"}]}
+
+with status "allotted", "not_allotted" or "pending". --stub-registrar
+starts a local stand-in with deterministic results instead:
+
+    python3 allotment_checker.py --stub-registrar --dry-run
+"""
+import os
+import sys
+import json
+import time
+import zlib
+import hashlib
+import argparse
+import threading
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.mailer import send_email_report
+from utils.db import get_db
+from utils import http, ipocalendar, profiling, indexes
+from utils.metrics import current
+
+load_dotenv()
+
+RESULTS_COLLECTION = "allotment_results"
+FINAL_STATUSES = {"allotted", "not_allotted"}
+
+BATCH_SIZE = 25
+WORKERS = int(os.getenv("ALLOTMENT_WORKERS", "4"))
+
+# Results are often published the evening after the allotment date
+LOOKBACK_DAYS = 1
+
+# Registrar key -> words in the `values.registrar` text scraped for the IPO
+REGISTRARS = {
+    "linkintime": ["link intime", "mufg intime"],
+    "kfintech": ["kfin", "karvy"],
+    "bigshare": ["bigshare"],
+    "skyline": ["skyline"],
+    "cameo": ["cameo"],
+    "purva": ["purva"],
+    "maashitla": ["maashitla"],
+}
+
+
+def registrar_key(text):
+    text = (text or "").lower()
+    for key, words in REGISTRARS.items():
+        if any(word in text for word in words):
+            return key
+    return None
+
+
+def result_id(ipo_name, app_id):
+    # PANs are not stored in the clear in the results cache
+    return hashlib.sha256(f"{ipo_name}|{app_id.upper()}".encode()).hexdigest()
+
+
+def mask(app_id):
+    return app_id[:2] + "*" * max(len(app_id) - 4, 0) + app_id[-2:]
+
+
+# ---------------- CHECKING ----------------
+
+def allotment_ipos(db, today=None):
+    """IPOs whose allotment date is today or within LOOKBACK_DAYS, with their registrar"""
+    today = today or datetime.now(ipocalendar.IST).date()
+    names = [s["ipo_name"] for s in ipocalendar.between(
+        db, "allotment", today - timedelta(days=LOOKBACK_DAYS), today + timedelta(days=1), {"ipo_name": 1}
+    )]
+    if not names:
+        return []
+    return list(db.ipos.find({"ipo_name": {"$in": names}}, {"ipo_name": 1, "values.registrar": 1}))
+
+
+def subscribers(db):
+    return list(db.users.find({
+        "preferences.emailEnabled": True,
+        "preferences.allotmentOut": True,
+        "allotmentIds.0": {"$exists": True},
+    }, {"email": 1, "preferences.notificationEmail": 1, "allotmentIds": 1}))
+
+
+def check_batch(api_url, registrar, ipo_name, ids):
+    response = http.request("POST", f"{api_url.rstrip('/')}/check", timeout=30, json={
+        "registrar": registrar, "ipo": ipo_name, "ids": ids,
+    })
+    response.raise_for_status()
+    return response.json().get("results", [])
+
+
+def check_ipo(db, ipo, ids, api_url, dry_run=False):
+    """{id: result doc} for the given ids, asking the registrar only for non-final ones"""
+    from pymongo import UpdateOne
+
+    results = indexes.collection(db, RESULTS_COLLECTION)
+    name = ipo["ipo_name"]
+    by_key = {result_id(name, app_id): app_id for app_id in ids}
+    cached = {doc["_id"]: doc for doc in results.find({"_id": {"$in": list(by_key)}})}
+    found = {by_key[key]: doc for key, doc in cached.items() if doc["status"] in FINAL_STATUSES}
+
+    pending = [app_id for app_id in ids if app_id not in found]
+    registrar = registrar_key((ipo.get("values") or {}).get("registrar"))
+    if not pending:
+        return found
+    if registrar is None:
+        print(f"   ⚠️ {name}: unknown registrar, {len(pending)} ids not checked")
+        return found
+
+    batches = [pending[i:i + BATCH_SIZE] for i in range(0, len(pending), BATCH_SIZE)]
+    now = datetime.now(timezone.utc)
+    ops = []
+    with current().phase("fetch"), ThreadPoolExecutor(max_workers=WORKERS) as pool:
+        futures = [pool.submit(check_batch, api_url, registrar, name, batch) for batch in batches]
+        for future in futures:
+            try:
+                batch_results = future.result()
+            except Exception as e:
+                current().record_error()
+                print(f"   ❌ {name}: registrar batch failed ({e})")
+                continue
+            for result in batch_results:
+                app_id = result["id"]
+                doc = {
+                    "ipo_name": name,
+                    "masked_id": mask(app_id),
+                    "status": result.get("status", "pending"),
+                    "shares": result.get("shares", 0),
+                    "checked_at": now,
+                }
+                found[app_id] = dict(doc, _id=result_id(name, app_id))
+                ops.append(UpdateOne({"_id": result_id(name, app_id)}, {"$set": doc}, upsert=True))
+
+    if ops and not dry_run:
+        started = time.perf_counter()
+        with current().phase("write"):
+            results.bulk_write(ops, ordered=False)
+        current().record_write(len(ops), time.perf_counter() - started)
+    return found
+
+
+# ---------------- NOTIFYING ----------------
+
+def result_html(ipo_name, results):
+    rows = ""
+    for doc in results:
+        if doc["status"] == "allotted":
+            outcome = f"<span style='color: #16a34a; font-weight: 600;'>Allotted {doc.get('shares') or ''} shares</span>"
+        else:
+            outcome = "<span style='color: #6b7280;'>Not allotted</span>"
+        rows += f"<tr><td style='padding: 4px 12px 4px 0;'>{doc['masked_id']}</td><td>{outcome}</td></tr>"
+    return f"<h3 style='margin-top: 24px; color: #111827;'>{ipo_name}</h3><table style='font-size: 14px;'>{rows}</table>"
+
+
+def notify_user(db, user, ipo_name, results, dry_run=False):
+    """Emails one subscriber their final results for an IPO, once"""
+    email = (user.get("preferences") or {}).get("notificationEmail") or user.get("email")
+    if not email or any(user["_id"] in doc.get("notified", []) for doc in results):
+        return False
+
+    html_body = f"""
+    <div style="font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, Helvetica, Arial, sans-serif; max-width: 600px; margin: 0 auto; line-height: 1.5; color: #333; padding: 20px;">
+        <h2 style="color: #111827;">IPO Allotment Status</h2>
+        {result_html(ipo_name, results)}
+        <p style="font-size: 12px; color: #6b7280; margin-top: 24px;">Results as published by the registrar.</p>
+    </div>
+    """
+    if dry_run:
+        print(f"   📝 Dry run: would email {email} about {ipo_name}")
+        return True
+
+    with current().phase("send"):
+        success = send_email_report(f"IPO Radar: {ipo_name} allotment status", html_body, [email])
+    if success:
+        db[RESULTS_COLLECTION].update_many(
+            {"_id": {"$in": [doc["_id"] for doc in results]}},
+            {"$addToSet": {"notified": user["_id"]}}
+        )
+    return success
+
+
+def main(api_url=None, dry_run=False):
+    if not os.getenv("MONGO_URI"):
+        print("❌ MONGO_URI not found.")
+        return 0
+
+    api_url = api_url or os.getenv("ALLOTMENT_API_URL")
+    if not api_url:
+        print("ℹ️ ALLOTMENT_API_URL not set; allotment checks are disabled.")
+        return 0
+
+    db = get_db()
+    ipos = allotment_ipos(db)
+    if not ipos:
+        print("ℹ️ No IPOs with allotment today.")
+        return 0
+    users = subscribers(db)
+    ids = sorted({app_id.strip().upper() for user in users for app_id in user["allotmentIds"] if app_id.strip()})
+    print(f"🔎 Checking {len(ids)} ids from {len(users)} subscribers for {len(ipos)} IPOs")
+
+    sent = 0
+    for ipo in ipos:
+        found = check_ipo(db, ipo, ids, api_url, dry_run=dry_run)
+        final = sum(1 for doc in found.values() if doc["status"] in FINAL_STATUSES)
+        print(f"   {ipo['ipo_name']}: {final}/{len(ids)} final")
+
+        for user in users:
+            mine = [found.get(app_id.strip().upper()) for app_id in user["allotmentIds"] if app_id.strip()]
+            # Wait until every id of the user has its final result
+            if mine and all(doc and doc["status"] in FINAL_STATUSES for doc in mine):
+                if notify_user(db, user, ipo["ipo_name"], mine, dry_run=dry_run):
+                    sent += 1
+
+    print(f"✅ Sent {sent} allotment updates.")
+    return sent
+
+
+# ---------------- STAND-IN REGISTRAR ----------------
+
+def stub_result(ipo_name, app_id):
+    """Deterministic outcome: about one in four ids is allotted"""
+    if zlib.crc32(f"{ipo_name}|{app_id}".encode()) % 4 == 0:
+        return {"id": app_id, "status": "allotted", "shares": 1}
+    return {"id": app_id, "status": "not_allotted", "shares": 0}
+
+
+def serve_stub(port=0):
+    """Starts a local stand-in registrar in a thread; returns its base URL"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            body = json.dumps({"results": [stub_result(request["ipo"], app_id) for app_id in request["ids"]]}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check IPO allotment results for subscribers")
+    parser.add_argument("--dry-run", action="store_true", help="check but do not write results or send emails")
+    parser.add_argument("--stub-registrar", action="store_true", help="use a local stand-in registrar")
+    profiling.add_arguments(parser)
+    args = parser.parse_args()
+    profiling.enable_from_args(args)
+
+    with profiling.profile_from_env("allotment_checker"):
+        main(api_url=serve_stub() if args.stub_registrar else None, dry_run=args.dry_run)
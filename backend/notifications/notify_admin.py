@@ -1,10 +1,11 @@
 import os
 import sys
-from pymongo import MongoClient
 from dotenv import load_dotenv
 from datetime import datetime
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from utils.mailer import send_email_report
+from utils.db import get_db
+from utils import records
 
 load_dotenv()
 
@@ -14,31 +15,27 @@ def get_admin_email():
 
 def send_scraper_summary():
     """Send summary email about scraping results and potential duplicates"""
-    mongo_uri = os.getenv("MONGO_URI")
-    if not mongo_uri:
+    if not os.getenv("MONGO_URI"):
         print("❌ MONGO_URI not found.")
         return
 
-    # Fix SSL issues with Python 3.13
-    import certifi
-    client = MongoClient(mongo_uri, tlsCAFile=certifi.where())
-    db = client["ipo-radar"]
+    db = get_db()
     ipos_collection = db["ipos"]
 
-    # Get all IPOs
-    all_ipos = list(ipos_collection.find())
+    # Get all IPOs (names and statuses only)
+    all_ipos = records.load(ipos_collection, fields=["name", "status"])
     
     # Count by status
-    open_count = len([ipo for ipo in all_ipos if ipo.get('status') == 'open'])
-    upcoming_count = len([ipo for ipo in all_ipos if ipo.get('status') == 'upcoming'])
-    closed_count = len([ipo for ipo in all_ipos if ipo.get('status') == 'closed'])
+    open_count = len([ipo for ipo in all_ipos if ipo.status == 'open'])
+    upcoming_count = len([ipo for ipo in all_ipos if ipo.status == 'upcoming'])
+    closed_count = len([ipo for ipo in all_ipos if ipo.status == 'closed'])
     
     # Detect potential duplicates (simple name similarity check)
     potential_duplicates = []
     seen = {}
     
     for ipo in all_ipos:
-        name = ipo.get('ipo_name', '')
+        name = ipo.name
         # Create a simplified key for comparison
         simple_key = name.lower().replace('&', 'and').replace(' ', '').replace('-', '')
         
@@ -47,11 +44,11 @@ def send_scraper_summary():
                 'existing': seen[simple_key],
                 'duplicate': name,
                 'existing_id': seen[simple_key + '_id'],
-                'duplicate_id': str(ipo['_id'])
+                'duplicate_id': str(ipo.id)
             })
         else:
             seen[simple_key] = name
-            seen[simple_key + '_id'] = str(ipo['_id'])
+            seen[simple_key + '_id'] = str(ipo.id)
     
     # Build email
     html_body = f"""
@@ -0,0 +1,146 @@
+"""
+Sharded subscriber digests through the Mongo job queue (utils/jobqueue.py).
+
+Every user has a `notifyBucket` (0..NOTIFY_BUCKETS-1) derived from their
+_id, set by server.js on sign-up and backfilled here for older users.
+Subscribers are split into NOTIFY_SHARDS disjoint sets of buckets, so a
+shard's subscribers come straight from the users index. Every process
+started for the same slot (one per hour, UTC) queues the same shard
+jobs, which only creates the ones that are missing, then sends shards it
+leases until none is left:
+
+    NOTIFY_SHARDS=16 python3 notify_subscribers.py          # on each host
+    python3 notify_subscribers.py --shards 16
+
+Each shard records the last subscriber it handled, so a shard whose
+worker died is resumed by the next worker after that subscriber.
+"""
+import os
+import sys
+from datetime import datetime, timezone
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.db import get_db
+from utils import jobqueue, indexes
+from utils.metrics import current
+
+SHARD_COLLECTION = "notify_shards"
+SOURCE = "notify"
+USER_BATCH = 200
+NOTIFY_BUCKETS = 1024     # must match server.js; also the most shards there can be
+
+
+def slot_key(now=None):
+    """Scheduled runs in the same hour share one set of shards"""
+    now = now or datetime.now(timezone.utc)
+    return now.strftime("%Y-%m-%dT%H")
+
+
+def notify_bucket(user_id):
+    # Low bits of the ObjectId counter: stable, evenly spread, and cheap to
+    # compute in server.js as well
+    return int(str(user_id)[-6:], 16) % NOTIFY_BUCKETS
+
+
+def backfill_buckets(users_collection):
+    """Sets notifyBucket on subscribers created before it existed; returns how many"""
+    from pymongo import UpdateOne
+
+    ops = [
+        UpdateOne({"_id": doc["_id"]}, {"$set": {"notifyBucket": notify_bucket(doc["_id"])}})
+        for doc in users_collection.find(
+            {"preferences.emailEnabled": True, "notifyBucket": {"$exists": False}}, {"_id": 1})
+    ]
+    if ops:
+        users_collection.bulk_write(ops, ordered=False)
+    return len(ops)
+
+
+def enqueue_slot(jobs, slot, shards):
+    payloads = [{"key": f"{slot}/{shard}", "slot": slot, "shard": shard, "shards": shards} for shard in range(shards)]
+    return jobqueue.enqueue(jobs, SOURCE, payloads, url_key="key", reset=False)
+
+
+def shard_user_ids(users_collection, shard, shards, after=None):
+    """Enabled subscribers of one shard, in _id order, after the checkpoint"""
+    buckets = list(range(shard, NOTIFY_BUCKETS, shards))
+    query = {"preferences.emailEnabled": True, "notifyBucket": {"$in": buckets}}
+    if after is not None:
+        query["_id"] = {"$gt": after}
+    return [doc["_id"] for doc in users_collection.find(query, {"_id": 1}).sort("_id", 1)]
+
+
+def send_shard(db, jobs, job, worker, beat, open_ipos, calendar):
+    from notifications.notify_subscribers import notify_user
+
+    users_collection = db["users"]
+    payload = job["payload"]
+    progress = job.get("progress") or {"last_id": None, "sent": 0}
+    user_ids = shard_user_ids(users_collection, payload["shard"], payload["shards"], progress["last_id"])
+
+    if progress["last_id"] is not None:
+        print(f"   ↩️ Resuming after {progress['last_id']} ({progress['sent']} sent so far)")
+
+    for i in range(0, len(user_ids), USER_BATCH):
+        batch = users_collection.find({"_id": {"$in": user_ids[i:i + USER_BATCH]}}).sort("_id", 1)
+        for user in batch:
+            if beat.lost.is_set():
+                return progress
+            if notify_user(user, users_collection, open_ipos, calendar):
+                progress["sent"] += 1
+            progress["last_id"] = user["_id"]
+            jobqueue.checkpoint(jobs, job, worker, progress)
+    return progress
+
+
+def run_sharded(shards, slot=None):
+    from notifications.notify_subscribers import load_digest_data
+
+    db = get_db()
+    jobs = db[SHARD_COLLECTION]
+    jobqueue.ensure_indexes(jobs)
+    worker = jobqueue.worker_name()
+    slot = slot or slot_key()
+    shards = min(shards, NOTIFY_BUCKETS)
+
+    # The users index on (emailEnabled, notifyBucket, _id) serves the shard queries
+    backfilled = backfill_buckets(indexes.collection(db, "users"))
+    if backfilled:
+        print(f"🪣 Assigned notify buckets to {backfilled} subscribers")
+
+    queued = enqueue_slot(jobs, slot, shards)
+    print(f"👷 Worker {worker}: slot {slot}, {shards} shards ({queued} newly queued)")
+
+    open_ipos, calendar = load_digest_data(db)
+    total_sent = 0
+
+    while True:
+        jobqueue.reap(jobs)
+        job = jobqueue.claim(jobs, worker, [SOURCE])
+        if job is None:
+            break
+        if job["payload"]["slot"] != slot:
+            # Left over from an earlier slot: the current run supersedes it
+            jobqueue.complete(jobs, job, worker)
+            continue
+
+        print(f"[shard {job['payload']['shard']}/{shards}] attempt {job['attempts']}")
+        with jobqueue.Heartbeat(jobs, job, worker) as beat:
+            try:
+                progress = send_shard(db, jobs, job, worker, beat, open_ipos, calendar)
+                error = None
+            except Exception as e:
+                error = e
+
+        if beat.lost.is_set():
+            print("   ⚠️ Lease lost; another worker owns this shard now")
+        elif error is not None:
+            current().record_error()
+            print(f"   ❌ {error}")
+            jobqueue.fail(jobs, job, worker, error)
+        else:
+            total_sent += progress["sent"]
+            jobqueue.complete(jobs, job, worker)
+
+    print(f"✅ Sent updates to {total_sent} subscribers from this worker ({jobqueue.counts(jobs).get(SOURCE, {})})")
+    return total_sent
@@ -2,11 +2,16 @@ import os
 import time
 import datetime
 from dateutil import parser
-from pymongo import MongoClient
 from dotenv import load_dotenv
 import sys
+import argparse
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from utils.mailer import send_email_report
+from utils.db import get_db
+from utils import profiling
+from utils.metrics import current
+from utils.summaries import SUMMARIES_COLLECTION
+from utils import ipocalendar, records
 
 load_dotenv()
 
@@ -61,18 +66,11 @@ def should_notify(user):
         
     return False
 
-def get_market_sentiment(db):
-    open_ipos = list(db.ipos.find({"status": "open"}))
-    total_subscriptions = 0
-    count = 0
-    for ipo in open_ipos:
-        sub = ipo.get('values', {}).get('overall subscription', '0')
-        try:
-            val = float(sub.split('x')[0].replace(',',''))
-            total_subscriptions += val
-            count += 1
-        except:
-            pass
+def get_market_sentiment(open_ipos):
+    """Mood of the market from the average subscription of open IPOs (IPORecords)"""
+    subscriptions = [ipo.subscription_times for ipo in open_ipos if ipo.subscription_times is not None]
+    total_subscriptions = sum(subscriptions)
+    count = len(subscriptions)
     avg_sub = (total_subscriptions / count) if count > 0 else 0
     if avg_sub > 50: return "Euphoric 🚀🚀"
     if avg_sub > 10: return "Bullish 🚀"
@@ -80,22 +78,14 @@ def get_market_sentiment(db):
     return "Bearish 📉"
 
 def get_ipo_card_html(ipo):
-    v = ipo.get('values', {})
-    name = ipo['ipo_name']
-    gmp = v.get('gmp', v.get('gmp(₹)', 'N/A'))
-    sub = v.get('subscription', v.get('overall subscription', 'N/A'))
-    price = v.get('price band') or v.get('issue price') or 'TBA'
-    
-    # Extract close date
-    ipo_date_range = v.get('ipo date', '')
-    close_date = 'TBA'
-    if ipo_date_range and ' to ' in str(ipo_date_range):
-        try:
-            close_date = ipo_date_range.split(' to ')[1].strip()
-        except:
-            close_date = ipo_date_range
-            
-    detail_link = f"https://iporadar.vercel.app/ipo/{ipo['_id']}"
+    """Card for one IPORecord (see utils/records.py)"""
+    name = ipo.name
+    gmp = ipo.gmp or 'N/A'
+    sub = ipo.subscription or 'N/A'
+    price = ipo.price or 'TBA'
+    close_date = ipo.close_date or 'TBA'
+
+    detail_link = f"https://iporadar.vercel.app/ipo/{ipo.id}"
     
     gmp_color = 'green' if '₹' in str(gmp) and str(gmp) != 'N/A' else '#666'
 
@@ -128,18 +118,142 @@ def get_ipo_card_html(ipo):
     </div>
     """
 
-def main():
-    mongo_uri = os.getenv("MONGO_URI")
-    if not mongo_uri:
+def load_digest_data(db):
+    """Open IPOs and this run's calendar as IPORecords, shared by every digest of a run"""
+    projection = records.SUMMARY_PROJECTION
+    with current().phase("query"):
+        # Compact list-view documents, not the full IPOs with their raw HTML
+        open_ipos = records.load_summaries(db[SUMMARIES_COLLECTION], {"status": "open"})
+        calendar = {
+            "closing": records.from_summaries(ipocalendar.closing_within(db, hours=24, projection=projection)),
+            "allotment": records.from_summaries(ipocalendar.allotment_on(db, ipocalendar.tomorrow(), projection)),
+            "listing": records.from_summaries(ipocalendar.listing_on(db, projection=projection)),
+        }
+    return open_ipos, calendar
+
+
+def notify_user(user, users_collection, open_ipos, calendar):
+    """Builds and sends one subscriber's digest; True if an email went out"""
+    prefs = user.get('preferences', {})
+    email = prefs.get('notificationEmail') or user.get('email')
+    
+    if not email: 
+        return False
+
+    # Frequency Check
+    if not should_notify(user):
+        print(f"Skipping {email} (Frequency limit)")
+        return False
+
+    # Build Content based on Choices
+    content_parts = []
+    has_content = False
+
+    # Header with proper DOCTYPE and meta tags
+    html_body = """
+    <!DOCTYPE html>
+    <html lang="en">
+    <head>
+        <meta charset="UTF-8">
+        <meta name="viewport" content="width=device-width, initial-scale=1.0">
+        <title>IPO Radar Update</title>
+    </head>
+    <body style="margin: 0; padding: 0; background-color: #f9fafb;">
+    <div style="font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, Helvetica, Arial, sans-serif; max-width: 600px; margin: 0 auto; line-height: 1.5; color: #333; background-color: #ffffff; padding: 20px;">
+        <h2 style="margin-bottom: 20px; color: #111827;">IPO Radar Update</h2>
+    """
+
+    # Section: New / Open IPOs (Max 5)
+    if prefs.get('newIPOs', True) and open_ipos:
+        section_html = "<h3 style='color: #16a34a; margin-top: 24px;'>🟢 Open Now</h3>"
+        total_open = len(open_ipos)
+        for ipo in open_ipos[:5]:  # Show max 5
+            section_html += get_ipo_card_html(ipo)
+        
+        # Add link if more than 5
+        if total_open > 5:
+            section_html += f"""
+            <div style="text-align: center; margin: 16px 0;">
+                <a href="https://iporadar.vercel.app" style="display: inline-block; padding: 12px 24px; background-color: #2563eb; color: #ffffff; text-decoration: none; border-radius: 6px; font-weight: 500;">
+                    View All {total_open} Open IPOs →
+                </a>
+            </div>
+            """
+        
+        html_body += section_html
+        has_content = True
+
+    # Section: Closing within a day (indexed lookup on dates.close)
+    if prefs.get('closingSoon', False) and calendar['closing']:
+        section_html = "<h3 style='color: #dc2626; margin-top: 24px;'>⏰ Closing Soon</h3>"
+        for ipo in calendar['closing'][:5]:  # Show max 5
+            section_html += get_ipo_card_html(ipo)
+        html_body += section_html
+        has_content = True
+
+    # Section: Allotment tomorrow / listing today (indexed lookups on dates.*)
+    if prefs.get('listingDate', False) and (calendar['allotment'] or calendar['listing']):
+        section_html = "<h3 style='color: #2563eb; margin-top: 24px;'>🔵 Allotment & Listing</h3>"
+        for ipo in calendar['listing'][:5]:
+            section_html += f"<p style='margin: 8px 0; color: #374151;'>🔔 <b>{ipo.name}</b> lists today</p>"
+        for ipo in calendar['allotment'][:5]:
+            section_html += f"<p style='margin: 8px 0; color: #374151;'>📋 <b>{ipo.name}</b> allotment is tomorrow</p>"
+        html_body += section_html
+        has_content = True
+
+    # Footer
+    unsubscribe_link = f"https://iporadar.vercel.app/unsubscribe?email={email}"
+    html_body += f"""
+        <hr style="margin-top: 30px; border: none; border-top: 1px solid #e5e7eb;">
+        <div style="font-size: 12px; color: #6b7280; text-align: center; padding: 16px 0;">
+            <p style="margin: 0 0 8px 0;">
+                You are receiving this because you subscribed to IPO Radar updates.
+            </p>
+            <p style="margin: 0;">
+                <a href="https://iporadar.vercel.app" style="color: #2563eb; text-decoration: none;">Manage Preferences</a>
+                &nbsp;•&nbsp;
+                <a href="{unsubscribe_link}" style="color: #6b7280; text-decoration: none;">Unsubscribe</a>
+            </p>
+            <p style="margin: 8px 0 0 0; color: #9ca3af; font-size: 11px;">
+                IPO Radar • Daily IPO Updates • India
+            </p>
+        </div>
+    </div>
+    </body>
+    </html>
+    """
+
+    if has_content:
+        print(f"📧 Sending update to {email}...")
+        subject = f"IPO Radar: Daily Update ({datetime.datetime.now().strftime('%d %b')})"
+        with current().phase("send"):
+            success = send_email_report(subject, html_body, [email])
+        
+        if success:
+            # Update last sent timestamp
+            users_collection.update_one(
+                {"_id": user["_id"]},
+                {"$set": {"preferences.lastNotificationSentAt": datetime.datetime.now(datetime.timezone.utc)}}
+            )
+        return success
+    else:
+        print(f"Skipping {email} (No relevant content match)")
+        return False
+
+
+def main(shards=None):
+    if not os.getenv("MONGO_URI"):
         print("❌ MONGO_URI not found.")
         return
 
-    # Fix SSL issues with Python 3.13
-    import certifi
-    client = MongoClient(mongo_uri, tlsCAFile=certifi.where())
-    db = client["ipo-radar"]
+    # Several processes/hosts share the fan-out when sharding is enabled
+    shards = shards or int(os.getenv("NOTIFY_SHARDS", "0"))
+    if shards:
+        from notifications.notify_shards import run_sharded
+        return run_sharded(shards)
+
+    db = get_db()
     users_collection = db["users"]
-    ipos_collection = db["ipos"]
 
     # 1. Fetch Candidates
     subscribers = list(users_collection.find({
@@ -154,123 +268,22 @@ def main():
     print(f"found {len(subscribers)} potential subscribers.")
 
     # 2. Pre-fetch Data
-    open_ipos = list(ipos_collection.find({"status": "open"}))
-    upcoming_ipos = list(ipos_collection.find({"status": "upcoming"}))
-    sentiment = get_market_sentiment(db)
+    open_ipos, calendar = load_digest_data(db)
 
     count_sent = 0
 
     for user in subscribers:
-        prefs = user.get('preferences', {})
-        email = prefs.get('notificationEmail') or user.get('email')
-        
-        if not email: 
-            continue
-
-        # Frequency Check
-        if not should_notify(user):
-            print(f"Skipping {email} (Frequency limit)")
-            continue
-
-        # Build Content based on Choices
-        content_parts = []
-        has_content = False
-
-        # Header with proper DOCTYPE and meta tags
-        html_body = """
-        <!DOCTYPE html>
-        <html lang="en">
-        <head>
-            <meta charset="UTF-8">
-            <meta name="viewport" content="width=device-width, initial-scale=1.0">
-            <title>IPO Radar Update</title>
-        </head>
-        <body style="margin: 0; padding: 0; background-color: #f9fafb;">
-        <div style="font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, Helvetica, Arial, sans-serif; max-width: 600px; margin: 0 auto; line-height: 1.5; color: #333; background-color: #ffffff; padding: 20px;">
-            <h2 style="margin-bottom: 20px; color: #111827;">IPO Radar Update</h2>
-        """
-
-        # Section: New / Open IPOs (Max 5)
-        if prefs.get('newIPOs', True) and open_ipos:
-            section_html = "<h3 style='color: #16a34a; margin-top: 24px;'>🟢 Open Now</h3>"
-            total_open = len(open_ipos)
-            for ipo in open_ipos[:5]:  # Show max 5
-                section_html += get_ipo_card_html(ipo)
-            
-            # Add link if more than 5
-            if total_open > 5:
-                section_html += f"""
-                <div style="text-align: center; margin: 16px 0;">
-                    <a href="https://iporadar.vercel.app" style="display: inline-block; padding: 12px 24px; background-color: #2563eb; color: #ffffff; text-decoration: none; border-radius: 6px; font-weight: 500;">
-                        View All {total_open} Open IPOs →
-                    </a>
-                </div>
-                """
-            
-            html_body += section_html
-            has_content = True
-
-        # Section: Upcoming / Listing Date (Max 5)
-        if (prefs.get('listingDate', False) or prefs.get('closingSoon', False)) and upcoming_ipos:
-            section_html = "<h3 style='color: #2563eb; margin-top: 24px;'>🔵 Upcoming & Listing Soon</h3>"
-            total_upcoming = len(upcoming_ipos)
-            shown_any = False
-            for ipo in upcoming_ipos[:5]:  # Show max 5
-                section_html += get_ipo_card_html(ipo)
-                shown_any = True
-            
-            # Add link if more than 5
-            if total_upcoming > 5:
-                section_html += f"""
-                <div style="text-align: center; margin: 16px 0;">
-                    <a href="https://iporadar.vercel.app" style="display: inline-block; padding: 12px 24px; background-color: #2563eb; color: #ffffff; text-decoration: none; border-radius: 6px; font-weight: 500;">
-                        View All {total_upcoming} Upcoming IPOs →
-                    </a>
-                </div>
-                """
-            
-            if shown_any:
-                html_body += section_html
-                has_content = True
-
-        # Footer
-        unsubscribe_link = f"https://iporadar.vercel.app/unsubscribe?email={email}"
-        html_body += f"""
-            <hr style="margin-top: 30px; border: none; border-top: 1px solid #e5e7eb;">
-            <div style="font-size: 12px; color: #6b7280; text-align: center; padding: 16px 0;">
-                <p style="margin: 0 0 8px 0;">
-                    You are receiving this because you subscribed to IPO Radar updates.
-                </p>
-                <p style="margin: 0;">
-                    <a href="https://iporadar.vercel.app" style="color: #2563eb; text-decoration: none;">Manage Preferences</a>
-                    &nbsp;•&nbsp;
-                    <a href="{unsubscribe_link}" style="color: #6b7280; text-decoration: none;">Unsubscribe</a>
-                </p>
-                <p style="margin: 8px 0 0 0; color: #9ca3af; font-size: 11px;">
-                    IPO Radar • Daily IPO Updates • India
-                </p>
-            </div>
-        </div>
-        </body>
-        </html>
-        """
-
-        if has_content:
-            print(f"📧 Sending update to {email}...")
-            subject = f"IPO Radar: Daily Update ({datetime.datetime.now().strftime('%d %b')})"
-            success = send_email_report(subject, html_body, [email])
-            
-            if success:
-                count_sent += 1
-                # Update last sent timestamp
-                users_collection.update_one(
-                    {"_id": user["_id"]},
-                    {"$set": {"preferences.lastNotificationSentAt": datetime.datetime.now(datetime.timezone.utc)}}
-                )
-        else:
-            print(f"Skipping {email} (No relevant content match)")
+        if notify_user(user, users_collection, open_ipos, calendar):
+            count_sent += 1
 
     print(f"✅ Sent updates to {count_sent} subscribers.")
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Send IPO digest emails to subscribers")
+    parser.add_argument("--shards", type=int, help="split subscribers into this many leased shards (or set NOTIFY_SHARDS)")
+    profiling.add_arguments(parser)
+    args = parser.parse_args()
+    profiling.enable_from_args(args)
+
+    with profiling.profile_from_env("notify_subscribers"):
+        main(shards=args.shards)
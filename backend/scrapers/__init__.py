@@ -0,0 +1 @@
+"""IPO Radar scrapers. Run `python -m scrapers --help` from backend/."""
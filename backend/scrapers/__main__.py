@@ -0,0 +1,169 @@
+"""
+Unified scraper entry point.
+
+    cd backend
+    python -m scrapers chittorgarh [--dry-run]
+    python -m scrapers status                 # status-only refresh
+    python -m scrapers chittorgarh --profile --profile-phases parse
+    python -m scrapers check-startup          # enforce start-up budgets
+    python -m scrapers chittorgarh --backfill --max-seconds 3600
+    python -m scrapers groww --enqueue        # queue one job per page
+    python -m scrapers queue-worker --sources chittorgarh,groww
+    python -m scrapers bench-parse            # parser backends on saved pages
+    python -m scrapers price-watch            # live prices of listed IPOs
+    python -m scrapers groww --record         # save responses for --replay
+
+Only the selected scraper module is imported, and each module defers
+browser, Mongo and parser imports until they are first needed.
+"""
+import os
+import sys
+import time
+import argparse
+import importlib
+import subprocess
+
+from utils import profiling, transport
+
+STARTED = time.perf_counter()
+
+# source -> (module, function)
+SOURCES = {
+    "chittorgarh": ("scrapers.chittorgarh_scraper", "main"),
+    "investorgain": ("scrapers.investorgain_scraper", "main"),
+    "sptulsian": ("scrapers.sptulsian_scraper", "main"),
+    "groww": ("scrapers.groww_scraper", "main"),
+    "status": ("scrapers.chittorgarh_scraper", "refresh_statuses"),
+}
+
+# Sources whose pages can be processed as queue jobs
+QUEUE_SOURCES = ["chittorgarh", "investorgain", "sptulsian", "groww"]
+
+# Wall-clock budget for start-up and command resolution (ms), on top of a
+# bare interpreter start, which depends on the machine and its site-packages
+STARTUP_BUDGET_MS = {
+    "status": 100,
+}
+DEFAULT_STARTUP_BUDGET_MS = 200
+
+# Must not be imported before a command actually scrapes
+HEAVY_MODULES = ["selenium", "pymongo", "bs4", "lxml"]
+
+
+def resolve(source):
+    module_name, func_name = SOURCES[source]
+    return getattr(importlib.import_module(module_name), func_name)
+
+
+def startup_budget_ms(source):
+    return STARTUP_BUDGET_MS.get(source, DEFAULT_STARTUP_BUDGET_MS)
+
+
+def _run_ms(args):
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable] + args, cwd=backend_dir, capture_output=True, text=True)
+    return (time.perf_counter() - started) * 1000, result
+
+
+def measure_startup(source, rounds=3):
+    """
+    (ms over a bare interpreter, CompletedProcess): the command started in
+    a fresh interpreter with --startup-only, which resolves its entry point
+    and exits. Best of `rounds`, to keep scheduler noise out.
+    """
+    bare = min(_run_ms(["-c", "pass"])[0] for _ in range(rounds))
+    runs = [_run_ms(["-m", "scrapers", source, "--startup-only"]) for _ in range(rounds)]
+    elapsed, result = min(runs, key=lambda run: run[0])
+    return max(elapsed - bare, 0.0), result
+
+
+def check_startup():
+    """Fails if any command exceeds its start-up budget (see tests/test_startup.py)"""
+    failures = 0
+
+    for source in SOURCES:
+        budget = startup_budget_ms(source)
+        elapsed_ms, result = measure_startup(source)
+
+        ok = result.returncode == 0 and elapsed_ms <= budget
+        icon = "✅" if ok else "❌"
+        print(f"{icon} {source}: {elapsed_ms:.0f} ms (budget {budget} ms)")
+        if result.returncode != 0:
+            print(result.stderr[-500:])
+        if not ok:
+            failures += 1
+
+    return 1 if failures else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m scrapers", description="Run an IPO Radar scraper")
+    parser.add_argument("source", choices=sorted(SOURCES) + ["check-startup", "queue-worker", "bench-parse", "price-watch"])
+    parser.add_argument("--dry-run", action="store_true", help="scrape but do not write to MongoDB")
+    parser.add_argument("--enqueue", action="store_true", help="queue the source's pages as jobs instead of scraping them")
+    parser.add_argument("--sources", default=",".join(QUEUE_SOURCES), help="queue-worker: sources to consume")
+    parser.add_argument("--exit-when-idle", action="store_true", help="queue-worker: stop once no job is available")
+    parser.add_argument("--backfill", action="store_true", help="chittorgarh: load every IPO from the year-wise archive")
+    parser.add_argument("--from-year", type=int, help="backfill: oldest archive year")
+    parser.add_argument("--max-seconds", type=int, help="backfill: stop (resumably) after this long; price-watch: run this long")
+    parser.add_argument("--workers", type=int, default=4, help="backfill: concurrent detail pages")
+    parser.add_argument("--pages", help="bench-parse: directory of saved pages (default logs/pages)")
+    parser.add_argument("--repeat", type=int, default=3, help="bench-parse: timing rounds per backend")
+    parser.add_argument("--stub", action="store_true", help="price-watch: simulated quotes instead of Yahoo Finance")
+    parser.add_argument("--startup-only", action="store_true", help=argparse.SUPPRESS)
+    profiling.add_arguments(parser)
+    transport.add_arguments(parser)
+    args = parser.parse_args(argv)
+    profiling.enable_from_args(args)
+    transport.enable_from_args(args)
+
+    if args.source == "check-startup":
+        return check_startup()
+
+    if args.source == "bench-parse":
+        from utils import parsing
+        results = parsing.benchmark(args.pages or parsing.PAGES_DIR, repeat=args.repeat)
+        return 0 if results else 1
+
+    if args.source == "price-watch":
+        from scrapers import price_watcher
+        price_watcher.main(dry_run=args.dry_run, stub=args.stub, max_seconds=args.max_seconds)
+        return 0
+
+    if args.source == "queue-worker":
+        from scrapers import queue_worker
+        queue_worker.run(args.sources.split(","), exit_when_idle=args.exit_when_idle, dry_run=args.dry_run)
+        return 0
+
+    if args.backfill:
+        if args.source != "chittorgarh":
+            parser.error("--backfill is only supported for chittorgarh")
+        from scrapers import chittorgarh_scraper
+        kwargs = {"max_seconds": args.max_seconds, "workers": args.workers}
+        if args.from_year:
+            kwargs["from_year"] = args.from_year
+        chittorgarh_scraper.backfill(dry_run=args.dry_run, **kwargs)
+        return 0
+
+    if args.enqueue:
+        if args.source not in QUEUE_SOURCES:
+            parser.error(f"{args.source} cannot be queued")
+        from scrapers import queue_worker
+        queue_worker.enqueue_source(args.source, dry_run=args.dry_run)
+        return 0
+
+    func = resolve(args.source)
+
+    if args.startup_only:
+        heavy = [name for name in HEAVY_MODULES if name in sys.modules]
+        print(f"{args.source}: ready in {(time.perf_counter() - STARTED) * 1000:.1f} ms")
+        print(f"heavy modules: {','.join(heavy) or '-'}")
+        return 0
+
+    func(dry_run=args.dry_run)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,40 +1,65 @@
-import requests
-from bs4 import BeautifulSoup
 from datetime import datetime
 import json
 import time
 import re
-from pymongo import MongoClient
 import os
+import sys
 from dotenv import load_dotenv
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.db import get_collection
+from utils import http
+from utils.metrics import current, recorded_run
+from utils.store import save_ipo
+from utils.staging import normalize
+from utils.parsing import parse
+from utils.indexes import ensure_indexes
+from utils.ratelimit import CircuitOpenError
+
+# requests / bs4 / pymongo are imported on first use so that
+# `python -m scrapers` commands start without paying for them
 
 load_dotenv()
 
 BASE_URL = "https://www.chittorgarh.com"
 LIST_URL = "https://www.chittorgarh.com/ipo/ipo_dashboard.asp"
 HEADERS = {"User-Agent": "Mozilla/5.0"}
-DELAY = 1.2
+
+# Year-wise archive of mainboard IPOs, used by the backfill
+ARCHIVE_URL = "https://www.chittorgarh.com/report/mainboard-ipo-list-in-india-bse-nse/83/?year={year}"
+FIRST_ARCHIVE_YEAR = 2007
+BACKFILL_WORKERS = 4
+BACKFILL_CHECKPOINT = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "logs", "chittorgarh_backfill.json"
+)
+# Finished detail pages, one URL per line, appended as they complete
+BACKFILL_DONE_LOG = BACKFILL_CHECKPOINT[:-len(".json")] + ".done"
+
+# Job queue settings: whether process_job needs a driver, and the payload key that identifies a job
+NEEDS_BROWSER = False
+JOB_URL_KEY = "url"
 
 # MongoDB Connection
-MONGO_URI = os.getenv("MONGO_URI")
-DB_NAME = "ipo-radar"
 COLLECTION_NAME = "ipos"
 
-try:
-    client = MongoClient(MONGO_URI)
-    db = client[DB_NAME]
-    collection = db[COLLECTION_NAME]
-    # Create unique index on ipo_name to prevent duplicates
-    collection.create_index("ipo_name", unique=True)
-    print("✅ Connected to MongoDB")
-except Exception as e:
-    print("❌ MongoDB Connection Error:", e)
-    client = None
+_collection = None
+
+
+def get_ipo_collection():
+    """Connects on first use and makes sure the ipos indexes exist"""
+    global _collection
+    if _collection is None:
+        collection = get_collection(COLLECTION_NAME)
+        # Unique ipo_name prevents duplicates (see utils/indexes.py)
+        ensure_indexes(collection)
+        print("✅ Connected to MongoDB")
+        _collection = collection
+    return _collection
 
 
 def get_html(url):
-    time.sleep(DELAY)
-    r = requests.get(url, headers=HEADERS, timeout=15)
+    # Pacing is done per host by utils.ratelimit (see HOST_LIMITS)
+    with current().phase("fetch"):
+        r = http.get(url, headers=HEADERS, timeout=15)
     r.raise_for_status()
     return r.text
 
@@ -57,13 +82,21 @@ def infer_status(row):
 
 # ---------------- GET IPO LINKS ----------------
 
-def get_ipo_links():
-    soup = BeautifulSoup(get_html(LIST_URL), "lxml")
+def get_ipo_links(list_url=LIST_URL, status=None):
+    """
+    IPO links on a list page. Status is inferred from the row styling
+    unless given (archive pages only list closed IPOs).
+    """
+    html = get_html(list_url)
+    with current().parsing():
+        soup = parse(html, "chittorgarh_list")
     ipos = []
     seen = set()
 
     for a in soup.find_all("a", href=True):
         href = a["href"]
+        if href.startswith(BASE_URL):
+            href = href[len(BASE_URL):]
 
         # strict IPO URL match
         if not re.match(r"^/ipo/.+-ipo/\d+/?$", href):
@@ -74,13 +107,16 @@ def get_ipo_links():
             continue
         seen.add(url)
 
-        row = a.find_parent("tr")
-        status = infer_status(row) if row else "unknown"
+        if status is None:
+            row = a.find_parent("tr")
+            row_status = infer_status(row) if row else "unknown"
+        else:
+            row_status = status
 
         ipos.append({
             "url": url,
             "ipo_name": a.get_text(strip=True),
-            "status": status
+            "status": row_status
         })
 
     return ipos
@@ -116,22 +152,25 @@ SECTION_KEYS = {
 
 
 def scrape_ipo(ipo):
-    soup = BeautifulSoup(get_html(ipo["url"]), "lxml")
+    html = get_html(ipo["url"])
 
     raw_html = {k: None for k in SECTION_KEYS}
     values = {}
 
-    for key, keywords in SECTION_KEYS.items():
-        card = extract_section(soup, keywords)
-        if card:
-            raw_html[key] = str(card)
+    with current().parsing():
+        soup = parse(html, "chittorgarh_ipo")
+
+        for key, keywords in SECTION_KEYS.items():
+            card = extract_section(soup, keywords)
+            if card:
+                raw_html[key] = str(card)
 
-            for tr in card.find_all("tr"):
-                tds = tr.find_all("td")
-                if len(tds) >= 2:
-                    k = tds[0].get_text(" ", strip=True).lower()
-                    v = tds[1].get_text(" ", strip=True)
-                    values[k] = v
+                for tr in card.find_all("tr"):
+                    tds = tr.find_all("td")
+                    if len(tds) >= 2:
+                        k = tds[0].get_text(" ", strip=True).lower()
+                        v = tds[1].get_text(" ", strip=True)
+                        values[k] = v
 
     return {
         "url": ipo["url"],
@@ -145,43 +184,256 @@ def scrape_ipo(ipo):
 
 # ---------------- MAIN ----------------
 
-def main():
-    if not client:
-        print("❌ Aborting: No MongoDB connection")
-        return
+def flatten_update(data):
+    """Flattens 'values' to prevent overwriting other scraper data"""
+    update_data = {}
+    for k, v in data.items():
+        if k == "status" and v is None:
+            # Unknown status (backfill of the current year): keep what we have
+            continue
+        if k == "values":
+            for vk, vv in v.items():
+                update_data[f"values.{vk}"] = vv
+        else:
+            update_data[k] = v
+    return update_data
 
-    ipos = get_ipo_links()
-    print(f"Found {len(ipos)} IPOs")
 
+def list_jobs(driver=None):
+    """IPO pages for this cycle (one queue job each)"""
     # Limit to top 20 for quick update
-    ipos = ipos[:20]
+    return get_ipo_links()[:20]
+
+
+def process_job(ipo, collection, dry_run=False, driver=None):
+    data = scrape_ipo(ipo)
+    update_data = flatten_update(data)
+
+    if dry_run:
+        print(f"   📝 Dry run: would save {len(update_data)} fields")
+        return
+
+    # Upsert into MongoDB
+    save_ipo(collection, data["ipo_name"], update_data)
+    print(f"   ✅ Saved to MongoDB")
+
+
+@recorded_run("chittorgarh")
+def main(dry_run=False):
+    collection = None
+    if not dry_run:
+        try:
+            collection = get_ipo_collection()
+        except Exception as e:
+            print("❌ MongoDB Connection Error:", e)
+            print("❌ Aborting: No MongoDB connection")
+            return
+
+    ipos = list_jobs()
+    print(f"Processing {len(ipos)} IPOs")
+
     for i, ipo in enumerate(ipos, 1):
         print(f"[{i}/{len(ipos)}] Processing: {ipo['ipo_name']}")
         try:
-            data = scrape_ipo(ipo)
-            
-            # Flatten 'values' to prevent overwriting other scraper data
-            update_data = {}
-            for k, v in data.items():
-                if k == "values":
-                    for vk, vv in v.items():
-                        update_data[f"values.{vk}"] = vv
-                else:
-                    update_data[k] = v
-
-            # Upsert into MongoDB
-            collection.update_one(
-                {"ipo_name": data["ipo_name"]},
-                {"$set": update_data},
-                upsert=True
-            )
-            print(f"   ✅ Saved to MongoDB")
-
+            process_job(ipo, collection, dry_run=dry_run)
+        except CircuitOpenError as e:
+            current().record_error()
+            print(f"   ⛔ {e}; skipping the rest of this run")
+            break
         except Exception as e:
+            current().record_error()
             print(f"   ❌ Error: {e}")
 
     print("\n✅ Scraper finished.")
 
 
+# ---------------- BACKFILL ----------------
+
+def load_checkpoint():
+    """Listed archive years; the finished URLs are in BACKFILL_DONE_LOG"""
+    try:
+        with open(BACKFILL_CHECKPOINT) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {"years": {}}
+
+
+def load_done():
+    try:
+        with open(BACKFILL_DONE_LOG) as f:
+            # A line cut short by a crash matches no URL and is simply ignored
+            return {line.strip() for line in f if line.strip()}
+    except FileNotFoundError:
+        return set()
+
+
+def save_checkpoint(checkpoint):
+    os.makedirs(os.path.dirname(BACKFILL_CHECKPOINT), exist_ok=True)
+    with open(BACKFILL_CHECKPOINT + ".tmp", "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(BACKFILL_CHECKPOINT + ".tmp", BACKFILL_CHECKPOINT)
+
+
+def append_done(urls):
+    """One short append per finished page instead of rewriting every URL so far"""
+    os.makedirs(os.path.dirname(BACKFILL_DONE_LOG), exist_ok=True)
+    with open(BACKFILL_DONE_LOG, "a") as f:
+        f.write("".join(url + "\n" for url in urls))
+
+
+def name_key(name):
+    """Archive anchors can read "Example Ltd IPO" where the dashboard has "Example Ltd" """
+    return normalize(re.sub(r"\s+IPO$", "", name.strip(), flags=re.I))
+
+
+def fold_names(collection, ipos):
+    """
+    Renames archive entries onto the stored spelling of the same IPO (case,
+    spacing, trailing "IPO"), so the backfill does not store it a second time
+    """
+    names = {}
+    if collection is not None:
+        names = {name_key(doc["ipo_name"]): doc["ipo_name"]
+                 for doc in collection.find({}, {"ipo_name": 1, "_id": 0}).hint([("ipo_name", 1)])
+                 if doc.get("ipo_name")}
+    for ipo in ipos:
+        ipo["ipo_name"] = names.setdefault(name_key(ipo["ipo_name"]), " ".join(ipo["ipo_name"].split()))
+    return ipos
+
+
+def complete_urls(collection, urls):
+    """URLs whose detail page is already stored in Mongo (or archived, see utils/tiering.py)"""
+    done = set()
+    for i in range(0, len(urls), 500):
+        for doc in collection.find(
+            {"url": {"$in": urls[i:i + 500]}, "$or": [{"raw_html.ipo_details": {"$ne": None}}, {"archived": True}]},
+            {"url": 1, "_id": 0}
+        ):
+            done.add(doc["url"])
+    return done
+
+
+@recorded_run("chittorgarh_backfill")
+def backfill(dry_run=False, from_year=FIRST_ARCHIVE_YEAR, to_year=None, max_seconds=None, workers=BACKFILL_WORKERS):
+    """
+    Walks the year-wise archive and scrapes every IPO detail page not yet
+    stored. Listed years are checkpointed to logs/chittorgarh_backfill.json
+    and finished pages appended to logs/chittorgarh_backfill.done, so an
+    interrupted (or time-limited) backfill resumes where it stopped.
+    """
+    from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+    started = time.time()
+    this_year = datetime.now().year
+    to_year = to_year or this_year
+    collection = None if dry_run else get_ipo_collection()
+    checkpoint = load_checkpoint()
+    done = load_done()
+    # Checkpoints written before the done log kept the URLs in the JSON
+    legacy = set(checkpoint.pop("done", [])) - done
+    if legacy and not dry_run:
+        append_done(sorted(legacy))
+    done |= legacy
+
+    def checkpoint_now():
+        # Dry runs read the checkpoint but never advance it
+        if not dry_run:
+            save_checkpoint(checkpoint)
+
+    def out_of_time():
+        return max_seconds is not None and time.time() - started > max_seconds
+
+    # 1. List every archive year once (newest first)
+    for year in range(to_year, from_year - 1, -1):
+        # Past years are listed once; the current year keeps growing
+        if (str(year) in checkpoint["years"] and year < this_year) or out_of_time():
+            continue
+        # The current year's list still contains open IPOs; leave their status alone
+        status = "closed" if year < this_year else None
+        try:
+            ipos = get_ipo_links(ARCHIVE_URL.format(year=year), status=status)
+        except CircuitOpenError as e:
+            print(f"⛔ {e}; stopping backfill")
+            checkpoint_now()
+            return
+        except Exception as e:
+            current().record_error()
+            print(f"❌ {year}: {e}")
+            continue
+        checkpoint["years"][str(year)] = ipos
+        checkpoint_now()
+        print(f"📅 {year}: {len(ipos)} IPOs")
+
+    pending = {}
+    for year in sorted(checkpoint["years"], reverse=True):
+        for ipo in checkpoint["years"][year]:
+            if ipo["url"] not in done:
+                pending.setdefault(ipo["url"], ipo)
+
+    # 2. Skip IPOs that are already complete in Mongo
+    if collection is not None and pending:
+        already = complete_urls(collection, list(pending))
+        done |= already
+        for url in already:
+            del pending[url]
+
+    print(f"🗂️  Backfill: {len(pending)} IPO pages to scrape ({len(done)} already done)")
+
+    # 3. Scrape detail pages concurrently; the host limiter paces the requests
+    queue = fold_names(collection, list(pending.values()))
+    circuit_open = False
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        running = {}
+        while queue or running:
+            while queue and len(running) < workers and not (circuit_open or out_of_time()):
+                ipo = queue.pop(0)
+                running[pool.submit(process_job, ipo, collection, dry_run)] = ipo
+            if not running:
+                break
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                ipo = running.pop(future)
+                try:
+                    future.result()
+                    done.add(ipo["url"])
+                    if not dry_run:
+                        append_done([ipo["url"]])
+                except CircuitOpenError as e:
+                    circuit_open = True
+                    print(f"⛔ {e}; finishing in-flight pages and stopping")
+                except Exception as e:
+                    current().record_error()
+                    print(f"   ❌ {ipo['ipo_name']}: {e}")
+
+    remaining = len(queue)
+    if remaining:
+        print(f"⏸️  Backfill paused with {remaining} pages left; run again to resume")
+    else:
+        print("✅ Backfill finished.")
+
+
+@recorded_run("status")
+def refresh_statuses(dry_run=False):
+    """
+    Status-only refresh: reads the dashboard once and updates the
+    open/closed status of the listed IPOs without visiting detail pages.
+    """
+    ipos = get_ipo_links()
+    print(f"Found {len(ipos)} IPOs")
+
+    if dry_run:
+        for ipo in ipos:
+            print(f"   📝 {ipo['ipo_name']}: {ipo['status']}")
+        return
+
+    collection = get_ipo_collection()
+    for ipo in ipos:
+        if ipo["status"] == "unknown":
+            continue
+        save_ipo(collection, ipo["ipo_name"], {"status": ipo["status"]}, upsert=False)
+    print("✅ Status refresh finished.")
+
+
 if __name__ == "__main__":
     main()
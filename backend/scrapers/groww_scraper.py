@@ -1,14 +1,19 @@
 import json
 import time
-from bs4 import BeautifulSoup
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.service import Service
-# from webdriver_manager.chrome import ChromeDriverManager (Removed)
-from pymongo import MongoClient
 from dotenv import load_dotenv
 import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.db import get_collection
+from utils.browser import open_page, page_source, run_script, setup_driver
+from utils.metrics import current, recorded_run
+from utils.store import save_ipo
+from utils.parsing import parse
+from utils import urlcache
+from utils.ratelimit import CircuitOpenError
+
+# bs4 / selenium are imported on first use so that
+# `python -m scrapers` commands start without paying for them
 
 BASE_URL = "https://groww.in"
 
@@ -20,18 +25,88 @@ OUTPUT_FILE = "groww_mainboard_ipos_clean.json"
 
 LIMIT = 50
 
-# ---------------- DRIVER ----------------
+# Job queue settings: whether process_job needs a driver, and the payload key that identifies a job
+NEEDS_BROWSER = True
+JOB_URL_KEY = "url"
+
+# setup_driver (imported above) is the shared lean Chrome from utils.browser
+
+# ---------------- IN-BROWSER EXTRACTION ----------------
+
+# "js" extracts the needed fields with one execute_script per page;
+# "soup" transfers the page source and parses it with BeautifulSoup
+EXTRACTION = os.getenv("GROWW_EXTRACTION", "js")
+
+# Text of an element the way bs4's get_text(strip=True) joins it
+_JS_TEXT = """
+const text = (el) => {
+    if (!el) return null;
+    const walker = document.createTreeWalker(el, NodeFilter.SHOW_TEXT);
+    let out = "", node;
+    while ((node = walker.nextNode())) out += node.nodeValue.trim();
+    return out;
+};
+"""
+
+# Links and table rows of a list page, in the shape of list_page_data()
+LIST_SCRIPT = _JS_TEXT + """
+const links = Array.from(document.querySelectorAll('a[href^="/ipo/"]')).map((a) => ({
+    href: a.getAttribute("href"),
+    text: text(a),
+}));
+const rows = Array.from(document.querySelectorAll("tr")).map((tr) => {
+    const link = tr.querySelector('a[href^="/ipo/"]');
+    return {
+        cur_po: tr.classList.contains("cur-po"),
+        name: text(tr.querySelector('span[aria-label="Company name"]')),
+        href: link ? link.getAttribute("href") : null,
+        cells: Array.from(tr.querySelectorAll("td")).map(text),
+    };
+});
+return {links, rows};
+"""
+
+# Strengths, then click the Risks pill and collect the risks once they have rendered
+STRENGTHS_RISKS_SCRIPT = _JS_TEXT + """
+const done = arguments[arguments.length - 1];
+const items = () => {
+    const heading = Array.from(document.querySelectorAll("h2"))
+        .find((h) => h.textContent.includes("Strengths") && h.textContent.includes("Risks"));
+    if (!heading) return null;
+    let container = heading.parentElement;
+    while (container && !(container.tagName === "DIV" && container.className.includes("col"))) {
+        container = container.parentElement;
+    }
+    if (!container) return null;
+    return Array.from(container.querySelectorAll("div.flex"))
+        .map((block) => text(block.querySelector("div.bodyLarge")))
+        .filter((t) => t);
+};
+
+const strengths = items();
+if (strengths === null) return done({strengths: [], risks: []});
+
+const pill = document.evaluate(
+    "//span[text()='Risks']/ancestor::div[contains(@class,'pill')]",
+    document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null
+).singleNodeValue;
+if (!pill) return done({strengths, risks: []});
+pill.click();
+
+// Wait for the tab to re-render (up to the timeout the soup mode slept)
+const started = Date.now();
+const poll = () => {
+    const risks = items() || [];
+    const changed = risks.length && JSON.stringify(risks) !== JSON.stringify(strengths);
+    if (changed || Date.now() - started > arguments[0]) {
+        return done({strengths, risks});
+    }
+    setTimeout(poll, 100);
+};
+poll();
+"""
 
-def setup_driver():
-    options = Options()
-    options.add_argument("--headless=new")
-    options.add_argument("--window-size=1920,1080")
-    options.add_argument("--no-sandbox")
-    options.add_argument("--disable-dev-shm-usage")
-    options.add_argument("--disable-gpu")
-    options.add_argument("--disable-extensions")
-    # Selenium 4.x handles driver automatically
-    return webdriver.Chrome(options=options)
+RISKS_TIMEOUT_MS = 2000
 
 
 # ---------------- IPO LIST HELPERS ----------------
@@ -40,34 +115,61 @@ def is_valid_ipo_url(href):
     return href and href.startswith("/ipo/") and href.endswith("-ipo")
 
 
-def get_open_upcoming_ipos(driver, url, status_label):
-    driver.get(url)
-    time.sleep(10)
+def list_page_data(soup):
+    """Links and rows of a parsed list page (the soup equivalent of LIST_SCRIPT)"""
+    rows = []
+    for tr in soup.select("tr"):
+        name_tag = tr.select_one('span[aria-label="Company name"]')
+        link_tag = tr.select_one('a[href^="/ipo/"]')
+        rows.append({
+            "cur_po": "cur-po" in (tr.get("class") or []),
+            "name": name_tag.get_text(strip=True) if name_tag else None,
+            "href": link_tag.get("href") if link_tag else None,
+            "cells": [td.get_text(strip=True) for td in tr.find_all("td")],
+        })
+
+    return {
+        "links": [{"href": a.get("href"), "text": a.get_text(strip=True)} for a in soup.select('a[href^="/ipo/"]')],
+        "rows": rows,
+    }
+
+
+def load_list_page(driver, url, wait_seconds):
+    with current().phase("fetch"):
+        open_page(driver, url)
+    with current().phase("wait"):
+        time.sleep(wait_seconds)
+
+    if EXTRACTION == "js":
+        with current().parsing():
+            return run_script(driver, LIST_SCRIPT)
+
+    html = page_source(driver)
+    with current().parsing():
+        return list_page_data(parse(html, "groww_list"))
+
 
-    soup = BeautifulSoup(driver.page_source, "lxml")
+def get_open_upcoming_ipos(driver, url, status_label):
+    page = load_list_page(driver, url, 10)
     ipos = []
 
     # 🔹 Special handling only for UPCOMING page
     if status_label == "upcoming":
-        for row in soup.select("tr.cur-po"):
-            name_tag = row.select_one('span[aria-label="Company name"]')
-            link_tag = row.select_one('a[href^="/ipo/"]')
-            tds = row.find_all("td")
-
-            if not name_tag or not link_tag or len(tds) < 3:
+        for row in page["rows"]:
+            if not row["cur_po"] or not row["name"] or not row["href"] or len(row["cells"]) < 3:
                 continue
 
-            opening_date = tds[2].get_text(strip=True)
+            opening_date = row["cells"][2]
 
             if opening_date.lower() == "to be announced":
                 continue
 
-            href = link_tag.get("href")
+            href = row["href"]
             if not is_valid_ipo_url(href):
                 continue
 
             ipos.append({
-                "name": name_tag.get_text(strip=True),
+                "name": row["name"],
                 "url": BASE_URL + href,
                 "status": "upcoming",
                 "opening_date": opening_date
@@ -77,34 +179,27 @@ def get_open_upcoming_ipos(driver, url, status_label):
         return ipos
 
     # 🔹 Original behavior for OPEN
-    links = soup.select('a[href^="/ipo/"]')
-    if links:
-        for a in links:
-            href = a.get("href")
-            if not is_valid_ipo_url(href):
-                continue
-            name = a.get_text(strip=True)
-            if not name:
-                continue
+    for a in page["links"]:
+        href = a["href"]
+        if not is_valid_ipo_url(href):
+            continue
+        name = a["text"]
+        if not name:
+            continue
 
-            ipos.append({
-                "name": name,
-                "url": BASE_URL + href,
-                "status": status_label
-            })
+        ipos.append({
+            "name": name,
+            "url": BASE_URL + href,
+            "status": status_label
+        })
 
     # 🔹 Fallback table logic (unchanged)
     if not ipos:
-        rows = soup.select('tr')
-        for row in rows:
-            tds = row.find_all('td')
-            if not tds:
+        for row in page["rows"]:
+            if not row["cells"]:
                 continue
 
-            if len(tds) > 0:
-                raw_name = tds[0].get_text(strip=True)
-            else:
-                continue
+            raw_name = row["cells"][0]
 
             if not raw_name or "Company" in raw_name:
                 continue
@@ -126,24 +221,18 @@ def get_open_upcoming_ipos(driver, url, status_label):
 
 
 def get_closed_ipos(driver):
-    driver.get(CLOSED_URL)
-    time.sleep(5)
-
-    soup = BeautifulSoup(driver.page_source, "lxml")
+    page = load_list_page(driver, CLOSED_URL, 5)
     ipos = []
 
-    for row in soup.select("tr.cur-po"):
-        name_tag = row.select_one('span[aria-label="Company name"]')
-        tds = row.find_all("td")
-
-        if not name_tag or len(tds) < 2:
+    for row in page["rows"]:
+        if not row["cur_po"] or not row["name"] or len(row["cells"]) < 2:
             continue
 
-        board = tds[1].get_text(strip=True)
+        board = row["cells"][1]
         if board != "Mainboard":
             continue
 
-        name = name_tag.get_text(strip=True)
+        name = row["name"]
         slug = name.lower().replace("&", "and").replace(" ", "-")
         url = f"{BASE_URL}/ipo/{slug}-ipo"
 
@@ -158,16 +247,37 @@ def get_closed_ipos(driver):
 
 # ---------------- STRENGTHS & RISKS ----------------
 
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
+def strengths_risks_items(soup):
+    """Texts of the Strengths & Risks card's active tab, or None if the card is missing"""
+    heading = soup.find("h2", string=lambda x: x and "Strengths" in x and "Risks" in x)
+    if not heading:
+        return None
+
+    container = heading.find_parent("div", class_=lambda x: x and "col" in x)
+    if not container:
+        return None
+
+    items = []
+    for block in container.select("div.flex"):
+        text_div = block.find("div", class_="bodyLarge")
+        if not text_div:
+            continue
+
+        text = text_div.get_text(strip=True)
+        if text:
+            items.append(text)
+    return items
+
 
 def extract_strengths_risks(driver, ipo):
-    driver.get(ipo["url"])
-    time.sleep(3)
+    with current().phase("fetch"):
+        open_page(driver, ipo["url"])
+    with current().phase("wait"):
+        time.sleep(3)
 
     driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-    time.sleep(2)
+    with current().phase("wait"):
+        time.sleep(2)
 
     result = {
         "name": ipo["name"],
@@ -176,67 +286,49 @@ def extract_strengths_risks(driver, ipo):
         "risks": []
     }
 
-    soup = BeautifulSoup(driver.page_source, "lxml")
-    heading = soup.find("h2", string=lambda x: x and "Strengths" in x and "Risks" in x)
-    if not heading:
+    if EXTRACTION == "js":
+        with current().parsing():
+            data = run_script(driver, STRENGTHS_RISKS_SCRIPT, RISKS_TIMEOUT_MS, wait=True)
+        result["strengths"] = data["strengths"]
+        result["risks"] = data["risks"]
         return result
 
-    container = heading.find_parent("div", class_=lambda x: x and "col" in x)
-    if not container:
-        return result
+    return extract_strengths_risks_soup(driver, result)
 
-    for block in container.select("div.flex"):
-        text_div = block.find("div", class_="bodyLarge")
-        if not text_div:
-            continue
 
-        text = text_div.get_text(strip=True)
-        if text:
-            result["strengths"].append(text)
+def extract_strengths_risks_soup(driver, result):
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+
+    html = page_source(driver)
+    with current().parsing():
+        strengths = strengths_risks_items(parse(html, "groww_ipo"))
+    if strengths is None:
+        return result
+    result["strengths"] = strengths
 
     try:
         risks_btn = WebDriverWait(driver, 10).until(
             EC.element_to_be_clickable((By.XPATH, "//span[text()='Risks']/ancestor::div[contains(@class,'pill')]"))
         )
         driver.execute_script("arguments[0].click();", risks_btn)
-        time.sleep(2)
+        with current().phase("wait"):
+            time.sleep(2)
     except:
         return result
 
-    soup = BeautifulSoup(driver.page_source, "lxml")
-    heading = soup.find("h2", string=lambda x: x and "Strengths" in x and "Risks" in x)
-    container = heading.find_parent("div", class_=lambda x: x and "col" in x)
-
-    for block in container.select("div.flex"):
-        text_div = block.find("div", class_="bodyLarge")
-        if not text_div:
-            continue
-
-        text = text_div.get_text(strip=True)
-        if text:
-            result["risks"].append(text)
+    html = page_source(driver)
+    with current().parsing():
+        result["risks"] = strengths_risks_items(parse(html, "groww_ipo")) or []
 
     return result
 
 
-# ---------------- MAIN ----------------
-
-def main():
-    try:
-        load_dotenv()
-        mongo_uri = os.getenv("MONGO_URI")
-        if not mongo_uri:
-            raise ValueError("MONGO_URI not found in environment variables")
-
-        client = MongoClient(mongo_uri)
-        db = client["ipo-radar"]
-        collection = db["ipos"]
-        print("✅ Connected to MongoDB")
-    except Exception as e:
-        print(f"❌ MongoDB Connection Failed: {e}")
-        return
+# ---------------- JOBS ----------------
 
-    driver = setup_driver()
+def list_jobs(driver):
+    """IPO detail pages for this cycle (one queue job each)"""
     all_ipos = {}
 
     print("🔍 Fetching IPO list from Groww...")
@@ -252,43 +344,87 @@ def main():
 
     print(f"Valid IPO pages found: {len(all_ipos)}")
 
-    sorted_ipos = list(all_ipos.values())
+    return list(all_ipos.values())[:LIMIT]
 
-    for idx, ipo in enumerate(sorted_ipos, 1):
-        if idx > LIMIT:
-            break
 
-        print(f"[{idx}/{len(sorted_ipos)}] Processing: {ipo['name']} ({ipo['status']})")
+def process_job(ipo, collection, dry_run=False, driver=None):
+    # Slugs for closed / fallback IPOs are guessed from the name; only
+    # open the browser for pages known to exist
+    cache = urlcache.cache_for(collection)
+    state, canonical = urlcache.check(cache, ipo["url"])
 
-        try:
-            data = extract_strengths_risks(driver, ipo)
+    if state == "ok":
+        data = extract_strengths_risks(driver, {**ipo, "url": canonical})
+        if not data["strengths"] and not data["risks"]:
+            urlcache.remember_empty(cache, ipo["url"])
+    else:
+        print(f"   ⏭️ Skipping browser visit: page {state} ({ipo['url']})")
+        data = {"name": ipo["name"], "url": None, "strengths": [], "risks": []}
+
+    update_fields = {
+        "ipo_name": data["name"],
+        "status": ipo["status"],
+        "updated_at": time.strftime("%Y-%m-%d %H:%M:%S")
+    }
+
+    if data["url"]:
+        update_fields["groww_url"] = data["url"]
+
+    if "opening_date" in ipo:
+        update_fields["opening_date"] = ipo["opening_date"]
 
-            update_fields = {
-                "ipo_name": data["name"],
-                "groww_url": data["url"],
-                "status": ipo["status"],
-                "updated_at": time.strftime("%Y-%m-%d %H:%M:%S")
-            }
+    if data["strengths"] or data["risks"]:
+        update_fields["values.strengths"] = data["strengths"]
+        update_fields["values.risks"] = data["risks"]
 
-            if "opening_date" in ipo:
-                update_fields["opening_date"] = ipo["opening_date"]
+    if dry_run:
+        print(f"   📝 Dry run: {len(data['strengths'])} strengths, {len(data['risks'])} risks")
+        return
+
+    save_ipo(collection, data["name"], update_fields)
+
+    print("   ✅ Saved / Updated")
 
-            if data["strengths"] or data["risks"]:
-                update_fields["values.strengths"] = data["strengths"]
-                update_fields["values.risks"] = data["risks"]
 
-            collection.update_one(
-                {"ipo_name": data["name"]},
-                {"$set": update_fields},
-                upsert=True
-            )
+# ---------------- MAIN ----------------
 
-            print("   ✅ Saved / Updated")
+@recorded_run("groww")
+def main(dry_run=False, driver=None):
+    """
+    Runs the scraper. A caller that keeps a warm browser (the worker)
+    passes its own driver, which is then left open.
+    """
+    collection = None
+    if not dry_run:
+        try:
+            load_dotenv()
+            collection = get_collection("ipos")
+            print("✅ Connected to MongoDB")
+        except Exception as e:
+            print(f"❌ MongoDB Connection Failed: {e}")
+            return
 
+    own_driver = driver is None
+    if own_driver:
+        driver = setup_driver()
+
+    ipos = list_jobs(driver)
+
+    for idx, ipo in enumerate(ipos, 1):
+        print(f"[{idx}/{len(ipos)}] Processing: {ipo['name']} ({ipo['status']})")
+
+        try:
+            process_job(ipo, collection, dry_run=dry_run, driver=driver)
+        except CircuitOpenError as e:
+            current().record_error()
+            print(f"   ⛔ {e}; skipping the rest of this run")
+            break
         except Exception as e:
+            current().record_error()
             print(f"   ❌ Error: {e}")
 
-    driver.quit()
+    if own_driver:
+        driver.quit()
     print("\n✅ Groww Scraper Finished.")
 
 
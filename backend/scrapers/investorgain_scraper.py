@@ -1,14 +1,19 @@
 import time
 import os
-import requests
+import sys
 from dotenv import load_dotenv
-from pymongo import MongoClient
-from bs4 import BeautifulSoup
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.service import Service
-# from webdriver_manager.chrome import ChromeDriverManager (Removed)
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.db import get_collection
+from utils import http
+from utils.browser import open_page, page_source, setup_driver
+from utils.metrics import current, recorded_run
+from utils.store import save_ipo
+from utils.parsing import parse
+from utils.ratelimit import CircuitOpenError
+
+# requests / bs4 / selenium are imported on first use so that
+# `python -m scrapers` commands start without paying for them
 
 load_dotenv()
 
@@ -18,38 +23,20 @@ IPO_LIST_API = "https://webnodejs.investorgain.com/cloud/ipodashboard/ipoList-re
 GMP_LIST_API = "https://webnodejs.investorgain.com/cloud/ipodashboard/gmpList-read/IPO"
 SUB_LIST_API = "https://webnodejs.investorgain.com/cloud/ipodashboard/iposubscription-read/IPO"
 
-MONGO_URI = os.getenv("MONGO_URI")
-DB_NAME = "ipo-radar"
 COLLECTION_NAME = "ipos"
 
-try:
-    client = MongoClient(MONGO_URI)
-    db = client[DB_NAME]
-    collection = db[COLLECTION_NAME]
-    print("✅ Connected to MongoDB")
-except Exception as e:
-    print("❌ MongoDB Connection Error:", e)
-    client = None
-
-
-def setup_driver():
-    options = Options()
-    options.add_argument("--headless=new")
-    options.add_argument("--window-size=1920,1080")
-    options.add_argument("--disable-gpu")
-    options.add_argument("--no-sandbox")
-    options.add_argument("--disable-dev-shm-usage")
-    options.add_argument("--disable-extensions")
-    # Selenium 4.x handles driver automatically
-    return webdriver.Chrome(options=options)
+# Job queue settings: whether process_job needs a driver, and the payload key that identifies a job
+NEEDS_BROWSER = True
+JOB_URL_KEY = "gmp_url"
 
 
 def fetch_api_data():
     ipo_map = {}
 
-    ipo_list = requests.get(IPO_LIST_API, timeout=30).json().get("ipoList", [])
-    gmp_list = requests.get(GMP_LIST_API, timeout=30).json().get("ipoList", [])
-    sub_list = requests.get(SUB_LIST_API, timeout=30).json().get("ipoList", [])
+    with current().phase("fetch"):
+        ipo_list = http.get(IPO_LIST_API, timeout=30).json().get("ipoList", [])
+        gmp_list = http.get(GMP_LIST_API, timeout=30).json().get("ipoList", [])
+        sub_list = http.get(SUB_LIST_API, timeout=30).json().get("ipoList", [])
 
     for ipo in ipo_list:
         ipo_map[ipo["id"]] = {
@@ -81,10 +68,14 @@ def fetch_api_data():
 
 
 def parse_gmp_trend(driver, url):
-    driver.get(url)
-    time.sleep(4)
-
-    soup = BeautifulSoup(driver.page_source, "lxml")
+    with current().phase("fetch"):
+        open_page(driver, url)
+    with current().phase("wait"):
+        time.sleep(4)
+
+    html = page_source(driver)
+    with current().parsing():
+        soup = parse(html, "investorgain_gmp")
     
     # improved selector: look for table with specific headers
     target_table = None
@@ -124,43 +115,72 @@ def parse_gmp_trend(driver, url):
     return rows
 
 
-def main():
-    if not client:
-        print("Aborting due to no DB connection")
+# ---------------- JOBS ----------------
+
+def list_jobs(driver=None):
+    """GMP pages for this cycle (one queue job each)"""
+    return fetch_api_data()
+
+
+def process_job(ipo, collection, dry_run=False, driver=None):
+    trend = parse_gmp_trend(driver, ipo["gmp_url"])
+
+    update = {
+        "ipo_name": ipo["name"],
+        "status": ipo.get("status"),
+        "values.gmp": ipo.get("gmp"),
+        "values.subscription": ipo.get("subscription"),
+        "values.ipo_price": ipo.get("ipo_price"),
+        "values.investorgain_url": ipo["gmp_url"],
+        "values.gmp_trend": trend,
+        "updated_at": time.strftime("%Y-%m-%d %H:%M:%S")
+    }
+
+    if dry_run:
+        print(f"   📝 Dry run: {len(trend)} GMP trend rows")
         return
 
-    ipos = fetch_api_data()
-    driver = setup_driver()
+    save_ipo(collection, ipo["name"], update)
+
+    print("   ✅ Updated")
+
+
+@recorded_run("investorgain")
+def main(dry_run=False, driver=None):
+    """
+    Runs the scraper. A caller that keeps a warm browser (the worker)
+    passes its own driver, which is then left open.
+    """
+    collection = None
+    if not dry_run:
+        try:
+            collection = get_collection(COLLECTION_NAME)
+            print("✅ Connected to MongoDB")
+        except Exception as e:
+            print("❌ MongoDB Connection Error:", e)
+            print("Aborting due to no DB connection")
+            return
+
+    ipos = list_jobs()
+    own_driver = driver is None
+    if own_driver:
+        driver = setup_driver()
 
     for i, ipo in enumerate(ipos, 1):
         print(f"[{i}/{len(ipos)}] {ipo['name']}")
 
         try:
-            trend = parse_gmp_trend(driver, ipo["gmp_url"])
-
-            update = {
-                "ipo_name": ipo["name"],
-                "status": ipo.get("status"),
-                "values.gmp": ipo.get("gmp"),
-                "values.subscription": ipo.get("subscription"),
-                "values.ipo_price": ipo.get("ipo_price"),
-                "values.investorgain_url": ipo["gmp_url"],
-                "values.gmp_trend": trend,
-                "updated_at": time.strftime("%Y-%m-%d %H:%M:%S")
-            }
-
-            collection.update_one(
-                {"ipo_name": ipo["name"]},
-                {"$set": update},
-                upsert=True
-            )
-
-            print("   ✅ Updated")
-
+            process_job(ipo, collection, dry_run=dry_run, driver=driver)
+        except CircuitOpenError as e:
+            current().record_error()
+            print(f"   ⛔ {e}; skipping the rest of this run")
+            break
         except Exception as e:
+            current().record_error()
             print(f"   ❌ {e}")
 
-    driver.quit()
+    if own_driver:
+        driver.quit()
     print("✅ InvestorGain Scraper finished.")
 
 
@@ -0,0 +1,272 @@
+"""
+Live prices of listed IPOs, polled where they actually move.
+
+Every listed IPO gets a polling interval from how recently it listed:
+
+    listing day        every LISTING_DAY_SECONDS during market hours
+    listed < 30 days   every RECENT_SECONDS during market hours
+    older              once, at the close
+
+Nothing is polled outside NSE sessions (utils/market.py), and the set of
+symbols is reloaded through the day so IPOs listing today are picked up.
+Quotes come from a QuoteSource; StubQuotes stands in for Yahoo Finance
+with a deterministic random walk:
+
+    cd backend
+    python -m scrapers price-watch                  # runs until stopped
+    python -m scrapers price-watch --stub --dry-run --max-seconds 60
+
+Set PRICE_WATCHER=1 for the server so it stops its own 2-minute poll.
+"""
+import os
+import re
+import sys
+import time
+import random
+from datetime import datetime, timedelta, timezone
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.db import get_collection
+from utils.metrics import current, recorded_run
+from utils import market
+from utils.ipocalendar import IST
+
+COLLECTION_NAME = "ipos"
+
+LISTING_DAY_SECONDS = 5
+RECENT_SECONDS = 300
+RECENT_DAYS = 30
+
+# Picks up symbols and tier changes (e.g. an IPO that lists today)
+RELOAD_SECONDS = 900
+
+# Quotes fetched per request
+BATCH_SIZE = 50
+
+PROJECTION = {
+    "ipo_name": 1, "values.symbol": 1, "values.issue price": 1,
+    "values.listing at": 1, "dates.listing": 1, "live.listingPrice": 1,
+}
+
+
+# ---------------- QUOTE SOURCES ----------------
+
+class YahooQuotes:
+    URL = "https://query1.finance.yahoo.com/v7/finance/quote"
+
+    def quotes(self, symbols):
+        """{symbol: last price} for the symbols Yahoo has a price for"""
+        import yfinance as yf
+
+        tickers = yf.Tickers(" ".join(symbols))
+        prices = {}
+        for symbol in symbols:
+            try:
+                price = tickers.tickers[symbol].fast_info["last_price"]
+            except Exception:
+                continue
+            if price:
+                prices[symbol] = float(price)
+        return prices
+
+    def listing_price(self, symbol):
+        """Open of the first daily candle"""
+        import yfinance as yf
+
+        history = yf.Ticker(symbol).history(period="max", interval="1d")
+        if history.empty:
+            return None
+        return float(history["Open"].iloc[0])
+
+
+class StubQuotes:
+    """Deterministic random-walk prices; counts the symbols asked for"""
+    URL = "stub://quotes/"
+
+    def __init__(self, seed=0, start=100.0):
+        self.random = random.Random(seed)
+        self.start = start
+        self.prices = {}
+        self.requested = {}
+
+    def quotes(self, symbols):
+        for symbol in symbols:
+            price = self.prices.get(symbol, self.start)
+            self.prices[symbol] = round(price * (1 + self.random.uniform(-0.01, 0.01)), 2)
+            self.requested[symbol] = self.requested.get(symbol, 0) + 1
+        return {symbol: self.prices[symbol] for symbol in symbols}
+
+    def listing_price(self, symbol):
+        return self.start
+
+
+# ---------------- SCHEDULE ----------------
+
+def parse_price(text):
+    """Same as the server's parsePrice: digits and dots of a display string"""
+    cleaned = "".join(c for c in str(text or "") if c.isdigit() or c == ".")
+    try:
+        return float(cleaned)
+    except ValueError:
+        return 0.0
+
+
+def guess_symbol(ipo_name):
+    """The server's findTicker heuristic: first word of the name on NSE"""
+    name = re.sub(r"IPO|Limited|Ltd|Pvt|Private|Public", "", ipo_name, flags=re.I)
+    words = re.sub(r"[^a-zA-Z0-9 ]", "", name).split()
+    return f"{words[0].upper()}.NS" if words else None
+
+
+def tier_of(listing_day, today):
+    if listing_day is None:
+        return "old"
+    if listing_day == today:
+        return "listing"
+    if (today - listing_day).days <= RECENT_DAYS:
+        return "recent"
+    return "old"
+
+
+def next_poll(tier, moment):
+    """When a symbol of this tier is polled next, after a poll at `moment`"""
+    if tier == "listing":
+        return market.next_open(moment + timedelta(seconds=LISTING_DAY_SECONDS))
+    if tier == "recent":
+        return market.next_open(moment + timedelta(seconds=RECENT_SECONDS))
+    return market.next_close(moment)
+
+
+class PriceWatcher:
+    def __init__(self, collection, quotes, clock=None, sleep=time.sleep, dry_run=False):
+        self.collection = collection
+        self.quotes = quotes
+        self.clock = clock or (lambda: datetime.now(timezone.utc))
+        self.sleep = sleep
+        self.dry_run = dry_run
+        self.watched = {}  # symbol -> {_id, tier, issue_price, listing_price}
+        self.due = {}      # symbol -> next poll
+        self.reload_at = None
+        self.tiers = None
+
+    def load(self, now):
+        """(Re)reads the listed IPOs and assigns each symbol its tier"""
+        today = now.astimezone(IST).date()
+        # Archived IPOs (utils/tiering.py) keep their last price
+        query = {"$or": [{"dates.listing": {"$lte": now}}, {"values.listing at": {"$gt": ""}}], "archived": {"$ne": True}}
+        watched = {}
+
+        for ipo in self.collection.find(query, PROJECTION):
+            values = ipo.get("values") or {}
+            listing = (ipo.get("dates") or {}).get("listing")
+            if listing is not None:
+                listing = listing.replace(tzinfo=listing.tzinfo or timezone.utc)
+            # The 'listing at' branch also matches upcoming IPOs ("BSE, NSE"), so re-check both
+            listed = listing is not None and listing <= now
+            if not listed and parse_price(values.get("listing at")) <= 0:
+                continue
+            symbol = values.get("symbol") or guess_symbol(ipo["ipo_name"])
+            if not symbol:
+                continue
+            if not values.get("symbol") and not self.dry_run:
+                self.collection.update_one({"_id": ipo["_id"]}, {"$set": {"values.symbol": symbol}})
+
+            if listing is not None:
+                listing = listing.astimezone(IST).date()
+            watched[symbol] = {
+                "_id": ipo["_id"],
+                "tier": tier_of(listing, today),
+                "issue_price": parse_price(values.get("issue price")),
+                "listing_price": (ipo.get("live") or {}).get("listingPrice") or None,
+            }
+
+        for symbol, entry in watched.items():
+            previous = self.watched.get(symbol)
+            if previous is None or previous["tier"] != entry["tier"] or symbol not in self.due:
+                self.due[symbol] = market.next_open(now) if entry["tier"] != "old" else market.next_close(now)
+        for symbol in set(self.due) - set(watched):
+            del self.due[symbol]
+        self.watched = watched
+
+        self.reload_at = market.next_open(now + timedelta(seconds=RELOAD_SECONDS))
+        tiers = {}
+        for entry in watched.values():
+            tiers[entry["tier"]] = tiers.get(entry["tier"], 0) + 1
+        if tiers != self.tiers:
+            print(f"📋 Watching {len(watched)} symbols {tiers}")
+        self.tiers = tiers
+
+    def poll(self, symbols, now):
+        for i in range(0, len(symbols), BATCH_SIZE):
+            batch = symbols[i:i + BATCH_SIZE]
+            started = time.perf_counter()
+            try:
+                with current().phase("fetch"):
+                    prices = self.quotes.quotes(batch)
+            except Exception as e:
+                current().record_request(self.quotes.URL, "error", time.perf_counter() - started, 0)
+                current().record_error()
+                print(f"   ❌ Quotes for {len(batch)} symbols: {e}")
+                continue
+            current().record_request(self.quotes.URL, 200, time.perf_counter() - started, 0)
+
+            for symbol, price in prices.items():
+                self.save(symbol, price, now)
+
+        for symbol in symbols:
+            self.due[symbol] = next_poll(self.watched[symbol]["tier"], now)
+
+    def save(self, symbol, price, now):
+        entry = self.watched[symbol]
+        if entry["listing_price"] is None:
+            entry["listing_price"] = self.quotes.listing_price(symbol) or 0
+        issue_price = entry["issue_price"] or entry["listing_price"]
+        change = (price - issue_price) / issue_price * 100 if issue_price > 0 else 0
+
+        if self.dry_run:
+            print(f"   {symbol}: {price} ({change:+.1f}%)")
+            return
+        started = time.perf_counter()
+        with current().phase("write"):
+            self.collection.update_one({"_id": entry["_id"]}, {"$set": {"live": {
+                "price": price,
+                "listingPrice": entry["listing_price"],
+                "changePercent": change,
+                "lastUpdated": now,
+            }}})
+        current().record_write(1, time.perf_counter() - started)
+
+    def run(self, until=None):
+        while True:
+            now = self.clock()
+            if until is not None and now >= until:
+                return
+            if self.reload_at is None or now >= self.reload_at:
+                self.load(now)
+
+            symbols = sorted(symbol for symbol, due in self.due.items() if due <= now)
+            if symbols:
+                self.poll(symbols, now)
+
+            wake = min(list(self.due.values()) + [self.reload_at])
+            if until is not None:
+                wake = min(wake, until)
+            self.sleep(max((wake - self.clock()).total_seconds(), 0))
+
+
+@recorded_run("prices")
+def main(dry_run=False, stub=False, max_seconds=None):
+    watcher = PriceWatcher(
+        get_collection(COLLECTION_NAME),
+        StubQuotes() if stub else YahooQuotes(),
+        dry_run=dry_run,
+    )
+    until = datetime.now(timezone.utc) + timedelta(seconds=max_seconds) if max_seconds else None
+    try:
+        watcher.run(until=until)
+    except KeyboardInterrupt:
+        print("⏹️ Stopped")
+
+
+if __name__ == "__main__":
+    main()
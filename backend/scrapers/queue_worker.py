@@ -0,0 +1,104 @@
+"""
+Distributed scraping through the Mongo job queue (utils/jobqueue.py).
+
+    python -m scrapers chittorgarh --enqueue              # producer: one job per IPO page
+    python -m scrapers queue-worker --sources chittorgarh,groww
+
+Start as many workers as needed, on one host or many; they share the
+queue and each one holds only its in-flight job.
+"""
+import time
+import importlib
+
+from utils.db import get_collection
+from utils import jobqueue
+from utils.metrics import current, recorded_run
+from utils.ratelimit import CircuitOpenError
+
+POLL_SECONDS = 5
+REAP_EVERY = 12  # polls
+# A source whose circuit opened is handed back to other workers after this delay
+CIRCUIT_RELEASE_SECONDS = 600
+
+
+def load_source(source):
+    return importlib.import_module(f"scrapers.{source}_scraper")
+
+
+def enqueue_source(source, dry_run=False):
+    """Lists the source's pages for this cycle and queues one job per page"""
+    module = load_source(source)
+    driver = module.setup_driver() if module.NEEDS_BROWSER else None
+    try:
+        payloads = module.list_jobs(driver)
+    finally:
+        if driver is not None:
+            driver.quit()
+
+    if dry_run:
+        print(f"📝 Dry run: would queue {len(payloads)} {source} jobs")
+        return 0
+
+    jobs = get_collection(jobqueue.QUEUE_COLLECTION)
+    jobqueue.ensure_indexes(jobs)
+    queued = jobqueue.enqueue(jobs, source, payloads, url_key=module.JOB_URL_KEY)
+    print(f"✅ Queued {queued} {source} jobs")
+    return queued
+
+
+@recorded_run("queue")
+def run(sources, exit_when_idle=False, dry_run=False):
+    modules = {source: load_source(source) for source in sources}
+    jobs = get_collection(jobqueue.QUEUE_COLLECTION)
+    ipos = None if dry_run else get_collection("ipos")
+    worker = jobqueue.worker_name()
+    driver = None
+    polls = 0
+
+    print(f"👷 Worker {worker} consuming {', '.join(sources)}")
+    try:
+        while sources:
+            polls += 1
+            if polls % REAP_EVERY == 0:
+                jobqueue.reap(jobs)
+
+            job = jobqueue.claim(jobs, worker, sources)
+            if job is None:
+                if exit_when_idle:
+                    break
+                time.sleep(POLL_SECONDS)
+                continue
+
+            module = modules[job["source"]]
+            if module.NEEDS_BROWSER and driver is None:
+                driver = module.setup_driver()
+
+            print(f"[{job['source']}] {job['url']} (attempt {job['attempts']})")
+            with jobqueue.Heartbeat(jobs, job, worker) as beat:
+                try:
+                    module.process_job(job["payload"], ipos, dry_run=dry_run, driver=driver)
+                    error = None
+                except Exception as e:
+                    error = e
+
+            if beat.lost.is_set():
+                print("   ⚠️ Lease lost; another worker owns this job now")
+            elif isinstance(error, CircuitOpenError):
+                print(f"   ⛔ {error}; this worker stops taking {job['source']} jobs")
+                jobqueue.release(jobs, job, worker, CIRCUIT_RELEASE_SECONDS)
+                sources = [s for s in sources if s != job["source"]]
+            elif error is not None:
+                current().record_error()
+                print(f"   ❌ {error}")
+                jobqueue.fail(jobs, job, worker, error)
+                if driver is not None and module.NEEDS_BROWSER:
+                    # Start from a clean browser after a failed page
+                    driver.quit()
+                    driver = None
+            else:
+                jobqueue.complete(jobs, job, worker)
+    finally:
+        if driver is not None:
+            driver.quit()
+
+    print(f"✅ Queue empty: {jobqueue.counts(jobs)}")
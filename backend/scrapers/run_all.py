@@ -3,9 +3,13 @@ import time
 from datetime import datetime
 import os
 import sys
+import uuid
+import argparse
 import logging
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from utils.mailer import send_email_report
+from utils.metrics import load_run
+from utils import profiling, transport, records, staging
 from pymongo import MongoClient
 from thefuzz import fuzz
 from dotenv import load_dotenv
@@ -27,25 +31,56 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 SCRAPERS = [
-    ("chittorgarh_scraper.py", "Chittorgarh"),
-    ("investorgain_scraper.py", "InvestorGain"),
-    ("sptulsian_scraper.py", "SP Tulsian"),
-    ("groww_scraper.py", "Groww")
+    ("chittorgarh_scraper.py", "Chittorgarh", "chittorgarh"),
+    ("investorgain_scraper.py", "InvestorGain", "investorgain"),
+    ("sptulsian_scraper.py", "SP Tulsian", "sptulsian"),
+    ("groww_scraper.py", "Groww", "groww")
 ]
 
+
+def format_metrics_html(summary):
+    """Renders one scraper's logged metrics as a small report table"""
+    http = summary["http"]
+    mongo = summary["mongo"]
+    parse = summary["parse"]
+
+    rows = [
+        ("Duration", f"{summary['duration']:.1f} s"),
+        ("HTTP requests", f"{http['requests']} ({http['bytes'] / 1024:.0f} KiB)"),
+        ("Avg request latency", f"{http['latency']['sum'] / max(http['latency']['count'], 1):.2f} s"),
+        ("Pages parsed", f"{parse['count']} (avg {parse['sum'] / max(parse['count'], 1) * 1000:.0f} ms)"),
+        ("Mongo writes", f"{mongo['docs_written']} docs in {mongo['latency']['sum']:.2f} s"),
+        ("Errors", summary["errors"]),
+    ]
+    browser = summary.get("browser") or {}
+    if browser.get("pages"):
+        rows.append(("Chrome memory", f"{browser['rss_mean_mb']:.0f} MB avg, {browser['rss_peak_mb']:.0f} MB peak"))
+    if summary.get("freshness_lag") is not None:
+        rows.append(("Data age before run", f"{summary['freshness_lag'] / 3600:.1f} h"))
+    for host, state in summary.get("hosts", {}).items():
+        rows.append((f"Host: {host}", "⛔ circuit open" if state["open"] else f"{state['rate']} req/s at end"))
+    for phase, seconds in sorted(summary["phases"].items(), key=lambda p: -p[1]):
+        rows.append((f"Phase: {phase}", f"{seconds:.1f} s"))
+
+    html = "<table style='font-size: 13px; border-collapse: collapse;'>"
+    for label, value in rows:
+        html += f"<tr><td style='padding: 2px 12px 2px 0; color: #6b7280;'>{label}</td><td>{value}</td></tr>"
+    return html + "</table>"
+
 def find_duplicates(db):
     """
     Finds potential duplicate IPOs based on name similarity.
-    Returns a list of tuples: (ipo1_doc, ipo2_doc, score)
+    Returns a list of dicts: {id1, name1, id2, name2, score}
     """
-    ipos = list(db.ipos.find({}, {"ipo_name": 1, "_id": 1}))
+    ipos = records.load(db.ipos, fields=["name"])
+    names = [ipo.name.lower() for ipo in ipos]
     duplicates = []
     seen = set()
 
     for i in range(len(ipos)):
         for j in range(i + 1, len(ipos)):
-            name1 = ipos[i].get("ipo_name", "").lower()
-            name2 = ipos[j].get("ipo_name", "").lower()
+            name1 = names[i]
+            name2 = names[j]
             
             # Skip empty names
             if not name1 or not name2:
@@ -59,13 +94,13 @@ def find_duplicates(db):
             
             if score > 85: # Threshold for "Possible Duplicate"
                 # Avoid listing A-B and B-A
-                pair_key = tuple(sorted([str(ipos[i]["_id"]), str(ipos[j]["_id"])]))
+                pair_key = tuple(sorted([str(ipos[i].id), str(ipos[j].id)]))
                 if pair_key not in seen:
                     duplicates.append({
-                        "id1": str(ipos[i]["_id"]),
-                        "name1": ipos[i]["ipo_name"],
-                        "id2": str(ipos[j]["_id"]),
-                        "name2": ipos[j]["ipo_name"],
+                        "id1": str(ipos[i].id),
+                        "name1": ipos[i].name,
+                        "id2": str(ipos[j].id),
+                        "name2": ipos[j].name,
                         "score": score
                     })
                     seen.add(pair_key)
@@ -74,6 +109,13 @@ def find_duplicates(db):
 
 def run_scrapers():
     start_time = time.time()
+
+    # Scrapers log their metrics under this id so the report can find them
+    run_id = uuid.uuid4().hex[:12]
+    if staging.enabled():
+        # Scrapers stage their writes; they reach `ipos` together after the last one
+        print(f"📥 Staging writes of cycle {staging.begin(run_id)}")
+    env = dict(os.environ, IPO_RADAR_RUN_ID=run_id)
     
     # 1. Run Scrapers
     report_lines = []
@@ -83,7 +125,7 @@ def run_scrapers():
 
     total_success = 0
     
-    for script, name in SCRAPERS:
+    for script, name, source in SCRAPERS:
         print(f"🚀 Running {name} Scraper...")
         logger.info(f"Starting {name} scraper")
         report_lines.append(f"<h3>{name}</h3>")
@@ -94,10 +136,16 @@ def run_scrapers():
                 capture_output=True, 
                 text=True,
                 check=False,
-                timeout=300  # 5 minute timeout
+                timeout=300,  # 5 minute timeout
+                env=env
             )
-            output = result.stdout
-            saved_count = output.count("✅ Saved") + output.count("✅ Updated")
+            summary = load_run(run_id).get(source)
+            if summary:
+                saved_count = summary["mongo"]["docs_written"]
+            else:
+                # Scraper died before logging metrics; fall back to its output
+                output = result.stdout
+                saved_count = output.count("✅ Saved") + output.count("✅ Updated")
             status_icon = "✅" if result.returncode == 0 else "❌"
             
             print(f"   {status_icon} Finished (Updates: {saved_count})")
@@ -105,6 +153,8 @@ def run_scrapers():
             
             report_lines.append(f"<p><strong>Status:</strong> {status_icon} (Exit Code: {result.returncode})</p>")
             report_lines.append(f"<p><strong>Records Updated:</strong> {saved_count}</p>")
+            if summary:
+                report_lines.append(format_metrics_html(summary))
             
             if result.stderr:
                 logger.warning(f"{name} scraper stderr: {result.stderr[-500:]}")
@@ -124,6 +174,14 @@ def run_scrapers():
             print(f"   ❌ Failed to launch: {e}")
             report_lines.append(f"<p>❌ Critical Failure: {str(e)}</p>")
 
+    if staging.enabled():
+        print("\n📤 Publishing Staged Writes...")
+        try:
+            staging.publish_cycle()
+        except Exception as e:
+            logger.exception(f"Publishing cycle {run_id} failed: {e}")
+            report_lines.append(f"<p>❌ Publishing staged writes failed: {e}</p>")
+
     # 2. Check for Duplicates
     try:
         mongo_uri = os.getenv("MONGO_URI")
@@ -169,15 +227,42 @@ def run_scrapers():
     print("\n📧 Sending email report...")
     send_email_report(subject, body)
     
-    # 3. Notify Subscribers
+    # 3. Re-index the expert analysis and strengths/risks written this cycle
+    print("\n🔎 Updating Search Index...")
+    subprocess.run(["python3", "-m", "utils.search", "update"], cwd="..", check=False)
+
+    print("\n🔗 Updating Similar IPOs...")
+    subprocess.run(["python3", "-m", "utils.neighbors", "run"], cwd="..", check=False)
+
+    # 4. Notify Subscribers
     print("\n🔔 Notifying Subscribers...")
     subprocess.run(["python3", "../notifications/notify_subscribers.py"], check=False)
     
-    # 4. Send Admin Summary
+    # 5. Allotment results for subscribers (no-op outside allotment days)
+    print("\n📋 Checking Allotment Status...")
+    subprocess.run(["python3", "../notifications/allotment_checker.py"], check=False)
+
+    # 6. Move IPOs listed long ago out of the hot collection
+    print("\n🧊 Archiving Old IPOs...")
+    subprocess.run(["python3", "-m", "utils.tiering", "run"], cwd="..", check=False)
+
+    # 7. Send Admin Summary
     print("\n📊 Sending Admin Summary...")
     subprocess.run(["python3", "../notifications/notify_admin.py"], check=False)
     
     print("✅ Done.")
 
 if __name__ == "__main__":
-    run_scrapers()
+    parser = argparse.ArgumentParser(description="Run all IPO Radar scrapers and notifiers")
+    profiling.add_arguments(parser)
+    transport.add_arguments(parser)
+    parser.add_argument("--staged", action="store_true", help="publish the scrapers' writes together at the end (STAGED_WRITES=1)")
+    args = parser.parse_args()
+    if args.staged:
+        os.environ["STAGED_WRITES"] = "1"
+    # Scrapers and notifiers started below inherit the profiling and transport settings
+    profiling.enable_from_args(args)
+    transport.enable_from_args(args)
+
+    with profiling.profile_from_env("run_all"):
+        run_scrapers()
@@ -1,10 +1,19 @@
-import requests
-from bs4 import BeautifulSoup
 import json
 import time
 import os
+import sys
 from dotenv import load_dotenv
-from pymongo import MongoClient
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.db import get_collection
+from utils import http
+from utils.metrics import current, recorded_run
+from utils.store import save_ipo
+from utils.parsing import parse
+from utils.ratelimit import CircuitOpenError
+
+# requests / bs4 are imported on first use so that
+# `python -m scrapers` commands start without paying for them
 
 load_dotenv()
 
@@ -16,25 +25,20 @@ HEADERS = {
 }
 
 # MongoDB Setup
-MONGO_URI = os.getenv("MONGO_URI")
-DB_NAME = "ipo-radar"
 COLLECTION_NAME = "ipos"
 
-try:
-    client = MongoClient(MONGO_URI)
-    db = client[DB_NAME]
-    collection = db[COLLECTION_NAME]
-    print("✅ Connected to MongoDB")
-except Exception as e:
-    print("❌ MongoDB Connection Error:", e)
-    client = None
+# Job queue settings: whether process_job needs a driver, and the payload key that identifies a job
+NEEDS_BROWSER = False
+JOB_URL_KEY = "ipo_url"
 
 
 def get_root_ipos():
-    res = requests.get(ROOT_URL, headers=HEADERS, timeout=20)
+    with current().phase("fetch"):
+        res = http.get(ROOT_URL, headers=HEADERS, timeout=20)
     res.raise_for_status()
 
-    soup = BeautifulSoup(res.text, "html.parser")
+    with current().parsing():
+        soup = parse(res.text, "sptulsian_list")
 
     ipos = []
     cards = soup.find_all("div", class_="listing-article-class")
@@ -90,10 +94,12 @@ def get_root_ipos():
 
 
 def get_ipo_detail(ipo):
-    res = requests.get(ipo["ipo_url"], headers=HEADERS, timeout=20)
+    with current().phase("fetch"):
+        res = http.get(ipo["ipo_url"], headers=HEADERS, timeout=20)
     res.raise_for_status()
 
-    soup = BeautifulSoup(res.text, "html.parser")
+    with current().parsing():
+        soup = parse(res.text, "sptulsian_article")
 
     article = soup.select_one("div.card-body.padding-0-xs")
 
@@ -177,42 +183,63 @@ def get_ipo_detail(ipo):
     }
 
 
-def main():
-    if not client:
-        print("Aborting due to no DB connection")
-        return
+# ---------------- JOBS ----------------
 
+def list_jobs(driver=None):
+    """Analysis articles for this cycle (one queue job each)"""
     print("🔍 Fetching IPO list from SP Tulsian...")
     ipos = get_root_ipos()
     print(f"✅ Found {len(ipos)} IPOs")
+    return ipos
+
+
+def process_job(ipo, collection, dry_run=False, driver=None):
+    details = get_ipo_detail(ipo)
+
+    # Prepare Update
+    update_data = {
+        "values.expert_summary": details.get("article_text"),
+        "values.sptulsian_url": details.get("ipo_url"),
+        "raw_html.expert_analysis": details.get("article_html"),
+        "raw_html.expert_analysis_clean": details.get("clean_analysis_html"),
+        "values.expert_warning": details.get("root_warning"),
+        "values.expert_description": ipo.get("short_description"),
+        "values.logo_url": details.get("logo_url")
+    }
+
+    if dry_run:
+        print(f"   📝 Dry run: analysis {len(details.get('article_text') or '')} chars")
+    else:
+        # Upsert into MongoDB
+        # Match by Name
+        save_ipo(collection, ipo['ipo_name'], update_data)
+        print(f"   ✅ Updated {ipo['ipo_name']}")
+
+
+@recorded_run("sptulsian")
+def main(dry_run=False):
+    collection = None
+    if not dry_run:
+        try:
+            collection = get_collection(COLLECTION_NAME)
+            print("✅ Connected to MongoDB")
+        except Exception as e:
+            print("❌ MongoDB Connection Error:", e)
+            print("Aborting due to no DB connection")
+            return
+
+    ipos = list_jobs()
 
     for i, ipo in enumerate(ipos, 1):
         print(f"📄 [{i}/{len(ipos)}] {ipo['ipo_name']}")
         try:
-            details = get_ipo_detail(ipo)
-            
-            # Prepare Update
-            update_data = {
-                "values.expert_summary": details.get("article_text"),
-                "values.sptulsian_url": details.get("ipo_url"),
-                "raw_html.expert_analysis": details.get("article_html"),
-                "raw_html.expert_analysis_clean": details.get("clean_analysis_html"), 
-                "values.expert_warning": details.get("root_warning"),
-                "values.expert_description": ipo.get("short_description"),
-                "values.logo_url": details.get("logo_url")
-            }
-            
-            # Upsert into MongoDB
-            # Match by Name
-            collection.update_one(
-                {"ipo_name": ipo['ipo_name']},
-                {"$set": update_data},
-                upsert=True
-            )
-            print(f"   ✅ Updated {ipo['ipo_name']}")
-            
-            time.sleep(1)
+            process_job(ipo, collection, dry_run=dry_run)
+        except CircuitOpenError as e:
+            current().record_error()
+            print(f"⛔ {e}; skipping the rest of this run")
+            break
         except Exception as e:
+            current().record_error()
             print("❌ Failed:", ipo["ipo_name"], e)
 
     print("✅ SP Tulsian Scraper finished.")
@@ -7,6 +7,7 @@ const sgMail = require('@sendgrid/mail');
 const cron = require('node-cron');
 const { exec } = require('child_process');
 const path = require('path');
+const net = require('net');
 const helmet = require('helmet');
 const rateLimit = require('express-rate-limit');
 const YahooFinance = require("yahoo-finance2").default;
@@ -208,9 +209,21 @@ const UserSchema = new mongoose.Schema({
         frequency: { type: String, default: '1day' },
         emailEnabled: { type: Boolean, default: false },
         lastNotificationSentAt: { type: Date }
-    }
+    },
+    // PANs / application numbers checked by backend/notifications/allotment_checker.py
+    allotmentIds: { type: [String], default: [] },
+    // Digest shard bucket, see backend/notifications/notify_shards.py
+    notifyBucket: { type: Number }
 }, { timestamps: true });
 
+// Same formula as notify_bucket() in backend/notifications/notify_shards.py
+const NOTIFY_BUCKETS = 1024;
+UserSchema.pre('save', function () {
+    if (this.notifyBucket == null) {
+        this.notifyBucket = parseInt(this._id.toString().slice(-6), 16) % NOTIFY_BUCKETS;
+    }
+});
+
 const User = mongoose.model('User', UserSchema);
 
 // IPO Schema
@@ -225,6 +238,24 @@ const IPOSchema = new mongoose.Schema({
 
 const IPO = mongoose.model('IPO', IPOSchema);
 
+// Complete documents of IPOs archived by backend/utils/tiering.py; their
+// `ipos` document keeps only the summary fields and `archived: true`
+const IPOArchive = mongoose.model('IPOArchive', new mongoose.Schema({}, {
+    collection: 'ipos_archive', strict: false, versionKey: false, autoIndex: false
+}));
+
+// Archive copy overlaid with the hot document (hot fields win)
+function mergeTiers(cold, hot) {
+    if (!cold) return hot;
+    const merged = { ...cold };
+    // Only plain sub-documents are merged; arrays, dates and ObjectIds are values
+    const isPlain = (v) => v !== null && typeof v === 'object' && Object.getPrototypeOf(v) === Object.prototype;
+    for (const [key, value] of Object.entries(hot)) {
+        merged[key] = isPlain(value) && isPlain(merged[key]) ? mergeTiers(merged[key], value) : value;
+    }
+    return merged;
+}
+
 // Password Reset Schema
 const PasswordResetSchema = new mongoose.Schema({
     email: { type: String, required: true },
@@ -234,6 +265,35 @@ const PasswordResetSchema = new mongoose.Schema({
 
 const PasswordReset = mongoose.model('PasswordReset', PasswordResetSchema);
 
+// IPO change log, written by the Python scrapers (backend/utils/store.py)
+const IPOChangeSchema = new mongoose.Schema({
+    version: { type: Number, required: true },
+    ipo_name: { type: String, required: true },
+    created: { type: Boolean },
+    changed: { type: mongoose.Schema.Types.Mixed },
+    at: { type: Date }
+}, { collection: 'ipo_changes', versionKey: false, autoIndex: false });
+
+const IPOChange = mongoose.model('IPOChange', IPOChangeSchema);
+
+// Compact list-view documents, maintained by the Python scrapers (backend/utils/summaries.py)
+const IPOSummarySchema = new mongoose.Schema({
+    ipo_name: { type: String, required: true },
+    ipo_id: { type: mongoose.Schema.Types.ObjectId },
+    status: { type: String }
+}, { collection: 'ipo_summaries', strict: false, versionKey: false, autoIndex: false });
+
+const IPOSummary = mongoose.model('IPOSummary', IPOSummarySchema);
+
+// Similar past IPOs of each IPO, precomputed by backend/utils/neighbors.py
+const IPONeighborsSchema = new mongoose.Schema({
+    ipo_name: { type: String, required: true },
+    ipo_id: { type: mongoose.Schema.Types.ObjectId },
+    neighbors: { type: mongoose.Schema.Types.Mixed }
+}, { collection: 'ipo_neighbors', strict: false, versionKey: false, autoIndex: false });
+
+const IPONeighbors = mongoose.model('IPONeighbors', IPONeighborsSchema);
+
 
 // --- API ROUTES ---
 
@@ -542,8 +602,10 @@ app.post('/api/reset-password', async (req, res) => {
 });
 
 // Update Profile / Preferences
+const MAX_ALLOTMENT_IDS = 10;
+
 app.post('/api/profile', async (req, res) => {
-    let { email, name, preferences } = req.body;
+    let { email, name, preferences, allotmentIds } = req.body;
 
     if (!email) {
         return res.status(400).json({ error: 'Email is required' });
@@ -564,6 +626,17 @@ app.post('/api/profile', async (req, res) => {
         if (name !== undefined && name.trim()) {
             updateFields.name = sanitizeInput(name.trim());
         }
+        if (allotmentIds !== undefined) {
+            // PANs (ABCDE1234F) or numeric application numbers
+            if (!Array.isArray(allotmentIds) || allotmentIds.length > MAX_ALLOTMENT_IDS) {
+                return res.status(400).json({ error: `allotmentIds must be a list of at most ${MAX_ALLOTMENT_IDS} ids` });
+            }
+            const ids = allotmentIds.map(id => String(id).trim().toUpperCase());
+            if (!ids.every(id => /^[A-Z]{5}[0-9]{4}[A-Z]$/.test(id) || /^[0-9]{6,20}$/.test(id))) {
+                return res.status(400).json({ error: 'Invalid PAN or application number' });
+            }
+            updateFields.allotmentIds = [...new Set(ids)];
+        }
 
         const user = await User.findOneAndUpdate(
             { email },
@@ -594,7 +667,8 @@ app.get('/api/profile', async (req, res) => {
         res.json({
             name: user.name,
             email: user.email,
-            preferences: user.preferences
+            preferences: user.preferences,
+            allotmentIds: user.allotmentIds
         });
     } catch (err) {
         console.error('Get profile error:', err);
@@ -625,7 +699,7 @@ app.post('/api/unsubscribe', async (req, res) => {
                     'preferences.newIPOs': false,
                     'preferences.closingSoon': false,
                     'preferences.listingDate': false,
-                    'preferences.allotmentStatus': false
+                    'preferences.allotmentOut': false
                 }
             },
             { new: true }
@@ -673,35 +747,26 @@ const parsePrice = (str) => {
     return isNaN(val) ? 0 : val;
 };
 
-// Helper to parse dates
-const parseDate = (str) => {
-    if (!str) return null;
-    // Try standard parse
-    const d = new Date(str);
-    if (!isNaN(d.getTime())) return d;
-    return null;
-};
-
 // Core Logic: Fetch and Update Prices
 async function updateLivePrices() {
     console.log('🔄 Starting background price update via Yahoo Finance...');
     try {
-        const allIPOs = await IPO.find().sort({ updatedAt: -1 });
-
-        // Filter for listed IPOs
-        const listedIPOs = allIPOs.filter(ipo => {
-            const listingAt = ipo.values?.['listing at'];
-            const listingDateStr = ipo.values?.['listing date'] || ipo.values?.['listed on'];
-
-            if (listingDateStr) {
-                const d = parseDate(listingDateStr);
-                // Listed in the past (or today)
-                if (d && d <= new Date()) return true;
-            }
-            // Fallback
-            const price = parsePrice(listingAt);
-            if (price > 0) return true;
-            return false;
+        // Listed IPOs: listing date (parsed by the scrapers, see backend/utils/ipocalendar.py)
+        // in the past or today, or a scraped listing price. Both branches are indexed.
+        // Archived IPOs (backend/utils/tiering.py) keep their last price.
+        const now = new Date();
+        const candidates = await IPO.find({
+            $or: [
+                { 'dates.listing': { $lte: now } },
+                { 'values.listing at': { $gt: '' } }
+            ],
+            archived: { $ne: true }
+        }).sort({ updatedAt: -1 });
+
+        // The 'listing at' branch also matches upcoming IPOs ("BSE, NSE"), so re-check both
+        const listedIPOs = candidates.filter(ipo => {
+            const listing = ipo.get('dates.listing');
+            return (listing && listing <= now) || parsePrice(ipo.values?.['listing at']) > 0;
         });
 
         console.log(`🔍 Found ${listedIPOs.length} listed IPOs to check.`);
@@ -834,6 +899,7 @@ app.get('/', (req, res) => {
         version: '1.0.0',
         endpoints: {
             ipos: '/api/ipos',
+            ipoChanges: '/api/ipos/changes?since=<version>',
             liveListings: '/api/live-listings',
             marketStatus: '/api/market-status',
             auth: {
@@ -846,17 +912,102 @@ app.get('/', (req, res) => {
     });
 });
 
-// Fetch IPOs
+// Fetch IPOs (?view=summary returns only the list-view fields)
 app.get('/api/ipos', async (req, res) => {
     try {
+        if (req.query.view === 'summary') {
+            const summaries = await IPOSummary.find({}, { _id: 0 }).sort({ updatedAt: -1 }).lean();
+            return res.json(summaries);
+        }
+
         const ipos = await IPO.find().sort({ updatedAt: -1 }).lean();
-        res.json(ipos);
+        if (req.query.tiers !== 'all') return res.json(ipos);
+
+        // ?tiers=all: complete documents, archived IPOs included
+        const archivedIds = ipos.filter(ipo => ipo.archived).map(ipo => ipo._id);
+        const cold = await IPOArchive.find({ _id: { $in: archivedIds } }).lean();
+        const coldById = new Map(cold.map(doc => [String(doc._id), doc]));
+        res.json(ipos.map(ipo => ipo.archived ? mergeTiers(coldById.get(String(ipo._id)), ipo) : ipo));
     } catch (err) {
         console.error('Error fetching IPOs:', err);
         res.status(500).json({ error: 'Failed to fetch IPO data' });
     }
 });
 
+// Fetch IPO changes after a change-log version (cheap polling instead of re-reading /api/ipos)
+const CHANGES_PAGE_SIZE = 500;
+const CHANGES_GAP_GRACE_MS = 30 * 1000;
+
+app.get('/api/ipos/changes', async (req, res) => {
+    try {
+        const since = parseInt(req.query.since, 10) || 0;
+        const entries = await IPOChange.find({ version: { $gt: since } }, { _id: 0 })
+            .sort({ version: 1 })
+            .limit(CHANGES_PAGE_SIZE)
+            .lean();
+
+        // Stop before a version a scraper has taken but not written yet,
+        // so resuming from `version` never skips a change
+        const cutoff = Date.now() - CHANGES_GAP_GRACE_MS;
+        const changes = [];
+        let expected = since + 1;
+        for (const entry of entries) {
+            if (entry.version !== expected && new Date(entry.at).getTime() > cutoff) break;
+            changes.push(entry);
+            expected = entry.version + 1;
+        }
+
+        res.json({
+            changes,
+            version: changes.length ? changes[changes.length - 1].version : since,
+            more: changes.length === CHANGES_PAGE_SIZE
+        });
+    } catch (err) {
+        console.error('Error fetching IPO changes:', err);
+        res.status(500).json({ error: 'Failed to fetch IPO changes' });
+    }
+});
+
+// Similar past IPOs: GET /api/ipos/similar?name=<ipo_name>
+app.get('/api/ipos/similar', async (req, res) => {
+    try {
+        if (!req.query.name) return res.status(400).json({ error: 'Missing name' });
+        const doc = await IPONeighbors.findOne({ ipo_name: String(req.query.name) }, { _id: 0, neighbors: 1 }).lean();
+        res.json(doc ? doc.neighbors : []);
+    } catch (err) {
+        console.error('Error fetching similar IPOs:', err);
+        res.status(500).json({ error: 'Failed to fetch similar IPOs' });
+    }
+});
+
+// Full-text search over expert analysis and strengths/risks, answered by the
+// resident worker from its in-memory BM25 index (backend/utils/search.py)
+const SEARCH_TIMEOUT_MS = 2000;
+
+app.get('/api/search', (req, res) => {
+    const q = String(req.query.q || '').replace(/[\r\n]+/g, ' ').trim();
+    if (!q) return res.status(400).json({ error: 'Missing query' });
+    if (!process.env.WORKER_SOCKET) return res.status(503).json({ error: 'Search is not available' });
+
+    let reply = '';
+    const sock = net.createConnection(process.env.WORKER_SOCKET, () => sock.write(`search ${q}\n`));
+    sock.setTimeout(SEARCH_TIMEOUT_MS, () => sock.destroy(new Error('timeout')));
+    sock.on('data', (data) => { reply += data.toString(); });
+    sock.on('end', () => {
+        try {
+            const results = JSON.parse(reply);
+            if (results.error) return res.status(500).json({ error: 'Search failed' });
+            res.json(results.map(([id, name, score]) => ({ id, name, score })));
+        } catch (err) {
+            res.status(500).json({ error: 'Search failed' });
+        }
+    });
+    sock.on('error', (err) => {
+        console.error(`❌ Search via worker failed: ${err.message}`);
+        if (!res.headersSent) res.status(503).json({ error: 'Search is not available' });
+    });
+});
+
 // Internal: Create/Update IPO (for Scraper)
 app.post('/api/ipos', async (req, res) => {
     try {
@@ -955,6 +1106,7 @@ app.get('/api/merge', async (req, res) => {
         });
 
         await IPO.findByIdAndDelete(merge);
+        await IPOSummary.deleteOne({ ipo_name: candidate.ipo_name });
 
         res.send(`
             <div style="font-family: sans-serif; text-align: center; padding: 50px;">
@@ -999,6 +1151,7 @@ async function performMerge(masterId, candidateId, res) {
         });
 
         await IPO.findByIdAndDelete(candidateId);
+        await IPOSummary.deleteOne({ ipo_name: candidate.ipo_name });
 
         if (res.json) {
             res.json({ success: true, message: `Merged "${candidate.ipo_name}" into "${master.ipo_name}"` });
@@ -1015,6 +1168,17 @@ async function performMerge(masterId, candidateId, res) {
 // 1. Run Notifications at 9:30 AM and 6:30 PM IST (4:00 AM and 1:00 PM UTC)
 cron.schedule('0 4,13 * * *', () => {
     console.log('⏰ Running Scheduled Notification Script (9:30 AM or 6:30 PM IST)...');
+
+    // Hand the job to the resident Python worker when one is configured
+    if (process.env.WORKER_SOCKET) {
+        const sock = net.createConnection(process.env.WORKER_SOCKET, () => {
+            sock.end('run notify_subscribers\n');
+        });
+        sock.on('data', (data) => console.log(`✅ Worker: ${data.toString().trim()}`));
+        sock.on('error', (err) => console.error(`❌ Worker socket error: ${err.message}`));
+        return;
+    }
+
     exec('cd notifications && python3 notify_subscribers.py', (error, stdout, stderr) => {
         if (error) {
             console.error(`❌ Notification Script Error: ${error.message}`);
@@ -1030,12 +1194,16 @@ cron.schedule('0 4,13 * * *', () => {
 });
 
 // 2. Live Price Polling (Every 2 minutes)
-cron.schedule('*/2 * * * *', () => {
-    updateLivePrices();
-});
+// The Python price watcher (python -m scrapers price-watch) replaces this
+// poll with per-symbol intervals during NSE market hours
+if (!process.env.PRICE_WATCHER) {
+    cron.schedule('*/2 * * * *', () => {
+        updateLivePrices();
+    });
 
-// Run once on startup to populate cache immediately
-updateLivePrices();
+    // Run once on startup to populate cache immediately
+    updateLivePrices();
+}
 
 app.listen(PORT, () => {
     console.log(`Server running at http://localhost:${PORT}`);
@@ -0,0 +1,41 @@
+"""
+Shared fixtures. Run from backend/:
+
+    python -m pytest -q tests
+
+Tests that need MongoDB use the `mongo_db` fixture, which connects to
+MONGO_TEST_URI (default mongodb://localhost:27017) and is skipped when no
+mongod answers. Each test gets a throwaway database that is dropped after.
+"""
+import os
+import sys
+import uuid
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+MONGO_TEST_URI = os.getenv("MONGO_TEST_URI", "mongodb://localhost:27017")
+
+
+@pytest.fixture(scope="session")
+def mongo_client():
+    pymongo = pytest.importorskip("pymongo")
+    from pymongo.errors import PyMongoError
+
+    client = pymongo.MongoClient(MONGO_TEST_URI, serverSelectionTimeoutMS=1000)
+    try:
+        client.admin.command("ping")
+    except PyMongoError:
+        pytest.skip(f"no mongod at {MONGO_TEST_URI}")
+    yield client
+    client.close()
+
+
+@pytest.fixture
+def mongo_db(mongo_client):
+    name = f"ipo_radar_test_{uuid.uuid4().hex[:8]}"
+    yield mongo_client[name]
+    mongo_client.drop_database(name)
@@ -0,0 +1,75 @@
+import pytest
+
+from utils import ipocalendar, ratelimit
+from utils.summaries import SUMMARIES_COLLECTION
+from notifications import allotment_checker
+
+IDS = [f"ABCDE{i:04d}F" for i in range(60)]
+
+
+@pytest.fixture(scope="module")
+def registrar():
+    return allotment_checker.serve_stub()
+
+
+@pytest.fixture(autouse=True)
+def fast_local_host(monkeypatch):
+    # The stand-in is local; do not pace it like a real registrar
+    monkeypatch.setattr(ratelimit, "_limiters", {})
+    monkeypatch.setitem(ratelimit.HOST_LIMITS, "127.0.0.1", (100.0, 50.0, 200.0))
+
+
+@pytest.fixture
+def batches(monkeypatch):
+    calls = []
+    check_batch = allotment_checker.check_batch
+
+    def counting(api_url, registrar, ipo_name, ids):
+        calls.append(len(ids))
+        return check_batch(api_url, registrar, ipo_name, ids)
+
+    monkeypatch.setattr(allotment_checker, "check_batch", counting)
+    return calls
+
+
+def test_stand_in_registrar_answers_a_batch(registrar):
+    results = allotment_checker.check_batch(registrar, "linkintime", "Example Ltd", IDS[:5])
+    assert results == [allotment_checker.stub_result("Example Ltd", app_id) for app_id in IDS[:5]]
+
+
+def test_final_results_are_cached(mongo_db, registrar, batches):
+    ipo = {"ipo_name": "Example Ltd", "values": {"registrar": "Link Intime India Private Ltd"}}
+
+    found = allotment_checker.check_ipo(mongo_db, ipo, IDS, registrar)
+    assert sorted(batches) == [10, 25, 25]
+    assert set(found) == set(IDS)
+    assert {doc["status"] for doc in found.values()} <= allotment_checker.FINAL_STATUSES
+    assert all(IDS[0] not in doc["_id"] for doc in mongo_db[allotment_checker.RESULTS_COLLECTION].find())
+
+    batches.clear()
+    again = allotment_checker.check_ipo(mongo_db, ipo, IDS, registrar)
+    assert batches == []
+    assert {app_id: doc["status"] for app_id, doc in again.items()} == \
+           {app_id: doc["status"] for app_id, doc in found.items()}
+
+
+def test_subscribers_are_emailed_once(mongo_db, registrar, monkeypatch):
+    today = ipocalendar.day_start()
+    mongo_db.ipos.insert_one({"ipo_name": "Example Ltd", "values": {"registrar": "KFin Technologies"}})
+    mongo_db[SUMMARIES_COLLECTION].insert_one({"ipo_name": "Example Ltd", "dates": {"allotment": today}})
+    mongo_db.users.insert_many([
+        {"email": "a@example.com", "allotmentIds": IDS[:3],
+         "preferences": {"emailEnabled": True, "allotmentOut": True}},
+        {"email": "b@example.com", "allotmentIds": IDS[3:4],
+         "preferences": {"emailEnabled": True, "allotmentOut": False}},
+    ])
+    sent = []
+    monkeypatch.setenv("MONGO_URI", "mongodb://test")
+    monkeypatch.setattr(allotment_checker, "get_db", lambda: mongo_db)
+    monkeypatch.setattr(allotment_checker, "send_email_report",
+                        lambda subject, html, to: sent.append((subject, to)) or True)
+
+    assert allotment_checker.main(api_url=registrar) == 1
+    assert sent == [("IPO Radar: Example Ltd allotment status", ["a@example.com"])]
+    assert allotment_checker.main(api_url=registrar) == 0
+    assert len(sent) == 1
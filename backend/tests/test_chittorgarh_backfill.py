@@ -0,0 +1,33 @@
+from scrapers import chittorgarh_scraper as chittorgarh
+
+
+class StoredNames:
+    def __init__(self, names):
+        self.names = names
+
+    def find(self, query, projection):
+        return self
+
+    def hint(self, index):
+        return [{"ipo_name": name} for name in self.names]
+
+
+def test_archive_names_fold_onto_stored_names():
+    ipos = chittorgarh.fold_names(StoredNames(["Example Ltd."]), [
+        {"url": "u1", "ipo_name": "example  ltd. IPO"},
+        {"url": "u2", "ipo_name": "New  Co Ltd IPO"},
+        {"url": "u3", "ipo_name": "NEW CO LTD"},
+    ])
+    assert [ipo["ipo_name"] for ipo in ipos] == ["Example Ltd.", "New Co Ltd IPO", "New Co Ltd IPO"]
+
+
+def test_done_log_is_appended_and_survives_a_torn_line(tmp_path, monkeypatch):
+    monkeypatch.setattr(chittorgarh, "BACKFILL_DONE_LOG", str(tmp_path / "logs" / "backfill.done"))
+    chittorgarh.append_done(["https://example.com/a/1/", "https://example.com/b/2/"])
+    with open(chittorgarh.BACKFILL_DONE_LOG, "a") as f:
+        f.write("https://exam")  # crash mid-write
+    chittorgarh.append_done(["https://example.com/c/3/"])
+
+    done = chittorgarh.load_done()
+    assert {"https://example.com/a/1/", "https://example.com/b/2/"} <= done
+    assert "https://example.com/c/3/" not in done  # glued to the torn line, so it is scraped again
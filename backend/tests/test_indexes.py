@@ -0,0 +1,60 @@
+"""
+Runs the backend's real query functions against a local mongod with the
+profiler on and fails if any of them scanned a whole collection. Queries
+that only exist in server.js (or inline in a script) stay in
+utils.indexes.QUERIES and are explained by test_server_queries.
+"""
+import pytest
+
+from utils import indexes, ipocalendar, jobqueue, staging, store, tiering, urlcache
+from notifications import allotment_checker, notify_shards, notify_subscribers
+from scrapers import chittorgarh_scraper
+
+
+@pytest.fixture
+def db(mongo_db):
+    indexes.apply(mongo_db)  # also creates the collections, so plans are not EOF
+    mongo_db.ipos.insert_one({"ipo_name": "Example Ltd", "url": "https://www.chittorgarh.com/ipo/example-ipo/1/"})
+    # A cached URL, so the lookup below does not go to the network
+    urlcache.remember(urlcache.cache_for(mongo_db.ipos), "https://groww.in/ipo/example", "ok")
+    mongo_db.command("profile", 2)
+    yield mongo_db
+    mongo_db.command("profile", 0)
+
+
+def collection_scans(db):
+    return [
+        f"{entry['op']} {entry['ns']}: {entry.get('command') or entry.get('query')}"
+        for entry in db["system.profile"].find({"planSummary": {"$regex": "COLLSCAN"}})
+    ]
+
+
+QUERY_FUNCTIONS = {
+    "store: save_ipo": lambda db: store.save_ipo(db.ipos, "Example Ltd", {"status": "open"}),
+    "store: changes since": lambda db: store.changes_since(db, 0),
+    "ipocalendar / notify_subscribers: digest data": notify_subscribers.load_digest_data,
+    "tiering: candidates": tiering.candidates,
+    "allotment_checker: IPOs": allotment_checker.allotment_ipos,
+    "allotment_checker: subscribers": allotment_checker.subscribers,
+    "notify_shards: backfill buckets": lambda db: notify_shards.backfill_buckets(db.users),
+    "notify_shards: shard subscribers": lambda db: notify_shards.shard_user_ids(db.users, 3, 16),
+    "chittorgarh backfill: stored pages": lambda db: chittorgarh_scraper.complete_urls(
+        db.ipos, ["https://www.chittorgarh.com/ipo/example-ipo/1/"]),
+    "jobqueue: claim": lambda db: jobqueue.claim(db[jobqueue.QUEUE_COLLECTION], "test-worker", ["chittorgarh"]),
+    "jobqueue: reap": lambda db: jobqueue.reap(db[jobqueue.QUEUE_COLLECTION]),
+    "staging: cycle writes": lambda db: staging.wait_for_writes(db[staging.STAGING_COLLECTION], "c1", timeout=0),
+    "urlcache: lookup": lambda db: urlcache.check(urlcache.cache_for(db.ipos), "https://groww.in/ipo/example"),
+    "ipocalendar: between": lambda db: ipocalendar.between(
+        db, "listing", ipocalendar.tomorrow(), ipocalendar.tomorrow()),
+}
+
+
+@pytest.mark.parametrize("where", sorted(QUERY_FUNCTIONS))
+def test_query_uses_an_index(db, where):
+    QUERY_FUNCTIONS[where](db)
+    assert collection_scans(db) == []
+
+
+def test_server_queries(mongo_db):
+    indexes.apply(mongo_db)
+    assert indexes.check(mongo_db) == 0
@@ -0,0 +1,81 @@
+import threading
+
+import pytest
+
+from utils import jobqueue
+
+
+@pytest.fixture
+def jobs(mongo_db):
+    collection = mongo_db[jobqueue.QUEUE_COLLECTION]
+    jobqueue.ensure_indexes(collection)
+    return collection
+
+
+def payloads(n):
+    return [{"url": f"https://example.com/ipo/{i}"} for i in range(n)]
+
+
+def test_concurrent_workers_claim_each_job_once(jobs):
+    assert jobqueue.enqueue(jobs, "chittorgarh", payloads(40)) == 40
+    claimed = []
+    lock = threading.Lock()
+
+    def work(worker):
+        while True:
+            job = jobqueue.claim(jobs, worker, ["chittorgarh"])
+            if job is None:
+                return
+            with lock:
+                claimed.append(job["_id"])
+            jobqueue.complete(jobs, job, worker)
+
+    threads = [threading.Thread(target=work, args=(f"worker-{i}",)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(claimed) == len(set(claimed)) == 40
+    assert jobqueue.counts(jobs) == {"chittorgarh": {"done": 40}}
+
+
+def test_expired_lease_is_taken_over(jobs):
+    jobqueue.enqueue(jobs, "groww", payloads(1))
+    crashed = jobqueue.claim(jobs, "crashed", ["groww"], lease_seconds=-1)
+    assert jobqueue.claim(jobs, "other", ["sptulsian"]) is None
+
+    job = jobqueue.claim(jobs, "rescuer", ["groww"])
+    assert job["_id"] == crashed["_id"]
+    assert job["attempts"] == 2
+    # The crashed worker comes back: its lease is gone and its writes are ignored
+    assert not jobqueue.heartbeat(jobs, crashed, "crashed")
+    jobqueue.complete(jobs, crashed, "crashed")
+    assert jobs.find_one({"_id": job["_id"]})["state"] == "leased"
+
+    jobqueue.complete(jobs, job, "rescuer")
+    assert jobs.find_one({"_id": job["_id"]})["state"] == "done"
+
+
+def test_failures_back_off_then_give_up(jobs, monkeypatch):
+    monkeypatch.setattr(jobqueue, "RETRY_BACKOFF_SECONDS", 0)
+    jobqueue.enqueue(jobs, "groww", payloads(1))
+
+    for attempt in range(1, jobqueue.MAX_ATTEMPTS + 1):
+        job = jobqueue.claim(jobs, "worker", ["groww"])
+        assert job["attempts"] == attempt
+        jobqueue.fail(jobs, job, "worker", RuntimeError("HTTP 503"))
+
+    stored = jobs.find_one({"_id": job["_id"]})
+    assert stored["state"] == "failed"
+    assert stored["last_error"] == "HTTP 503"
+    assert jobqueue.claim(jobs, "worker", ["groww"]) is None
+
+
+def test_reap_fails_jobs_whose_last_lease_expired(jobs):
+    jobqueue.enqueue(jobs, "groww", payloads(1))
+    jobs.update_many({}, {"$set": {"attempts": jobqueue.MAX_ATTEMPTS - 1}})
+    jobqueue.claim(jobs, "hung", ["groww"], lease_seconds=-1)
+
+    assert jobqueue.reap(jobs) == 1
+    assert jobqueue.counts(jobs) == {"groww": {"failed": 1}}
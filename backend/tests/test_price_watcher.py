@@ -0,0 +1,89 @@
+from datetime import datetime, timedelta
+
+from utils.ipocalendar import IST
+from scrapers.price_watcher import PriceWatcher, StubQuotes
+
+
+class FakeIPOs:
+    """The ipos collection as PriceWatcher uses it: find() and update_one() by _id"""
+
+    def __init__(self, docs):
+        self.docs = {doc["_id"]: doc for doc in docs}
+
+    def find(self, query, projection=None):
+        return [dict(doc) for doc in self.docs.values() if not doc.get("archived")]
+
+    def update_one(self, query, update):
+        doc = self.docs[query["_id"]]
+        for path, value in update["$set"].items():
+            target = doc
+            *parents, last = path.split(".")
+            for part in parents:
+                target = target.setdefault(part, {})
+            target[last] = value
+
+
+class SimulatedClock:
+    def __init__(self, start):
+        self.now = start
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += timedelta(seconds=max(seconds, 0.001))
+
+
+def ipo(_id, symbol, listing, listing_at="", issue_price="100"):
+    return {
+        "_id": _id, "ipo_name": f"{symbol} Ltd", "dates": {"listing": listing},
+        "values": {"symbol": f"{symbol}.NS", "issue price": issue_price, "listing at": listing_at},
+    }
+
+
+def at(day, hour, minute=0):
+    return datetime(2026, 10, day, hour, minute, tzinfo=IST)
+
+
+def watcher_for(start):
+    # Wednesday 21 October 2026 is a trading day
+    collection = FakeIPOs([
+        ipo(1, "NEWCO", at(21, 0)),
+        ipo(2, "RECENT", at(7, 0)),
+        ipo(3, "OLDCO", datetime(2025, 1, 10, tzinfo=IST)),
+        ipo(4, "SOON", at(28, 0), listing_at="BSE, NSE"),
+    ])
+    clock = SimulatedClock(start)
+    quotes = StubQuotes()
+    return PriceWatcher(collection, quotes, clock=clock, sleep=clock.sleep), quotes, collection
+
+
+def test_polls_by_tier_during_market_hours():
+    watcher, quotes, collection = watcher_for(at(21, 10))
+    watcher.run(until=at(21, 10, 10))
+
+    assert quotes.requested["NEWCO.NS"] == 120      # every 5 s
+    assert quotes.requested["RECENT.NS"] == 2       # every 5 min
+    assert "OLDCO.NS" not in quotes.requested       # only at the close
+    assert "SOON.NS" not in watcher.watched         # lists next week
+    assert collection.docs[1]["live"]["price"] > 0
+    assert "live" not in collection.docs[4]
+
+
+def test_old_listings_are_polled_once_at_the_close():
+    watcher, quotes, collection = watcher_for(at(21, 15, 0))
+    watcher.run(until=at(21, 18, 0))
+
+    assert quotes.requested["OLDCO.NS"] == 1
+    assert collection.docs[3]["live"]["lastUpdated"] == at(21, 15, 30)
+    assert collection.docs[1]["live"]["lastUpdated"] < at(21, 15, 30)
+
+
+def test_nothing_is_polled_when_the_market_is_shut():
+    watcher, quotes, _ = watcher_for(at(24, 9))   # Saturday
+    watcher.run(until=at(24, 17))
+    assert quotes.requested == {}
+
+    watcher, quotes, _ = watcher_for(at(20, 9))   # trading holiday
+    watcher.run(until=at(20, 17))
+    assert quotes.requested == {}
@@ -0,0 +1,81 @@
+import threading
+import time
+
+import pytest
+
+from utils import ratelimit
+from utils.ratelimit import CircuitOpenError, HostLimiter
+
+
+def open_circuit(limiter, retry_after=None):
+    for i in range(ratelimit.FAILURE_THRESHOLD):
+        limiter.acquire()
+        last = i == ratelimit.FAILURE_THRESHOLD - 1
+        limiter.record(0.01, status=429, retry_after=retry_after if last else None)
+    assert limiter.open
+
+
+def in_thread(fn):
+    outcome = {}
+
+    def run():
+        try:
+            outcome["result"] = fn()
+        except Exception as e:
+            outcome["error"] = e
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    thread.join()
+    return outcome
+
+
+def test_429_with_retry_after_then_recovery(monkeypatch):
+    monkeypatch.setattr(ratelimit, "COOLDOWN_SECONDS", 0.05)
+    limiter = HostLimiter("example.com", 100.0, 1.0, 100.0)
+    # Retry-After outlasts the cooldown: the probe has to wait inside acquire()
+    open_circuit(limiter, retry_after=0.3)
+
+    with pytest.raises(CircuitOpenError):
+        limiter.acquire()
+    time.sleep(0.1)
+
+    started = time.monotonic()
+    limiter.acquire()  # the probe: waits out Retry-After instead of failing on itself
+    assert time.monotonic() - started > 0.1
+    assert "error" in in_thread(limiter.acquire)  # others still fail fast
+
+    limiter.record(0.01, status=200)
+    assert not limiter.open
+    assert limiter.failures == 0
+    assert "error" not in in_thread(limiter.acquire)
+
+
+def test_failed_probe_reopens(monkeypatch):
+    monkeypatch.setattr(ratelimit, "COOLDOWN_SECONDS", 0.05)
+    limiter = HostLimiter("example.com", 100.0, 1.0, 100.0)
+    open_circuit(limiter)
+    time.sleep(0.06)
+
+    limiter.acquire()
+    limiter.record(0.01, error=True)
+    assert limiter.open
+    with pytest.raises(CircuitOpenError):
+        limiter.acquire()
+
+
+def test_unrecorded_probe_is_given_up(monkeypatch):
+    monkeypatch.setattr(ratelimit, "COOLDOWN_SECONDS", 0.05)
+    monkeypatch.setattr(ratelimit, "PROBE_SECONDS", 0.05)
+    limiter = HostLimiter("example.com", 100.0, 1.0, 100.0)
+    open_circuit(limiter)
+    time.sleep(0.06)
+
+    assert "error" not in in_thread(limiter.acquire)  # probe whose caller never records
+    with pytest.raises(CircuitOpenError):
+        limiter.acquire()
+    time.sleep(0.06)
+
+    limiter.acquire()  # takes over the lost probe
+    limiter.record(0.01, status=200)
+    assert not limiter.open
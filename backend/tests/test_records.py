@@ -0,0 +1,32 @@
+from utils import records, summaries
+
+IPO = {
+    "_id": 1,
+    "ipo_name": "Example Ltd",
+    "status": "open",
+    "values": {
+        "price band": "₹95 to ₹100",
+        "gmp(₹)": "12",
+        "overall subscription": "3.5x",
+        "ipo date": "Jan 1, 2026 to Jan 3, 2026",
+        "listing date": "Jan 8, 2026",
+    },
+}
+
+
+def test_ipo_record_matches_the_summary():
+    summary = summaries.build_summary(IPO)
+    summary["ipo_id"] = IPO["_id"]
+    record = records.IPORecord.from_ipo(IPO)
+    for attr, field in records.SUMMARY_FIELDS.items():
+        assert getattr(record, attr) == summary[field], attr
+
+
+def test_ipo_record_decodes_only_what_is_read(monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError("decoded a field that was not read")
+
+    monkeypatch.setattr(summaries, "parse_number", fail)
+    monkeypatch.setattr(records.ipocalendar, "parse_dates", fail)
+    record = records.IPORecord.from_ipo({"status": "open"})
+    assert (record.name, record.status) == ("", "open")
@@ -0,0 +1,54 @@
+from utils import staging
+
+
+def write(name, fields, upsert=True):
+    return {"ipo_name": name, "fields": [list(pair) for pair in fields.items()], "upsert": upsert, "source": "test"}
+
+
+def test_collapse_folds_name_variants_onto_the_live_name():
+    patches, rejected = staging.collapse([
+        write("Acme  ltd", {"ipo_name": "Acme  ltd", "values.price": "100"}),
+        write("Other", {"ipo_name": "Renamed"}),
+    ], ["Acme Ltd"])
+
+    assert rejected == []
+    acme = patches["Acme Ltd"]["nested"]
+    assert acme == {"ipo_name": "Acme Ltd", "values": {"price": "100"}}
+    assert staging.validate("Acme Ltd", staging.flatten(acme)) is None
+    assert staging.validate("Other", staging.flatten(patches["Other"]["nested"])) == "renames the IPO"
+
+
+def test_publish_replaces_non_document_values(mongo_db):
+    mongo_db.ipos.insert_many([
+        {"ipo_name": "Acme Ltd", "values": None, "dates": "tbd", "status": "open"},
+        {"ipo_name": "Beta Ltd", "values": {"price": "50", "lot": "10"}},
+    ])
+    stage = staging.Stage(mongo_db, "c1")
+    stage.add("Acme Ltd", {"values.price": "100", "dates": {"open": "1 Jan"}}, upsert=True)
+    stage.add("Beta Ltd", {"values.price": "55"}, upsert=True)
+    stage.add("Gamma Ltd", {"values": {"price": "10"}}, upsert=True)
+    stage.close()
+
+    assert staging.publish(mongo_db, "c1") == 3
+    docs = {doc["ipo_name"]: doc for doc in mongo_db.ipos.find()}
+    assert docs["Acme Ltd"]["values"] == {"price": "100"}
+    assert docs["Acme Ltd"]["dates"] == {"open": "1 Jan"}
+    assert docs["Acme Ltd"]["status"] == "open"
+    assert docs["Beta Ltd"]["values"] == {"price": "55", "lot": "10"}
+    assert docs["Gamma Ltd"]["values"] == {"price": "10"}
+
+
+def test_publish_skips_writers_without_manifest(mongo_db, monkeypatch):
+    monkeypatch.setattr(staging, "WAIT_SECONDS", 0)
+    done = staging.Stage(mongo_db, "c2")
+    done.add("Acme Ltd", {"status": "open"}, upsert=True)
+    done.close()
+    killed = staging.Stage(mongo_db, "c2")
+    killed.add("Beta Ltd", {"status": "open"}, upsert=True)
+    killed._flush()  # its process died before close(): no manifest
+
+    assert staging.publish(mongo_db, "c2") == 1
+    assert mongo_db.ipos.find_one({"ipo_name": "Acme Ltd"})
+    assert mongo_db.ipos.find_one({"ipo_name": "Beta Ltd"}) is None
+    left = list(mongo_db[staging.STAGING_COLLECTION].find({"cycle": "c2", "kind": "write"}))
+    assert [doc["writer"] for doc in left] == [killed.writer]
@@ -0,0 +1,12 @@
+import pytest
+
+from scrapers.__main__ import SOURCES, measure_startup, startup_budget_ms
+
+
+@pytest.mark.parametrize("source", sorted(SOURCES))
+def test_command_starts_within_budget(source):
+    elapsed_ms, result = measure_startup(source)
+
+    assert result.returncode == 0, result.stderr
+    assert "heavy modules: -" in result.stdout, f"{source} imports at start-up: {result.stdout}"
+    assert elapsed_ms <= startup_budget_ms(source), f"{source}: {elapsed_ms:.0f} ms"
@@ -0,0 +1,24 @@
+from datetime import datetime, timedelta, timezone
+
+from utils import store, tiering
+
+
+def test_hot_fields_keep_only_the_hot_part():
+    fields = {"status": "closed", "values": {"symbol": "EXL", "risks": "..."}, "html": "<table>"}
+    assert tiering.hot_fields(fields) == {"status": "closed", "values": {"symbol": "EXL"}}
+
+
+def test_cold_writes_to_archived_ipos_skip_ipos(mongo_db):
+    listed = datetime.now(timezone.utc) - timedelta(days=tiering.ARCHIVE_AFTER_DAYS + 1)
+    mongo_db.ipos.insert_one({"ipo_name": "Example Ltd", "status": "listed", "html": "<old>",
+                              "dates": {"listing": listed}})
+    assert tiering.archive(mongo_db) == 1
+
+    change = store.save_ipo(mongo_db.ipos, "Example Ltd", {"html": "<new>", "status": "closed"})
+    assert change["changed"] == {"html": "<new>", "status": "closed"}
+    hot = mongo_db.ipos.find_one({"ipo_name": "Example Ltd"})
+    assert "html" not in hot and hot["status"] == "closed"
+    assert mongo_db[tiering.ARCHIVE_COLLECTION].find_one({"_id": hot["_id"]})["html"] == "<new>"
+
+    store.save_ipo(mongo_db.ipos, "New Ltd", {"html": "<page>", "status": "open"})
+    assert mongo_db.ipos.find_one({"ipo_name": "New Ltd"})["html"] == "<page>"
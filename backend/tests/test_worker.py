@@ -0,0 +1,9 @@
+import sys
+
+import worker
+from scrapers import chittorgarh_scraper
+
+
+def test_plugins_are_the_package_modules():
+    assert worker.load_plugin(worker.PLUGINS["chittorgarh"][0]) is chittorgarh_scraper
+    assert "chittorgarh_scraper" not in sys.modules
@@ -0,0 +1,182 @@
+"""
+Shared headless Chrome setup and page access for the Selenium scrapers.
+
+The lean profile (BROWSER_LEAN=1, the default) blocks images, fonts,
+media and tracker/ad domains through CDP, returns from driver.get at
+DOM-ready and keeps a disk cache under logs/chrome-cache between runs.
+Page-load time and Chrome's resident memory are recorded per page in
+the run metrics, so BROWSER_LEAN=0 runs give the before numbers.
+"""
+import os
+import time
+from utils.metrics import current, LOG_DIR
+from utils.ratelimit import limiter_for
+from utils import transport
+
+LEAN = os.getenv("BROWSER_LEAN", "1") != "0"
+CACHE_DIR = os.getenv("BROWSER_CACHE_DIR", os.path.join(LOG_DIR, "chrome-cache"))
+CACHE_SIZE = 200 * 1024 * 1024
+# Concurrent browsers on one host each get their own cache slot
+CACHE_SLOTS = 8
+
+# Network.setBlockedURLs patterns: resources no scraper reads
+BLOCKED_URLS = [
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.avif", "*.svg", "*.ico",
+    "*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot",
+    "*.mp4", "*.webm", "*.mp3",
+    "*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*",
+    "*googlesyndication.com*", "*googleadservices.com*", "*adservice.google.*",
+    "*facebook.net*", "*connect.facebook.*", "*hotjar.com*", "*clarity.ms*",
+    "*amazon-adsystem.com*", "*taboola.com*", "*outbrain.com*", "*moengage.com*",
+    "*sentry.io*", "*newrelic.com*", "*nr-data.net*",
+]
+
+
+# ---------------- DRIVER ----------------
+
+def _cache_slot():
+    """Locks a free cache directory for this browser; (path, lock file) or (None, None)"""
+    import fcntl
+
+    for slot in range(CACHE_SLOTS):
+        path = os.path.join(CACHE_DIR, str(slot))
+        os.makedirs(path, exist_ok=True)
+        lock = open(os.path.join(path, ".lock"), "w")
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return path, lock
+        except OSError:
+            lock.close()
+    return None, None
+
+
+def setup_driver(lean=LEAN):
+    if transport.replaying():
+        return transport.ReplayDriver()
+
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+
+    options = Options()
+    options.add_argument("--headless=new")
+    options.add_argument("--window-size=1920,1080")
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    options.add_argument("--disable-gpu")
+    options.add_argument("--disable-extensions")
+
+    cache_lock = None
+    if lean:
+        # driver.get returns at DOMContentLoaded; scrapers wait for rendering themselves
+        options.page_load_strategy = "eager"
+        options.add_argument("--blink-settings=imagesEnabled=false")
+        options.add_experimental_option("prefs", {"profile.managed_default_content_settings.images": 2})
+        cache_dir, cache_lock = _cache_slot()
+        if cache_dir:
+            options.add_argument(f"--disk-cache-dir={cache_dir}")
+            options.add_argument(f"--disk-cache-size={CACHE_SIZE}")
+
+    # Selenium 4.x handles driver automatically
+    driver = webdriver.Chrome(options=options)
+
+    if lean:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BLOCKED_URLS})
+        # Held (and the cache slot locked) for as long as the driver object lives
+        driver._ipo_radar_cache_lock = cache_lock
+    return transport.wrap_driver(driver)
+
+
+def browser_rss(driver):
+    """Resident memory in bytes of the Chrome processes under chromedriver (Linux only)"""
+    try:
+        root = driver.service.process.pid
+    except AttributeError:
+        return None
+    if not os.path.isdir("/proc"):
+        return None
+
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    total = 0
+    stack = list(children.get(root, []))
+    while stack:
+        pid = stack.pop()
+        try:
+            with open(f"/proc/{pid}/statm") as f:
+                total += int(f.read().split()[1]) * page_size
+        except (OSError, ValueError, IndexError):
+            pass
+        stack += children.get(pid, [])
+    return total
+
+
+# ---------------- PAGES ----------------
+
+
+def open_page(driver, url):
+    """
+    driver.get, paced by the host's adaptive rate limiter and recorded as
+    a request in the run metrics.
+    """
+    # Replayed pages need no pacing and must not train the real limiter
+    limiter = None if transport.replaying() else limiter_for(url)
+    if limiter:
+        with current().phase("throttle"):
+            limiter.acquire()
+
+    started = time.perf_counter()
+    try:
+        driver.get(url)
+    except Exception:
+        elapsed = time.perf_counter() - started
+        if limiter:
+            limiter.record(elapsed, error=True)
+        current().record_request(url, "error", elapsed, 0)
+        raise
+
+    elapsed = time.perf_counter() - started
+    if limiter:
+        limiter.record(elapsed)
+    current().record_request(url, "page", elapsed, 0)
+
+    rss = browser_rss(driver)
+    if rss:
+        current().record_browser_rss(rss)
+
+
+def page_source(driver):
+    """driver.page_source, counting the transferred bytes"""
+    html = driver.page_source
+    metrics = current()
+    with metrics.lock:
+        metrics.bytes += len(html)
+    return html
+
+
+def run_script(driver, script, *args, wait=False):
+    """
+    Runs extraction JavaScript in the page (execute_async_script when
+    `wait`, the script then calls its last argument with the result) and
+    counts the size of the returned data instead of a page source.
+    """
+    import json
+
+    if wait:
+        result = driver.execute_async_script(script, *args)
+    else:
+        result = driver.execute_script(script, *args)
+    metrics = current()
+    with metrics.lock:
+        metrics.bytes += len(json.dumps(result, ensure_ascii=False))
+    return result
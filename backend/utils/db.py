@@ -0,0 +1,46 @@
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DB_NAME = "ipo-radar"
+
+_client = None
+
+
+def get_client():
+    """
+    Returns a process-wide MongoClient, creating it on first use.
+    Every scraper and notifier in the same process shares this pool.
+    """
+    global _client
+    if _client is None:
+        from pymongo import MongoClient
+
+        mongo_uri = os.getenv("MONGO_URI")
+        if not mongo_uri:
+            raise ValueError("MONGO_URI not found in environment variables")
+
+        # Atlas (mongodb+srv) needs certifi's CA bundle on some Python builds
+        if mongo_uri.startswith("mongodb+srv://"):
+            import certifi
+            _client = MongoClient(mongo_uri, tlsCAFile=certifi.where())
+        else:
+            _client = MongoClient(mongo_uri)
+    return _client
+
+
+def get_db():
+    return get_client()[DB_NAME]
+
+
+def close_client():
+    """Closes the shared client (used by the worker on shutdown)"""
+    global _client
+    if _client is not None:
+        _client.close()
+        _client = None
+
+
+def get_collection(name="ipos"):
+    return get_db()[name]
@@ -0,0 +1,263 @@
+"""
+Incremental columnar export of the IPO dataset for analysis.
+
+Writes three tables as Parquet (or Arrow IPC, which can be memory-mapped)
+files under EXPORT_DIR (default logs/export), partitioned by export date:
+
+    ipos/export_date=2025-01-27/part-000000012.parquet  normalised scalar fields
+    gmp_trend/...                                     one row per GMP trend row
+    live/...                                          live prices
+
+Each run only exports IPOs changed since the last run's change-log
+version (utils/store.py) and live prices updated since its last
+timestamp; the watermark is kept in _watermark.json. Every row carries
+the export_version (run number) it was written in, and snapshot() keeps
+the latest rows of each IPO:
+
+    cd backend
+    python -m utils.export run                 # incremental (first run is full)
+    python -m utils.export run --format arrow
+    python -m utils.export stats               # rows in the latest snapshot
+
+Needs pyarrow (pip install pyarrow), which the scrapers do not.
+"""
+import os
+import sys
+import json
+from datetime import datetime, timezone
+
+from utils import store, summaries, ipocalendar, tiering
+from utils.metrics import LOG_DIR
+
+EXPORT_DIR = os.getenv("EXPORT_DIR") or os.path.join(LOG_DIR, "export")
+WATERMARK_FILE = "_watermark.json"
+FORMATS = {"parquet": ".parquet", "arrow": ".arrow"}
+TABLES = ("ipos", "gmp_trend", "live")
+
+# Everything but raw_html and the long text fields
+PROJECTION = {field: 1 for field in summaries.SOURCE_FIELDS + [
+    "url", "groww_url", "updatedAt", "live", "values.gmp_trend", "values.symbol",
+]}
+
+
+def schemas():
+    import pyarrow as pa
+
+    ts = pa.timestamp("ms", tz="UTC")
+    return {
+        "ipos": pa.schema([
+            ("ipo_name", pa.string()), ("ipo_id", pa.string()), ("status", pa.string()),
+            ("price", pa.string()), ("price_max", pa.float64()),
+            ("gmp", pa.string()), ("gmp_value", pa.float64()),
+            ("subscription", pa.string()), ("subscription_times", pa.float64()),
+            ("open_date", ts), ("close_date", ts), ("allotment_date", ts), ("listing_date", ts),
+            ("url", pa.string()), ("groww_url", pa.string()), ("updated_at", ts),
+            ("export_version", pa.int64()),
+        ]),
+        "gmp_trend": pa.schema([
+            ("ipo_name", pa.string()), ("gmp_date", ts), ("ipo_price", pa.float64()),
+            ("gmp", pa.float64()), ("subscription_times", pa.float64()), ("sub2_sauda", pa.string()),
+            ("estimated_listing_price", pa.float64()), ("last_updated", pa.string()),
+            ("export_version", pa.int64()),
+        ]),
+        "live": pa.schema([
+            ("ipo_name", pa.string()), ("symbol", pa.string()), ("price", pa.float64()),
+            ("listing_price", pa.float64()), ("change_percent", pa.float64()),
+            ("last_updated", ts), ("export_version", pa.int64()),
+        ]),
+    }
+
+
+# ---------------- ROWS ----------------
+
+def _utc(value):
+    if not isinstance(value, datetime):
+        return None
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def ipo_row(ipo, version):
+    summary = summaries.build_summary(ipo)
+    dates = summary["dates"]
+    return {
+        "ipo_name": summary["ipo_name"],
+        "ipo_id": str(ipo["_id"]),
+        "status": summary["status"],
+        "price": summary["price"],
+        "price_max": summary["price_max"],
+        "gmp": summary["gmp"],
+        "gmp_value": summary["gmp_value"],
+        "subscription": summary["subscription"],
+        "subscription_times": summary["subscription_times"],
+        "open_date": dates.get("open"),
+        "close_date": dates.get("close"),
+        "allotment_date": dates.get("allotment"),
+        "listing_date": dates.get("listing"),
+        "url": ipo.get("url"),
+        "groww_url": ipo.get("groww_url"),
+        "updated_at": _utc(ipo.get("updatedAt")),
+        "export_version": version,
+    }
+
+
+def gmp_rows(ipo, version):
+    number = summaries.parse_number
+    return [{
+        "ipo_name": ipo["ipo_name"],
+        "gmp_date": ipocalendar.parse_date(row.get("gmp_date")),
+        "ipo_price": number(row.get("ipo_price")),
+        "gmp": number(row.get("gmp")),
+        "subscription_times": number(row.get("subscription")),
+        "sub2_sauda": row.get("sub2_sauda"),
+        "estimated_listing_price": number(row.get("estimated_listing_price")),
+        "last_updated": row.get("last_updated"),
+        "export_version": version,
+    } for row in (ipo.get("values") or {}).get("gmp_trend") or []]
+
+
+def live_row(ipo, version):
+    live = ipo.get("live") or {}
+    return {
+        "ipo_name": ipo["ipo_name"],
+        "symbol": (ipo.get("values") or {}).get("symbol"),
+        "price": live.get("price"),
+        "listing_price": live.get("listingPrice"),
+        "change_percent": live.get("changePercent"),
+        "last_updated": _utc(live.get("lastUpdated")),
+        "export_version": version,
+    }
+
+
+# ---------------- WATERMARK ----------------
+
+def load_watermark(directory):
+    """{version: change-log version, live_since: ISO time, run: last export_version}"""
+    path = os.path.join(directory, WATERMARK_FILE)
+    if not os.path.exists(path):
+        return {"version": None, "live_since": None, "run": 0}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_watermark(directory, watermark):
+    path = os.path.join(directory, WATERMARK_FILE)
+    with open(path + ".tmp", "w") as f:
+        json.dump(watermark, f)
+    os.replace(path + ".tmp", path)
+
+
+# ---------------- WRITING ----------------
+
+def write_table(directory, table, rows, run, fmt):
+    import pyarrow as pa
+
+    if not rows:
+        return None
+    partition = os.path.join(directory, table, f"export_date={datetime.now(timezone.utc):%Y-%m-%d}")
+    os.makedirs(partition, exist_ok=True)
+    path = os.path.join(partition, f"part-{run:09d}{FORMATS[fmt]}")
+    data = pa.Table.from_pylist(rows, schema=schemas()[table])
+
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+        pq.write_table(data, path, compression="zstd")
+    else:
+        with pa.OSFile(path, "wb") as sink, pa.ipc.new_file(sink, data.schema) as writer:
+            writer.write_table(data)
+    return path
+
+
+def export(db, directory=EXPORT_DIR, fmt="parquet", full=False):
+    """Exports what changed since the watermark; returns {table: rows written}"""
+    os.makedirs(directory, exist_ok=True)
+    watermark = load_watermark(directory)
+    if full:
+        watermark.update(version=None, live_since=None)
+    run = watermark["run"] + 1
+
+    if watermark["version"] is None:
+        # Full export: everything up to the current version is covered
+        version = store.current_version(db)
+        names = None
+    else:
+        names, version = store.changed_names(db, watermark["version"])
+
+    ipo_rows, trend_rows = [], []
+    query = {} if names is None else {"ipo_name": {"$in": sorted(names)}}
+    if names is None or names:
+        for ipo in tiering.find(db, query, PROJECTION):
+            ipo_rows.append(ipo_row(ipo, run))
+            trend_rows += gmp_rows(ipo, run)
+
+    live_query = {"live.price": {"$exists": True}}
+    if watermark["live_since"]:
+        live_query["live.lastUpdated"] = {"$gt": datetime.fromisoformat(watermark["live_since"])}
+    live_rows = [live_row(ipo, run) for ipo in db.ipos.find(live_query, {"ipo_name": 1, "live": 1, "values.symbol": 1})]
+    live_since = max([row["last_updated"] for row in live_rows if row["last_updated"]], default=None)
+
+    written = {}
+    for table, rows in (("ipos", ipo_rows), ("gmp_trend", trend_rows), ("live", live_rows)):
+        path = write_table(directory, table, rows, run, fmt)
+        written[table] = len(rows)
+        if path:
+            print(f"✅ {table}: {len(rows)} rows -> {path}")
+
+    save_watermark(directory, {
+        "version": version,
+        "live_since": live_since.isoformat() if live_since else watermark["live_since"],
+        "run": run,
+    })
+    return written
+
+
+# ---------------- READING ----------------
+
+def snapshot(table, directory=EXPORT_DIR):
+    """Latest exported rows of every IPO as a pyarrow Table, read from memory-mapped files"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    parts = []
+    for root, _, files in os.walk(os.path.join(directory, table)):
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            if name.endswith(".parquet"):
+                parts.append(pq.read_table(path, memory_map=True))
+            elif name.endswith(".arrow"):
+                parts.append(pa.ipc.open_file(pa.memory_map(path)).read_all())
+    if not parts:
+        return schemas()[table].empty_table()
+
+    data = pa.concat_tables(parts)
+    latest = data.group_by("ipo_name").aggregate([("export_version", "max")])
+    latest = latest.select(["ipo_name", "export_version_max"]).rename_columns(["ipo_name", "export_version"])
+    return data.join(latest, keys=["ipo_name", "export_version"], join_type="inner")
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="python -m utils.export", description="Columnar export of the IPO dataset")
+    parser.add_argument("command", choices=["run", "stats"])
+    parser.add_argument("--dir", default=EXPORT_DIR, help="export directory (default logs/export)")
+    parser.add_argument("--format", choices=sorted(FORMATS), default="parquet")
+    parser.add_argument("--full", action="store_true", help="run: ignore the watermark and export everything")
+    args = parser.parse_args(argv)
+
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        print("❌ pyarrow is not installed (pip install pyarrow)")
+        return 1
+
+    if args.command == "run":
+        from utils.db import get_db
+        export(get_db(), args.dir, args.format, args.full)
+    else:
+        for table in TABLES:
+            print(f"📦 {table}: {snapshot(table, args.dir).num_rows} rows")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,58 @@
+import time
+from utils.metrics import current
+from utils.ratelimit import limiter_for, retry_after_seconds
+from utils import transport
+
+# One session per process keeps connections (and TLS) alive between requests
+_session = None
+
+
+def get_session():
+    global _session
+    if _session is None:
+        import requests
+        _session = requests.Session()
+    return _session
+
+
+def get(url, **kwargs):
+    """
+    requests.get through the shared session, paced by the host's adaptive
+    rate limiter and recorded in the run metrics. Raises CircuitOpenError
+    once the host has failed too often in this run.
+    """
+    return request("GET", url, **kwargs)
+
+
+def head(url, **kwargs):
+    """requests.head with the same pacing and metrics as get()"""
+    return request("HEAD", url, **kwargs)
+
+
+def request(method, url, **kwargs):
+    if transport.replaying():
+        # Recorded responses, at full speed: no network and no pacing
+        started = time.perf_counter()
+        response = transport.replay_http(method, url)
+        current().record_request(url, response.status_code, time.perf_counter() - started, len(response.content))
+        return response
+
+    limiter = limiter_for(url)
+    with current().phase("throttle"):
+        limiter.acquire()
+
+    started = time.perf_counter()
+    try:
+        response = get_session().request(method, url, **kwargs)
+    except Exception:
+        elapsed = time.perf_counter() - started
+        limiter.record(elapsed, error=True)
+        current().record_request(url, "error", elapsed, 0)
+        raise
+
+    elapsed = time.perf_counter() - started
+    limiter.record(elapsed, response.status_code, retry_after=retry_after_seconds(response))
+    current().record_request(url, response.status_code, elapsed, len(response.content))
+    if transport.recording():
+        transport.record_http(method, url, response, elapsed)
+    return response
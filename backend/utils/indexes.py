@@ -0,0 +1,183 @@
+"""
+Every MongoDB index the backend relies on, declared in one place.
+
+    cd backend
+    python -m utils.indexes apply     # create missing indexes (idempotent)
+    python -m utils.indexes check     # apply, then explain() every production
+                                      # query and fail on a COLLSCAN
+
+The backend's Python query functions are run against a local mongod by
+tests/test_indexes.py, which fails on any COLLSCAN; a new query function
+belongs there, and the index it needs in INDEXES. QUERIES only lists the
+queries Python cannot call (server.js, inline queries in scripts), which
+`check` and the same tests explain.
+"""
+import sys
+from datetime import datetime
+
+# collection -> [(keys, options)]
+INDEXES = {
+    "ipos": [
+        ([("ipo_name", 1)], {"unique": True}),
+        ([("status", 1)], {}),
+        ([("url", 1)], {}),
+        ([("updatedAt", -1)], {}),
+        ([("live.lastUpdated", -1)], {"partialFilterExpression": {"live.price": {"$exists": True}}}),
+        ([("dates.listing", 1)], {}),
+        ([("values.listing at", 1)], {"sparse": True}),
+    ],
+    "ipos_archive": [
+        ([("ipo_name", 1)], {}),
+    ],
+    "ipo_summaries": [
+        ([("ipo_name", 1)], {"unique": True}),
+        ([("status", 1)], {}),
+        ([("updatedAt", -1)], {}),
+        ([("dates.close", 1)], {}),
+        ([("dates.allotment", 1)], {}),
+        ([("dates.listing", 1)], {}),
+    ],
+    "users": [
+        ([("email", 1)], {"unique": True}),
+        ([("googleId", 1)], {"unique": True, "sparse": True}),
+        ([("preferences.emailEnabled", 1)], {}),
+        ([("preferences.emailEnabled", 1), ("notifyBucket", 1), ("_id", 1)], {}),
+    ],
+    "scrape_jobs": [
+        ([("state", 1), ("source", 1), ("available_at", 1)], {}),
+        ([("state", 1), ("lease_expires", 1)], {}),
+    ],
+    "ipo_changes": [
+        ([("version", 1)], {"unique": True}),
+        ([("at", 1)], {"expireAfterSeconds": 90 * 24 * 3600}),
+    ],
+    "notify_shards": [
+        ([("state", 1), ("source", 1), ("available_at", 1)], {}),
+        ([("state", 1), ("lease_expires", 1)], {}),
+    ],
+    "allotment_results": [
+        ([("checked_at", 1)], {"expireAfterSeconds": 180 * 24 * 3600}),
+    ],
+    "ipos_staging": [
+        ([("cycle", 1), ("kind", 1)], {}),
+        # Cycles that never published are dropped after a week
+        ([("at", 1)], {"expireAfterSeconds": 7 * 24 * 3600}),
+    ],
+    "ipo_neighbors": [
+        ([("ipo_name", 1)], {"unique": True}),
+    ],
+    "url_checks": [
+        ([("expires_at", 1)], {"expireAfterSeconds": 0}),
+    ],
+}
+
+# Production queries Python cannot call (see tests/test_indexes.py):
+# (where it runs, collection, filter, sort)
+QUERIES = [
+    ("notify_subscribers: subscribers", "users", {"preferences.emailEnabled": True}, None),
+    ("server: /api/ipos?view=summary", "ipo_summaries", {}, [("updatedAt", -1)]),
+    ("server: /api/ipos", "ipos", {}, [("updatedAt", -1)]),
+    ("server: listed IPOs", "ipos",
+     {"$or": [{"dates.listing": {"$lte": datetime(2000, 1, 1)}}, {"values.listing at": {"$gt": ""}}],
+      "archived": {"$ne": True}}, None),
+    ("server: /api/live-listings", "ipos", {"live.price": {"$exists": True}}, [("live.lastUpdated", -1)]),
+    ("server: /api/ipos/similar", "ipo_neighbors", {"ipo_name": "Example Ltd"}, None),
+    ("server: user lookup", "users", {"email": "user@example.com"}, None),
+]
+
+# Server error codes for an existing index with the same name or keys but other options
+CONFLICT_CODES = {85, 86}
+
+
+# ---------------- APPLY ----------------
+
+def ensure_indexes(collection):
+    """Creates the declared indexes of one collection; existing ones are left as they are"""
+    from pymongo import IndexModel
+    from pymongo.errors import OperationFailure
+
+    created = []
+    for keys, options in INDEXES.get(collection.name, []):
+        try:
+            created += collection.create_indexes([IndexModel(keys, **options)])
+        except OperationFailure as e:
+            if e.code not in CONFLICT_CODES:
+                raise
+            print(f"❌ {collection.name}: index {keys} exists with other options ({e.details.get('errmsg')})")
+    return created
+
+
+_ensured = set()
+
+
+def collection(db, name):
+    """db[name], with its indexes ensured on first use in this process"""
+    key = (db.name, name)
+    if key not in _ensured:
+        ensure_indexes(db[name])
+        _ensured.add(key)
+    return db[name]
+
+
+def apply(db):
+    for name in INDEXES:
+        for index in ensure_indexes(db[name]):
+            print(f"✅ {name}: {index}")
+
+
+# ---------------- QUERY PLANS ----------------
+
+def plan_stages(plan):
+    """All stage names in an explain() plan tree (classic or SBE layout)"""
+    stages = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        for value in plan.values():
+            stages += plan_stages(value)
+    elif isinstance(plan, list):
+        for item in plan:
+            stages += plan_stages(item)
+    return stages
+
+
+def check(db):
+    """Explains every query in QUERIES; returns the number that scan a whole collection"""
+    failures = 0
+    for where, collection, query, sort in QUERIES:
+        cursor = db[collection].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        stages = plan_stages(cursor.explain()["queryPlanner"]["winningPlan"])
+
+        if "COLLSCAN" in stages:
+            failures += 1
+            print(f"❌ {where}: COLLSCAN on {collection}")
+        elif "SORT" in stages:
+            print(f"⚠️ {where}: in-memory sort ({' <- '.join(stages)})")
+        else:
+            print(f"✅ {where}: {' <- '.join(stages)}")
+    return failures
+
+
+def main(argv=None):
+    import argparse
+    from utils.db import get_db
+
+    parser = argparse.ArgumentParser(prog="python -m utils.indexes", description="Manage MongoDB indexes")
+    parser.add_argument("command", choices=["apply", "check"])
+    args = parser.parse_args(argv)
+
+    db = get_db()
+    apply(db)
+    if args.command == "check":
+        failures = check(db)
+        if failures:
+            print(f"❌ {failures} queries scan a whole collection")
+            return 1
+        print("✅ No collection scans")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
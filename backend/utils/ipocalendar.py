@@ -0,0 +1,223 @@
+"""
+Parsed IPO dates and calendar queries.
+
+Scrapers store dates as the strings the sites show ("Mon, Jan 27, 2025",
+"Jan 20, 2025 to Jan 22, 2025", "27 Jan 2025"). The write path also
+parses them into `dates.open`, `dates.close`, `dates.allotment` and
+`dates.listing` on both the IPO and its summary, as the instant the day
+starts in India, so calendar questions are indexed range queries:
+
+    closing_within(db, hours=24)     # open IPOs whose bidding ends soon
+    listing_on(db)                   # listing today
+    allotment_on(db, tomorrow())     # allotment tomorrow
+
+    cd backend
+    python -m utils.ipocalendar backfill   # parse dates of stored IPOs
+    python -m utils.ipocalendar show       # this week's calendar
+"""
+import re
+import sys
+from datetime import datetime, timedelta, timezone
+
+IST = timezone(timedelta(hours=5, minutes=30), "IST")
+
+# Bidding (and the UPI mandate cut-off) ends at 5 pm on the closing day
+CLOSE_TIME = timedelta(hours=17)
+
+# Date kind -> `values` keys it is read from, in order of preference
+DATE_KEYS = {
+    "open": ["ipo open date", "open date", "opening date"],
+    "close": ["ipo close date", "close date", "closing date"],
+    "allotment": ["basis of allotment", "tentative allotment", "allotment date"],
+    "listing": ["listing date", "tentative listing date", "listed on"],
+}
+RANGE_KEY = "ipo date"  # "<open> to <close>"
+
+# Fields of an ipos document the dates are parsed from
+SOURCE_FIELDS = ["opening_date", f"values.{RANGE_KEY}"] + [
+    f"values.{key}" for keys in DATE_KEYS.values() for key in keys
+]
+
+FORMATS = ["%b %d %Y", "%d %b %Y", "%B %d %Y", "%d %B %Y", "%Y %m %d", "%d %m %Y"]
+WEEKDAY = re.compile(r"^(mon|tue|wed|thu|fri|sat|sun)[a-z]*,?\s+", re.I)
+
+
+# ---------------- PARSING ----------------
+
+def parse_date(text, default_year=None):
+    """Start of the given day in India as an aware datetime, or None"""
+    if not text:
+        return None
+    text = WEEKDAY.sub("", str(text).strip())
+    text = re.sub(r"[,\-/.]", " ", text).replace("Sept", "Sep")
+    text = " ".join(text.split())
+    candidates = [text]
+    if default_year and not re.search(r"\b\d{4}\b", text):
+        candidates.append(f"{text} {default_year}")
+
+    for candidate in candidates:
+        for fmt in FORMATS:
+            try:
+                day = datetime.strptime(candidate, fmt)
+            except ValueError:
+                continue
+            return day.replace(tzinfo=IST)
+    return None
+
+
+def parse_range(text):
+    """(open, close) from "<open> to <close>"; the open day may omit month and year"""
+    if not text or " to " not in str(text):
+        return None, None
+    start, end = [part.strip() for part in str(text).split(" to ", 1)]
+    close = parse_date(end)
+    if close is None:
+        return None, None
+    opening = parse_date(start, default_year=close.year)
+    if opening is None and start.isdigit():
+        # "20 to 22 Jan, 2025"
+        try:
+            opening = close.replace(day=int(start))
+        except ValueError:
+            opening = None
+    if opening and opening > close:
+        opening = opening.replace(year=opening.year - 1)  # "Dec 30 to Jan 2, 2025"
+    return opening, close
+
+
+def parse_dates(ipo):
+    """{kind: datetime} for the dates an ipos document (or its SOURCE_FIELDS) has"""
+    values = ipo.get("values") or {}
+    dates = {}
+    for kind, keys in DATE_KEYS.items():
+        for key in keys:
+            parsed = parse_date(values.get(key))
+            if parsed:
+                dates[kind] = parsed
+                break
+
+    opening, close = parse_range(values.get(RANGE_KEY))
+    if opening and "open" not in dates:
+        dates["open"] = opening
+    if close and "close" not in dates:
+        dates["close"] = close
+    if "open" not in dates:
+        opening = parse_date(ipo.get("opening_date"))
+        if opening:
+            dates["open"] = opening
+    return dates
+
+
+def same_dates(stored, dates):
+    # pymongo hands back naive UTC datetimes
+    stored = {
+        kind: value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+        for kind, value in (stored or {}).items()
+    }
+    return stored == dates
+
+
+# ---------------- QUERIES ----------------
+
+def day_start(day=None):
+    """Midnight in India of the given date (default today), as stored in `dates.*`"""
+    if day is None:
+        day = datetime.now(IST).date()
+    return datetime(day.year, day.month, day.day, tzinfo=IST)
+
+
+def tomorrow():
+    return datetime.now(IST).date() + timedelta(days=1)
+
+
+def _collection(db):
+    from utils.summaries import SUMMARIES_COLLECTION
+
+    return db[SUMMARIES_COLLECTION]
+
+
+def closing_within(db, hours=24, now=None, projection=None):
+    """Open IPO summaries whose bidding closes in the next `hours`"""
+    now = now or datetime.now(timezone.utc)
+    return list(_collection(db).find({
+        "dates.close": {"$gt": now - CLOSE_TIME, "$lte": now + timedelta(hours=hours) - CLOSE_TIME},
+        "status": "open",
+    }, projection).sort("dates.close", 1))
+
+
+def on_day(db, kind, day=None, projection=None):
+    """IPO summaries whose `kind` date (open, close, allotment, listing) is the given day"""
+    start = day_start(day)
+    return list(_collection(db).find({
+        f"dates.{kind}": {"$gte": start, "$lt": start + timedelta(days=1)},
+    }, projection).sort("ipo_name", 1))
+
+
+def listing_on(db, day=None, projection=None):
+    return on_day(db, "listing", day, projection)
+
+
+def allotment_on(db, day=None, projection=None):
+    return on_day(db, "allotment", day, projection)
+
+
+def between(db, kind, start, end, projection=None):
+    """IPO summaries whose `kind` date falls in [start, end) (dates)"""
+    return list(_collection(db).find({
+        f"dates.{kind}": {"$gte": day_start(start), "$lt": day_start(end)},
+    }, projection).sort(f"dates.{kind}", 1))
+
+
+# ---------------- BACKFILL ----------------
+
+def backfill(db):
+    """Parses the dates of every stored IPO and summary (idempotent)"""
+    from pymongo import UpdateOne
+
+    projection = {field: 1 for field in SOURCE_FIELDS}
+    projection.update({"ipo_name": 1, "dates": 1})
+    ipo_ops = []
+    summary_ops = []
+    for ipo in db.ipos.find({}, projection):
+        dates = parse_dates(ipo)
+        if not same_dates(ipo.get("dates"), dates):
+            ipo_ops.append(UpdateOne({"_id": ipo["_id"]}, {"$set": {"dates": dates}}))
+        summary_ops.append(UpdateOne({"ipo_name": ipo["ipo_name"]}, {"$set": {"dates": dates}}))
+
+    if ipo_ops:
+        db.ipos.bulk_write(ipo_ops, ordered=False)
+    if summary_ops:
+        _collection(db).bulk_write(summary_ops, ordered=False)
+    print(f"✅ Parsed dates of {len(summary_ops)} IPOs ({len(ipo_ops)} changed)")
+    return len(ipo_ops)
+
+
+def show(db, days=7):
+    today = datetime.now(IST).date()
+    end = today + timedelta(days=days)
+    for kind in DATE_KEYS:
+        print(f"📅 {kind.capitalize()} (next {days} days)")
+        for ipo in between(db, kind, today, end):
+            day = ipo["dates"][kind].replace(tzinfo=timezone.utc).astimezone(IST)
+            print(f"   {day:%a %d %b}  {ipo['ipo_name']}")
+
+
+def main(argv=None):
+    import argparse
+    from utils.db import get_db
+
+    parser = argparse.ArgumentParser(prog="python -m utils.ipocalendar", description="Parsed IPO dates")
+    parser.add_argument("command", choices=["backfill", "show"])
+    parser.add_argument("--days", type=int, default=7, help="show: days ahead")
+    args = parser.parse_args(argv)
+
+    db = get_db()
+    if args.command == "backfill":
+        backfill(db)
+    else:
+        show(db, args.days)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
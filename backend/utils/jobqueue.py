@@ -0,0 +1,241 @@
+"""
+Mongo-backed job queue with leases.
+
+One document per job in the `scrape_jobs` collection, keyed by
+"<source>:<url>". Workers on any host claim pending jobs with a
+time-limited lease and renew it while they work. A job whose lease
+expires (crashed or hung worker) becomes claimable again, and failed
+jobs are retried with backoff up to MAX_ATTEMPTS.
+
+    pending --claim--> leased --complete--> done
+                         |  \\--fail------> pending (retry) / failed
+                         \\--lease expires--> claimable again
+"""
+import os
+import socket
+import threading
+from datetime import datetime, timedelta, timezone
+
+QUEUE_COLLECTION = "scrape_jobs"
+LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "120"))
+MAX_ATTEMPTS = 3
+RETRY_BACKOFF_SECONDS = 30
+
+
+def now():
+    return datetime.now(timezone.utc)
+
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def job_id(source, url):
+    return f"{source}:{url}"
+
+
+def ensure_indexes(collection):
+    # Declared in utils/indexes.py with the other collections' indexes
+    from utils import indexes
+    indexes.ensure_indexes(collection)
+
+
+# ---------------- PRODUCER ----------------
+
+def enqueue(collection, source, payloads, url_key="url", reset=True):
+    """
+    Adds one job per payload. Jobs that already exist are reset to
+    pending for the new cycle unless a worker currently holds them, or
+    left untouched (whatever their state) when reset is False.
+    Returns the number of jobs (re)queued.
+    """
+    from pymongo import UpdateOne
+    from pymongo.errors import BulkWriteError
+
+    ts = now()
+    ops = []
+    for payload in payloads:
+        if not reset:
+            ops.append(UpdateOne(
+                {"_id": job_id(source, payload[url_key])},
+                {"$setOnInsert": {
+                    "source": source,
+                    "url": payload[url_key],
+                    "payload": payload,
+                    "state": "pending",
+                    "attempts": 0,
+                    "available_at": ts,
+                    "enqueued_at": ts,
+                }},
+                upsert=True
+            ))
+            continue
+
+        ops.append(UpdateOne(
+            {"_id": job_id(source, payload[url_key]), "state": {"$ne": "leased"}},
+            {
+                "$set": {
+                    "source": source,
+                    "url": payload[url_key],
+                    "payload": payload,
+                    "state": "pending",
+                    "attempts": 0,
+                    "available_at": ts,
+                    "enqueued_at": ts,
+                },
+                "$unset": {"last_error": ""},
+            },
+            upsert=True
+        ))
+
+    if not ops:
+        return 0
+
+    try:
+        result = collection.bulk_write(ops, ordered=False)
+        return result.upserted_count + result.modified_count
+    except BulkWriteError as e:
+        # Duplicate-key errors mean the job is leased right now; leave it be
+        errors = [err for err in e.details["writeErrors"] if err["code"] != 11000]
+        if errors:
+            raise
+        return e.details["nUpserted"] + e.details["nModified"]
+
+
+# ---------------- CONSUMER ----------------
+
+def claim(collection, worker, sources, lease_seconds=LEASE_SECONDS):
+    """Leases the oldest available job for one of `sources`, or returns None"""
+    from pymongo import ReturnDocument
+
+    ts = now()
+    return collection.find_one_and_update(
+        {
+            "source": {"$in": list(sources)},
+            "attempts": {"$lt": MAX_ATTEMPTS},
+            "$or": [
+                {"state": "pending", "available_at": {"$lte": ts}},
+                {"state": "leased", "lease_expires": {"$lt": ts}},
+            ],
+        },
+        {
+            "$set": {
+                "state": "leased",
+                "lease_owner": worker,
+                "leased_at": ts,
+                "lease_expires": ts + timedelta(seconds=lease_seconds),
+            },
+            "$inc": {"attempts": 1},
+        },
+        sort=[("available_at", 1)],
+        return_document=ReturnDocument.AFTER
+    )
+
+
+def heartbeat(collection, job, worker, lease_seconds=LEASE_SECONDS):
+    """Extends the lease; False means another worker has taken the job over"""
+    result = collection.update_one(
+        {"_id": job["_id"], "state": "leased", "lease_owner": worker},
+        {"$set": {"lease_expires": now() + timedelta(seconds=lease_seconds)}}
+    )
+    return result.matched_count == 1
+
+
+def complete(collection, job, worker):
+    collection.update_one(
+        {"_id": job["_id"], "lease_owner": worker},
+        {
+            "$set": {"state": "done", "finished_at": now()},
+            "$unset": {"lease_owner": "", "lease_expires": ""},
+        }
+    )
+
+
+def checkpoint(collection, job, worker, progress):
+    """Saves how far the job got; a worker that takes it over later sees it in job["progress"]"""
+    result = collection.update_one(
+        {"_id": job["_id"], "state": "leased", "lease_owner": worker},
+        {"$set": {"progress": progress}}
+    )
+    return result.matched_count == 1
+
+
+def fail(collection, job, worker, error):
+    """Puts the job back with backoff, or marks it failed after MAX_ATTEMPTS"""
+    attempts = job.get("attempts", 1)
+    if attempts >= MAX_ATTEMPTS:
+        update = {"state": "failed", "finished_at": now()}
+    else:
+        delay = RETRY_BACKOFF_SECONDS * 2 ** (attempts - 1)
+        update = {"state": "pending", "available_at": now() + timedelta(seconds=delay)}
+
+    update["last_error"] = str(error)[:500]
+    collection.update_one(
+        {"_id": job["_id"], "lease_owner": worker},
+        {"$set": update, "$unset": {"lease_owner": "", "lease_expires": ""}}
+    )
+
+
+def release(collection, job, worker, delay_seconds=0):
+    """Hands the job back untouched (the attempt is not counted)"""
+    collection.update_one(
+        {"_id": job["_id"], "lease_owner": worker},
+        {
+            "$set": {"state": "pending", "available_at": now() + timedelta(seconds=delay_seconds)},
+            "$inc": {"attempts": -1},
+            "$unset": {"lease_owner": "", "lease_expires": ""},
+        }
+    )
+
+
+def reap(collection):
+    """Marks jobs whose last allowed attempt timed out as failed"""
+    result = collection.update_many(
+        {"state": "leased", "lease_expires": {"$lt": now()}, "attempts": {"$gte": MAX_ATTEMPTS}},
+        {
+            "$set": {"state": "failed", "finished_at": now(), "last_error": "lease expired"},
+            "$unset": {"lease_owner": "", "lease_expires": ""},
+        }
+    )
+    return result.modified_count
+
+
+class Heartbeat:
+    """Renews a job's lease in the background while the `with` block runs"""
+
+    def __init__(self, collection, job, worker, lease_seconds=LEASE_SECONDS):
+        self.collection = collection
+        self.job = job
+        self.worker = worker
+        self.lease_seconds = lease_seconds
+        self.stopping = threading.Event()
+        self.lost = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self.stopping.wait(self.lease_seconds / 3):
+            try:
+                if not heartbeat(self.collection, self.job, self.worker, self.lease_seconds):
+                    self.lost.set()
+                    return
+            except Exception:
+                # Transient Mongo error: try again next tick; the lease still has time left
+                continue
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stopping.set()
+        self.thread.join()
+
+
+def counts(collection):
+    """{source: {state: n}} overview of the queue"""
+    overview = {}
+    for row in collection.aggregate([
+        {"$group": {"_id": {"source": "$source", "state": "$state"}, "n": {"$sum": 1}}}
+    ]):
+        overview.setdefault(row["_id"]["source"], {})[row["_id"]["state"]] = row["n"]
+    return overview
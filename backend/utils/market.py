@@ -0,0 +1,91 @@
+"""
+NSE trading sessions from a local holiday calendar.
+
+Normal-market hours are 09:15 to 15:30 IST, Monday to Friday, except
+the trading holidays below. Update NSE_HOLIDAYS from the exchange's
+yearly holiday circular, or list extra dates (YYYY-MM-DD, one per line)
+in the file named by NSE_HOLIDAYS_FILE.
+"""
+import os
+from datetime import date, datetime, time, timedelta
+
+from utils.ipocalendar import IST
+
+OPEN = time(9, 15)
+CLOSE = time(15, 30)
+
+NSE_HOLIDAYS = {
+    # 2025
+    date(2025, 2, 26), date(2025, 3, 14), date(2025, 3, 31), date(2025, 4, 10),
+    date(2025, 4, 14), date(2025, 4, 18), date(2025, 5, 1), date(2025, 8, 15),
+    date(2025, 8, 27), date(2025, 10, 2), date(2025, 10, 21), date(2025, 10, 22),
+    date(2025, 11, 5), date(2025, 12, 25),
+    # 2026
+    date(2026, 1, 26), date(2026, 3, 3), date(2026, 3, 26), date(2026, 3, 31),
+    date(2026, 4, 3), date(2026, 4, 14), date(2026, 5, 1), date(2026, 5, 28),
+    date(2026, 6, 26), date(2026, 9, 14), date(2026, 10, 2), date(2026, 10, 20),
+    date(2026, 11, 10), date(2026, 11, 24), date(2026, 12, 25),
+}
+
+_holidays = None
+
+
+def holidays():
+    global _holidays
+    if _holidays is None:
+        _holidays = set(NSE_HOLIDAYS)
+        path = os.getenv("NSE_HOLIDAYS_FILE")
+        if path:
+            with open(path) as f:
+                for line in f:
+                    line = line.split("#")[0].strip()
+                    if line:
+                        _holidays.add(date.fromisoformat(line))
+    return _holidays
+
+
+def is_trading_day(day):
+    return day.weekday() < 5 and day not in holidays()
+
+
+def session(day):
+    """(open, close) of the given trading day as aware datetimes"""
+    return (
+        datetime.combine(day, OPEN, tzinfo=IST),
+        datetime.combine(day, CLOSE, tzinfo=IST),
+    )
+
+
+def is_open(moment):
+    day = moment.astimezone(IST).date()
+    if not is_trading_day(day):
+        return False
+    opens, closes = session(day)
+    return opens <= moment < closes
+
+
+def next_trading_day(day):
+    day += timedelta(days=1)
+    while not is_trading_day(day):
+        day += timedelta(days=1)
+    return day
+
+
+def next_open(moment):
+    """The moment itself if the market is open, else the start of the next session"""
+    day = moment.astimezone(IST).date()
+    if is_trading_day(day):
+        opens, closes = session(day)
+        if moment < opens:
+            return opens
+        if moment < closes:
+            return moment
+    return session(next_trading_day(day))[0]
+
+
+def next_close(moment):
+    """End of the current session, or of the next one when the market is shut"""
+    day = moment.astimezone(IST).date()
+    if is_trading_day(day) and moment < session(day)[1]:
+        return session(day)[1]
+    return session(next_trading_day(day))[1]
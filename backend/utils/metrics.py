@@ -0,0 +1,296 @@
+"""
+Structured metrics for scraper runs.
+
+Each scraper run records per-phase timings, HTTP request counts, latency
+and bytes, per-page parse times, Mongo write batches and the data
+freshness lag of its source. On flush the run is appended as one JSON
+line to logs/metrics_YYYYMMDD.jsonl and written as a Prometheus textfile
+(logs/ipo_radar_<source>.prom, or METRICS_TEXTFILE_DIR for node_exporter).
+"""
+import os
+import json
+import glob
+import time
+import uuid
+import functools
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from urllib.parse import urlparse
+
+LOG_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'logs')
+TEXTFILE_DIR = os.getenv("METRICS_TEXTFILE_DIR", LOG_DIR)
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+BATCH_BUCKETS = (1, 5, 10, 50, 100, 500, 1000)
+RSS_BUCKETS = tuple(mb * 1024 * 1024 for mb in (128, 256, 512, 768, 1024, 1536, 2048, 4096))
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+    def mean(self):
+        return self.sum / self.count if self.count else 0.0
+
+    def to_dict(self):
+        return {
+            "buckets": list(self.buckets),
+            "counts": self.counts,
+            "count": self.count,
+            "sum": round(self.sum, 4),
+        }
+
+    def prom_lines(self, name, labels):
+        lines = []
+        for bound, count in zip(self.buckets, self.counts):
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {count}')
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {self.count}')
+        lines.append(f'{name}_sum{{{labels}}} {self.sum:.4f}')
+        lines.append(f'{name}_count{{{labels}}} {self.count}')
+        return lines
+
+
+class RunMetrics:
+    def __init__(self, source, run_id=None):
+        self.source = source
+        self.run_id = run_id or os.getenv("IPO_RADAR_RUN_ID") or uuid.uuid4().hex[:12]
+        self.started = time.time()
+        self.phases = Counter()
+        self.requests = Counter()
+        self.request_latency = Histogram(LATENCY_BUCKETS)
+        self.bytes = 0
+        self.parse_latency = Histogram(LATENCY_BUCKETS)
+        self.write_latency = Histogram(LATENCY_BUCKETS)
+        self.write_batches = Histogram(BATCH_BUCKETS)
+        self.docs_written = 0
+        self.errors = 0
+        self.browser_rss = Histogram(RSS_BUCKETS)
+        self.browser_rss_peak = 0
+        self.freshness_lag = None
+        self.lock = threading.Lock()
+
+    # ---------------- RECORDING ----------------
+
+    @contextmanager
+    def phase(self, name):
+        for listener in _phase_listeners:
+            listener(name, True)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.phases[name] += time.perf_counter() - started
+            for listener in _phase_listeners:
+                listener(name, False)
+
+    @contextmanager
+    def parsing(self):
+        """Times one page parse (also counted in the 'parse' phase)"""
+        started = time.perf_counter()
+        with self.phase("parse"):
+            yield
+        with self.lock:
+            self.parse_latency.observe(time.perf_counter() - started)
+
+    def record_request(self, url, status, seconds, nbytes):
+        with self.lock:
+            self.requests[f"{urlparse(url).hostname}|{status}"] += 1
+            self.request_latency.observe(seconds)
+            self.bytes += nbytes
+
+    def record_write(self, batch_size, seconds):
+        with self.lock:
+            self.write_batches.observe(batch_size)
+            self.write_latency.observe(seconds)
+            self.docs_written += batch_size
+
+    def record_browser_rss(self, nbytes):
+        """Chrome's resident memory after a page load"""
+        with self.lock:
+            self.browser_rss.observe(nbytes)
+            self.browser_rss_peak = max(self.browser_rss_peak, nbytes)
+
+    def record_error(self):
+        with self.lock:
+            self.errors += 1
+
+    # ---------------- OUTPUT ----------------
+
+    def summary(self):
+        from utils.ratelimit import snapshot
+
+        finished = time.time()
+        return {
+            "run_id": self.run_id,
+            "source": self.source,
+            "started_at": datetime.fromtimestamp(self.started, timezone.utc).isoformat(),
+            "finished_at": datetime.fromtimestamp(finished, timezone.utc).isoformat(),
+            "duration": round(finished - self.started, 3),
+            "phases": {k: round(v, 3) for k, v in self.phases.items()},
+            "http": {
+                "requests": sum(self.requests.values()),
+                "by_host_status": dict(self.requests),
+                "bytes": self.bytes,
+                "latency": self.request_latency.to_dict(),
+            },
+            "parse": self.parse_latency.to_dict(),
+            "mongo": {
+                "docs_written": self.docs_written,
+                "batch_size": self.write_batches.to_dict(),
+                "latency": self.write_latency.to_dict(),
+            },
+            "errors": self.errors,
+            "browser": {
+                "rss_peak_mb": round(self.browser_rss_peak / 1024 / 1024, 1),
+                "rss_mean_mb": round(self.browser_rss.mean() / 1024 / 1024, 1),
+                "pages": self.browser_rss.count,
+            },
+            "freshness_lag": self.freshness_lag,
+            "hosts": snapshot(),
+        }
+
+    def prom_text(self, summary):
+        src = f'source="{self.source}"'
+        lines = [
+            f'ipo_radar_scrape_duration_seconds{{{src}}} {summary["duration"]}',
+            f'ipo_radar_scrape_last_run_timestamp_seconds{{{src}}} {int(time.time())}',
+            f'ipo_radar_scrape_http_bytes_total{{{src}}} {self.bytes}',
+            f'ipo_radar_scrape_docs_written_total{{{src}}} {self.docs_written}',
+            f'ipo_radar_scrape_errors_total{{{src}}} {self.errors}',
+        ]
+        for phase, seconds in self.phases.items():
+            lines.append(f'ipo_radar_scrape_phase_seconds{{{src},phase="{phase}"}} {seconds:.3f}')
+        for key, count in self.requests.items():
+            host, status = key.split("|", 1)
+            lines.append(f'ipo_radar_scrape_http_requests_total{{{src},host="{host}",status="{status}"}} {count}')
+        if self.freshness_lag is not None:
+            lines.append(f'ipo_radar_scrape_freshness_lag_seconds{{{src}}} {self.freshness_lag}')
+        lines += self.request_latency.prom_lines("ipo_radar_scrape_http_request_seconds", src)
+        lines += self.parse_latency.prom_lines("ipo_radar_scrape_parse_seconds", src)
+        lines += self.write_latency.prom_lines("ipo_radar_scrape_mongo_write_seconds", src)
+        lines += self.write_batches.prom_lines("ipo_radar_scrape_mongo_write_batch_size", src)
+        if self.browser_rss.count:
+            lines.append(f'ipo_radar_scrape_browser_rss_peak_bytes{{{src}}} {self.browser_rss_peak}')
+            lines += self.browser_rss.prom_lines("ipo_radar_scrape_browser_rss_bytes", src)
+        return "\n".join(lines) + "\n"
+
+    def flush(self):
+        """Appends the run to the JSON lines log and rewrites the textfile"""
+        summary = self.summary()
+        os.makedirs(LOG_DIR, exist_ok=True)
+        path = os.path.join(LOG_DIR, f'metrics_{datetime.now().strftime("%Y%m%d")}.jsonl')
+        with open(path, "a") as f:
+            f.write(json.dumps(summary) + "\n")
+
+        os.makedirs(TEXTFILE_DIR, exist_ok=True)
+        prom_path = os.path.join(TEXTFILE_DIR, f"ipo_radar_{self.source}.prom")
+        # node_exporter may read at any time; write then rename
+        with open(prom_path + ".tmp", "w") as f:
+            f.write(self.prom_text(summary))
+        os.replace(prom_path + ".tmp", prom_path)
+        return summary
+
+
+# ---------------- RUN REGISTRY ----------------
+
+_current = None
+
+# Called as listener(phase_name, entering) around every phase (profiling hooks in here)
+_phase_listeners = []
+
+
+def add_phase_listener(listener):
+    _phase_listeners.append(listener)
+
+
+def remove_phase_listener(listener):
+    _phase_listeners.remove(listener)
+
+
+def start_run(source, run_id=None):
+    """Starts recording a scraper run and makes it the current run"""
+    global _current
+    _current = RunMetrics(source, run_id)
+
+    previous = last_successful_run(source)
+    if previous:
+        finished = datetime.fromisoformat(previous["finished_at"])
+        _current.freshness_lag = round(time.time() - finished.timestamp(), 1)
+    return _current
+
+
+def current():
+    """Returns the current run; ad-hoc callers get an unflushed recorder"""
+    global _current
+    if _current is None:
+        _current = RunMetrics("adhoc")
+    return _current
+
+
+def iter_runs(days=7):
+    """Yields logged runs, most recent first"""
+    files = sorted(glob.glob(os.path.join(LOG_DIR, "metrics_*.jsonl")), reverse=True)[:days]
+    for path in files:
+        with open(path) as f:
+            lines = f.readlines()
+        for line in reversed(lines):
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+
+def last_successful_run(source):
+    for run in iter_runs():
+        if run.get("source") == source and run.get("mongo", {}).get("docs_written"):
+            return run
+    return None
+
+
+def load_run(run_id):
+    """Returns {source: summary} for every scraper that logged under run_id"""
+    runs = {}
+    for run in iter_runs(days=2):
+        if run.get("run_id") == run_id and run["source"] not in runs:
+            runs[run["source"]] = run
+    return runs
+
+
+def recorded_run(source):
+    """
+    Decorator for scraper entry points: records the call as one run of
+    `source` and flushes it when the scraper returns (dry runs are only
+    summarised, not logged). Profiles the run when profiling is enabled.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, dry_run=False, **kwargs):
+            from utils.profiling import profile_from_env
+
+            metrics = start_run(source)
+            try:
+                with profile_from_env(source):
+                    return func(*args, dry_run=dry_run, **kwargs)
+            finally:
+                summary = metrics.flush() if not dry_run else metrics.summary()
+                print(
+                    f"📊 {source}: {summary['duration']:.1f}s, "
+                    f"{summary['http']['requests']} requests, "
+                    f"{summary['http']['bytes'] / 1024:.0f} KiB, "
+                    f"{summary['mongo']['docs_written']} docs written"
+                )
+        return wrapper
+    return decorator
@@ -0,0 +1,352 @@
+"""
+Precomputed "similar IPOs": the closest past IPOs of every IPO.
+
+Each IPO becomes one vector: TF-IDF of its expert analysis and
+strengths/risks text (the fields utils/search.py indexes), next to
+z-scored numbers from the chittorgarh `values` (issue size, price, P/E,
+subscription). Both halves are L2-normalised, so a dot product is
+
+    (1 - NUMERIC_WEIGHT) * text cosine + NUMERIC_WEIGHT * numeric cosine
+
+Neighbours are the top K by that score among IPOs that opened earlier,
+computed as a matrix product over blocks of rows and stored per IPO in
+`ipo_neighbors`.
+
+The vocabulary, IDF and feature scaling (the "model") are fitted on a
+full run and kept under logs/neighbors with the change-log version they
+cover. Later runs only recompute the lists that IPOs changed since then
+can affect: the changed IPOs' own lists, lists that contain them, and
+lists they now beat the weakest entry of. The model is refitted when the
+collection has grown by REFIT_GROWTH since it was fitted, or with --full.
+
+    cd backend
+    python -m utils.neighbors run           # incremental (first run is full)
+    python -m utils.neighbors run --full
+    python -m utils.neighbors show "Example Ltd"
+
+Needs numpy (installed with yfinance).
+"""
+import os
+import re
+import sys
+import math
+import pickle
+import time
+import warnings
+from collections import Counter
+from datetime import datetime, timezone
+
+from utils import store, summaries, search, tiering, indexes
+from utils.metrics import LOG_DIR, current
+
+NEIGHBORS_COLLECTION = "ipo_neighbors"
+MODEL_PATH = os.path.join(LOG_DIR, "neighbors", "model.pkl")
+FORMAT = 1
+
+K = 5
+NUMERIC_WEIGHT = 0.3
+
+# Vocabulary: terms in at least MIN_DF IPOs, the MAX_TERMS most common
+MIN_DF = 2
+MAX_TERMS = 5000
+
+# Refit the model once the collection is this much larger than when fitted
+REFIT_GROWTH = 0.2
+
+# Rows per matrix product (ROWS x IPOs scores in memory at once)
+ROWS = 256
+
+TEXT_FIELDS = [path for path in search.FIELDS if path != "ipo_name"]
+
+# Row labels of the chittorgarh detail tables, first match wins
+ISSUE_SIZE_KEYS = ["total issue size", "issue size"]
+PE_KEYS = ["p/e (x)", "p/e", "post issue p/e (x)", "pe ratio"]
+NUMERIC = ["issue_size", "price", "pe", "subscription"]
+
+NUMERIC_FIELDS = [f"values.{key}" for key in ISSUE_SIZE_KEYS + PE_KEYS]
+PROJECTION = {field: 1 for field in summaries.SOURCE_FIELDS + TEXT_FIELDS + NUMERIC_FIELDS}
+
+CRORES = re.compile(r"₹\s*([\d,]+(?:\.\d+)?)\s*cr", re.I)
+
+
+def touches_neighbors(fields):
+    return search.touches_index(fields) or summaries.touches_summary(fields) or any(
+        field == path or path.startswith(field + ".") for field in fields for path in NUMERIC_FIELDS
+    )
+
+
+# ---------------- FEATURES ----------------
+
+def issue_size(text):
+    """Issue size in crores from text like '1,23,45,678 shares (aggregating up to ₹1,500.00 Cr)'"""
+    if not text:
+        return None
+    match = CRORES.search(text)
+    if match:
+        return float(match.group(1).replace(",", ""))
+    return summaries.parse_number(text)
+
+
+def _first(values, keys):
+    for key in keys:
+        if values.get(key):
+            return str(values[key])
+    return None
+
+
+def _log(value):
+    # Sizes, prices and multiples are skewed; negative P/E (losses) counts as 0
+    return math.log1p(max(value, 0)) if value is not None else float("nan")
+
+
+def numbers(ipo):
+    values = ipo.get("values") or {}
+    summary = summaries.build_summary(ipo)
+    return [
+        _log(issue_size(_first(values, ISSUE_SIZE_KEYS))),
+        _log(summary["price_max"]),
+        _log(summaries.parse_number(_first(values, PE_KEYS))),
+        _log(summary["subscription_times"]),
+    ], summary["dates"].get("open")
+
+
+def terms(ipo):
+    return Counter(term for path in TEXT_FIELDS for term in search.tokens(search._field(ipo, path)))
+
+
+class Corpus:
+    """The vector inputs of every IPO, in one order"""
+
+    def __init__(self, ipos):
+        import numpy as np
+
+        self.names, self.ids, self.terms, rows, opens = [], [], [], [], []
+        for ipo in ipos:
+            features, opened = numbers(ipo)
+            self.names.append(ipo["ipo_name"])
+            self.ids.append(ipo["_id"])
+            self.terms.append(terms(ipo))
+            rows.append(features)
+            opens.append(opened.timestamp() if opened else float("nan"))
+        self.numbers = np.array(rows, dtype=np.float64).reshape(len(rows), len(NUMERIC))
+        self.opens = np.array(opens, dtype=np.float64)
+        self.position = {name: i for i, name in enumerate(self.names)}
+
+
+# ---------------- MODEL ----------------
+
+def fit(corpus):
+    import numpy as np
+
+    df = Counter()
+    for counts in corpus.terms:
+        df.update(counts.keys())
+    common = [term for term, count in df.most_common(MAX_TERMS) if count >= MIN_DF]
+    n = len(corpus.names)
+
+    with warnings.catch_warnings():
+        # Features no IPO has yet are all NaN
+        warnings.simplefilter("ignore", RuntimeWarning)
+        mean = np.nan_to_num(np.nanmean(corpus.numbers, axis=0)) if n else np.zeros(len(NUMERIC))
+        std = np.nan_to_num(np.nanstd(corpus.numbers, axis=0)) if n else np.ones(len(NUMERIC))
+    return {
+        "format": FORMAT,
+        "version": 0,
+        "size": n,
+        "vocab": {term: i for i, term in enumerate(common)},
+        "idf": np.array([math.log((1 + n) / (1 + df[term])) + 1 for term in common], dtype=np.float32),
+        "mean": mean,
+        "std": np.where(std > 0, std, 1.0),
+    }
+
+
+def load_model(path=MODEL_PATH):
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        model = pickle.load(f)
+    return model if model.get("format") == FORMAT else None
+
+
+def save_model(model, path=MODEL_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".tmp", "wb") as f:
+        pickle.dump(model, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(path + ".tmp", path)
+
+
+def _normalize(matrix, weight):
+    import numpy as np
+
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms > 0, norms, 1.0) * math.sqrt(weight)
+
+
+def vectors(model, corpus):
+    """One L2-normalised row per IPO: weighted TF-IDF columns, then numeric columns"""
+    import numpy as np
+
+    vocab = model["vocab"]
+    text = np.zeros((len(corpus.names), len(vocab)), dtype=np.float32)
+    for i, counts in enumerate(corpus.terms):
+        for term, count in counts.items():
+            column = vocab.get(term)
+            if column is not None:
+                text[i, column] = 1 + math.log(count)
+    text *= model["idf"]
+
+    scaled = np.clip(np.nan_to_num((corpus.numbers - model["mean"]) / model["std"]), -3, 3).astype(np.float32)
+    return np.hstack([_normalize(text, 1 - NUMERIC_WEIGHT), _normalize(scaled, NUMERIC_WEIGHT)])
+
+
+# ---------------- NEIGHBOURS ----------------
+
+def similarities(matrix, opens, rows):
+    """Scores of `rows` against every IPO; -inf where the other IPO is not an earlier one"""
+    import numpy as np
+
+    scores = matrix[rows] @ matrix.T
+    # Unknown open dates (NaN) compare false, so they do not exclude
+    scores[opens[None, :] >= opens[rows][:, None]] = -np.inf
+    scores[np.arange(len(rows)), rows] = -np.inf
+    return scores
+
+
+def top_k(scores, k):
+    """[(column, score)] of the best k positive scores per row, best first"""
+    import numpy as np
+
+    k = min(k, scores.shape[1])
+    if k == 0:
+        return [[] for _ in range(scores.shape[0])]
+    best = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    lists = []
+    for row, columns in zip(scores, best):
+        columns = sorted(columns, key=lambda column: -row[column])
+        lists.append([(int(column), float(row[column])) for column in columns if row[column] > 0])
+    return lists
+
+
+def affected(matrix, corpus, changed, stored, k):
+    """Rows whose lists changed IPOs can alter, besides their own"""
+    import numpy as np
+
+    rows = set(changed)
+    changed_names = {corpus.names[i] for i in changed} | (set(stored) - set(corpus.names))
+    # Weakest score that still makes each list (0 while a list has room)
+    weakest = np.zeros(len(corpus.names), dtype=np.float32)
+    for name, neighbors in stored.items():
+        i = corpus.position.get(name)
+        if i is None:
+            continue
+        if any(n["ipo_name"] in changed_names for n in neighbors):
+            rows.add(i)
+        elif len(neighbors) >= k:
+            weakest[i] = neighbors[-1]["score"]
+
+    for start in range(0, len(changed), ROWS):
+        block = changed[start:start + ROWS]
+        scores = matrix[block] @ matrix.T
+        # Row i may enter list j only if it opened before j
+        scores[corpus.opens[block][:, None] >= corpus.opens[None, :]] = -np.inf
+        scores[np.arange(len(block)), block] = -np.inf
+        rows.update(np.nonzero((scores > weakest[None, :]).any(axis=0))[0].tolist())
+    return sorted(rows)
+
+
+def compute(db, full=False, k=K, dry_run=False):
+    """Recomputes the neighbour lists that need it; returns how many"""
+    from pymongo import UpdateOne
+
+    model = load_model()
+    with current().phase("fetch"):
+        if model is None or full:
+            version = store.current_version(db)
+            changed = None
+        else:
+            changed, version = store.changed_names(db, model["version"], touches_neighbors)
+        corpus = Corpus(tiering.find(db, {}, PROJECTION))
+        collection = indexes.collection(db, NEIGHBORS_COLLECTION)
+        stored = {doc["ipo_name"]: doc.get("neighbors", [])
+                  for doc in collection.find({}, {"ipo_name": 1, "neighbors.ipo_name": 1, "neighbors.score": 1})}
+
+    with current().parsing():
+        if changed is None or len(corpus.names) > model["size"] * (1 + REFIT_GROWTH):
+            model = fit(corpus)
+            changed = None
+        matrix = vectors(model, corpus)
+
+        if changed is None:
+            rows = list(range(len(corpus.names)))
+        else:
+            changed_rows = sorted(corpus.position[name] for name in changed if name in corpus.position)
+            rows = affected(matrix, corpus, changed_rows, stored, k)
+
+        now = datetime.now(timezone.utc)
+        ops = []
+        for start in range(0, len(rows), ROWS):
+            block = rows[start:start + ROWS]
+            for i, best in zip(block, top_k(similarities(matrix, corpus.opens, block), k)):
+                ops.append(UpdateOne({"ipo_name": corpus.names[i]}, {"$set": {
+                    "ipo_id": corpus.ids[i],
+                    "neighbors": [{"ipo_name": corpus.names[j], "ipo_id": corpus.ids[j], "score": round(score, 4)}
+                                  for j, score in best],
+                    "updatedAt": now,
+                }}, upsert=True))
+    removed = sorted(set(stored) - set(corpus.names))
+
+    print(f"🔗 {len(ops)} of {len(corpus.names)} neighbour lists to update, {len(removed)} to remove")
+    if dry_run:
+        return len(ops)
+    started = time.perf_counter()
+    with current().phase("write"):
+        if ops:
+            collection.bulk_write(ops, ordered=False)
+        if removed:
+            collection.delete_many({"ipo_name": {"$in": removed}})
+    current().record_write(len(ops) + len(removed), time.perf_counter() - started)
+
+    model["version"] = version
+    save_model(model)
+    return len(ops)
+
+
+def update():
+    """Incremental run (worker job / end of a scrape cycle)"""
+    from utils.db import get_db
+
+    return compute(get_db())
+
+
+def main(argv=None):
+    import argparse
+    from utils.db import get_db
+
+    parser = argparse.ArgumentParser(prog="python -m utils.neighbors", description="Similar-IPO neighbour lists")
+    parser.add_argument("command", choices=["run", "show"])
+    parser.add_argument("name", nargs="?", help="show: IPO name")
+    parser.add_argument("--full", action="store_true", help="run: refit the model and recompute every list")
+    parser.add_argument("--dry-run", action="store_true", help="run: compute but do not write")
+    args = parser.parse_args(argv)
+
+    try:
+        import numpy  # noqa: F401
+    except ImportError:
+        print("❌ numpy is not installed (pip install numpy)")
+        return 1
+
+    db = get_db()
+    if args.command == "run":
+        compute(db, full=args.full, dry_run=args.dry_run)
+    else:
+        doc = db[NEIGHBORS_COLLECTION].find_one({"ipo_name": args.name})
+        if not doc:
+            print(f"❌ No neighbours stored for {args.name}")
+            return 1
+        for neighbor in doc["neighbors"]:
+            print(f"{neighbor['score']:6.3f}  {neighbor['ipo_name']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,177 @@
+"""
+HTML parsing for all scrapers.
+
+    soup = parse(html, "chittorgarh_ipo")
+
+returns a BeautifulSoup tree built only from the parts of the page the
+scraper reads (see STRAINERS), using the tree builder selected by
+IPO_RADAR_PARSER ("lxml" by default, or "html.parser"). Pass kind=None
+to build the whole page.
+
+parse_tree() gives the native tree of the raw backends ("lxml-raw",
+"selectolax") for extractors written against them directly, and is
+what the benchmark compares the soup backends with:
+
+    IPO_RADAR_SAVE_PAGES=1 python -m scrapers chittorgarh --dry-run
+    python -m scrapers bench-parse
+"""
+import os
+import time
+import hashlib
+
+SOUP_BACKENDS = ("lxml", "html.parser")
+RAW_BACKENDS = ("lxml-raw", "selectolax")
+DEFAULT_BACKEND = os.getenv("IPO_RADAR_PARSER", "lxml")
+
+PAGES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "logs", "pages")
+
+
+# ---------------- STRAINERS ----------------
+
+def _classes(attrs):
+    value = attrs.get("class") or ""
+    return value.split() if isinstance(value, str) else list(value)
+
+
+def _class_contains(fragment):
+    """Tag predicate: some class contains `fragment` (the scrapers match classes by substring)"""
+    def match(name, attrs):
+        return name == "div" and any(fragment in c for c in _classes(attrs))
+    return match
+
+
+def _sptulsian_article(name, attrs):
+    if name == "meta":
+        return attrs.get("property") == "og:image"
+    return name == "div" and {"card-body", "padding-0-xs"} <= set(_classes(attrs))
+
+
+def _sptulsian_list(name, attrs):
+    return name == "div" and "listing-article-class" in _classes(attrs)
+
+
+# Page kind -> what to build: tag names, or a (name, attrs) predicate.
+# A matching tag is built with everything inside it, so nested lookups
+# (find_parent up to the card, rows inside a table) behave as on the full page.
+STRAINERS = {
+    "chittorgarh_list": ["a", "tr"],
+    "chittorgarh_ipo": _class_contains("card"),
+    "investorgain_gmp": ["table"],
+    "groww_list": ["a", "tr"],
+    "groww_ipo": _class_contains("col"),
+    "sptulsian_list": _sptulsian_list,
+    "sptulsian_article": _sptulsian_article,
+}
+
+
+def strainer(kind):
+    from bs4 import SoupStrainer
+
+    if kind is None:
+        return None
+    return SoupStrainer(STRAINERS[kind])
+
+
+# ---------------- PARSING ----------------
+
+def parse(html, kind=None, backend=None):
+    """BeautifulSoup tree of `html`, restricted to STRAINERS[kind] when kind is given"""
+    backend = backend or DEFAULT_BACKEND
+    if backend not in SOUP_BACKENDS:
+        raise ValueError(f"Unknown soup backend {backend!r} (expected one of {SOUP_BACKENDS})")
+
+    if kind and os.getenv("IPO_RADAR_SAVE_PAGES"):
+        save_page(kind, html)
+
+    return _build(html, kind, backend)
+
+
+def _build(html, kind, backend):
+    from bs4 import BeautifulSoup
+    return BeautifulSoup(html, backend, parse_only=strainer(kind))
+
+
+def parse_tree(html, backend="lxml-raw"):
+    """Native tree of a raw backend: lxml.html element or selectolax HTMLParser"""
+    if backend == "lxml-raw":
+        import lxml.html
+        return lxml.html.fromstring(html)
+    if backend == "selectolax":
+        # Optional: pip install selectolax
+        from selectolax.parser import HTMLParser
+        return HTMLParser(html)
+    raise ValueError(f"Unknown raw backend {backend!r} (expected one of {RAW_BACKENDS})")
+
+
+def save_page(kind, html):
+    """Keeps a copy of the page under logs/pages/<kind>/ for bench-parse"""
+    directory = os.path.join(PAGES_DIR, kind)
+    os.makedirs(directory, exist_ok=True)
+    name = hashlib.sha1(html.encode("utf-8", "replace")).hexdigest()[:12]
+    with open(os.path.join(directory, f"{name}.html"), "w", encoding="utf-8") as f:
+        f.write(html)
+
+
+# ---------------- BENCHMARK ----------------
+
+def load_pages(pages_dir=PAGES_DIR):
+    """{kind: [html, ...]} from a directory written by save_page"""
+    pages = {}
+    if not os.path.isdir(pages_dir):
+        return pages
+    for kind in sorted(os.listdir(pages_dir)):
+        directory = os.path.join(pages_dir, kind)
+        if not os.path.isdir(directory):
+            continue
+        for name in sorted(os.listdir(directory)):
+            if name.endswith(".html"):
+                with open(os.path.join(directory, name), encoding="utf-8") as f:
+                    pages.setdefault(kind, []).append(f.read())
+    return pages
+
+
+def _time_per_page(func, pages, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for html in pages:
+            func(html)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best / len(pages) * 1000
+
+
+def benchmark(pages_dir=PAGES_DIR, repeat=3):
+    """
+    Prints ms/page for every backend on the saved pages of each kind:
+    soup backends with and without the kind's strainer, raw backends
+    as the lower bound. Returns {kind: {variant: ms}}.
+    """
+    pages = load_pages(pages_dir)
+    if not pages:
+        print(f"❌ No saved pages in {pages_dir} (run a scraper with IPO_RADAR_SAVE_PAGES=1)")
+        return {}
+
+    results = {}
+    for kind, htmls in pages.items():
+        row = {}
+        for backend in SOUP_BACKENDS:
+            row[f"{backend} full"] = _time_per_page(lambda h: _build(h, None, backend), htmls, repeat)
+            if kind in STRAINERS:
+                row[f"{backend} strained"] = _time_per_page(lambda h: _build(h, kind, backend), htmls, repeat)
+        for backend in RAW_BACKENDS:
+            try:
+                row[backend] = _time_per_page(lambda h: parse_tree(h, backend), htmls, repeat)
+            except ImportError:
+                row[backend] = None
+
+        results[kind] = row
+        print(f"📊 {kind} ({len(htmls)} pages)")
+        baseline = row[f"{DEFAULT_BACKEND} full"]
+        for variant, ms in row.items():
+            if ms is None:
+                print(f"   {variant:<22} not installed")
+            else:
+                print(f"   {variant:<22} {ms:8.2f} ms/page  {baseline / ms:5.1f}x")
+    return results
+
@@ -0,0 +1,162 @@
+"""
+Profiling mode for scrapers and notifiers.
+
+A profiled run writes three files next to the daily logs:
+
+    logs/profile_<name>_<ts>.prof        cProfile stats (snakeviz, pstats)
+    logs/profile_<name>_<ts>.collapsed   sampled stacks for flamegraph.pl / speedscope
+    logs/profile_<name>_<ts>_alloc.txt   tracemalloc top allocations
+
+When phases are given (e.g. "parse"), cProfile and the stack sampler are
+only active while the scraper is inside one of those metrics phases.
+"""
+import os
+import sys
+import cProfile
+import threading
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+
+from utils import metrics
+
+SAMPLE_INTERVAL = 0.005
+TOP_ALLOCATIONS = 30
+
+
+class Profiler:
+    def __init__(self, name, phases=None, interval=SAMPLE_INTERVAL):
+        self.name = name
+        self.phases = set(phases or [])
+        self.interval = interval
+        self.profile = cProfile.Profile()
+        self.stacks = Counter()
+        self.stopping = threading.Event()
+        self.sampler = threading.Thread(target=self._sample, daemon=True)
+        # Threads currently inside a selected phase -> nesting depth
+        self.active = Counter()
+        self.target_thread = threading.get_ident()
+
+    # ---------------- PHASE GATING ----------------
+
+    def on_phase(self, name, entering):
+        if name not in self.phases:
+            return
+        ident = threading.get_ident()
+        if entering:
+            self.active[ident] += 1
+            if self.active[ident] == 1:
+                self.profile.enable()
+        else:
+            self.active[ident] -= 1
+            if self.active[ident] <= 0:
+                del self.active[ident]
+                self.profile.disable()
+
+    # ---------------- SAMPLING ----------------
+
+    def _sample(self):
+        while not self.stopping.wait(self.interval):
+            if self.phases:
+                threads = list(self.active)
+            else:
+                threads = [self.target_thread]
+
+            frames = sys._current_frames()
+            for ident in threads:
+                frame = frames.get(ident)
+                if frame is not None:
+                    self.stacks[self._collapse(frame)] += 1
+
+    @staticmethod
+    def _collapse(frame):
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+            frame = frame.f_back
+        return ";".join(reversed(stack))
+
+    # ---------------- LIFECYCLE ----------------
+
+    def start(self):
+        tracemalloc.start(25)
+        if self.phases:
+            metrics.add_phase_listener(self.on_phase)
+        else:
+            self.profile.enable()
+        self.sampler.start()
+
+    def stop(self):
+        self.stopping.set()
+        self.sampler.join()
+        if self.phases:
+            metrics.remove_phase_listener(self.on_phase)
+        self.profile.disable()
+        snapshot = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        return self.save(snapshot)
+
+    def save(self, snapshot):
+        os.makedirs(metrics.LOG_DIR, exist_ok=True)
+        base = os.path.join(metrics.LOG_DIR, f"profile_{self.name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+
+        self.profile.dump_stats(base + ".prof")
+
+        with open(base + ".collapsed", "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+        with open(base + "_alloc.txt", "w") as f:
+            stats = snapshot.filter_traces([
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, __file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            ]).statistics("lineno")
+            f.write(f"Top {TOP_ALLOCATIONS} allocations ({self.name})\n")
+            for stat in stats[:TOP_ALLOCATIONS]:
+                f.write(f"{stat}\n")
+
+        print(f"🔬 Profile saved to {base}.*")
+        return base
+
+
+@contextmanager
+def profiled(name, phases=None):
+    profiler = Profiler(name, phases)
+    profiler.start()
+    try:
+        yield profiler
+    finally:
+        profiler.stop()
+
+
+def enable(phases=None):
+    """
+    Turns profiling on for this process and any child processes it
+    starts (run_all passes it on to each scraper this way).
+    """
+    os.environ["IPO_RADAR_PROFILE"] = "1"
+    if phases:
+        os.environ["IPO_RADAR_PROFILE_PHASES"] = ",".join(phases)
+
+
+def profile_from_env(name):
+    """Profiles the block when IPO_RADAR_PROFILE is set, otherwise does nothing"""
+    if not os.getenv("IPO_RADAR_PROFILE"):
+        return nullcontext()
+    phases = [p for p in os.getenv("IPO_RADAR_PROFILE_PHASES", "").split(",") if p]
+    return profiled(name, phases)
+
+
+def add_arguments(parser):
+    parser.add_argument("--profile", action="store_true",
+                        help="save cProfile, collapsed-stack and tracemalloc output to backend/logs")
+    parser.add_argument("--profile-phases", default="",
+                        help="only profile inside these comma-separated phases (e.g. parse)")
+
+
+def enable_from_args(args):
+    if args.profile:
+        enable([p for p in args.profile_phases.split(",") if p])
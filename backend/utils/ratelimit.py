@@ -0,0 +1,134 @@
+"""
+Adaptive per-host rate limiting for scraper traffic.
+
+Every host gets a token bucket. Its rate grows additively while the host
+answers quickly and is halved on 429/5xx, network errors or slow
+responses (AIMD), within per-host bounds. After too many consecutive
+failures the host's circuit opens and further requests fail fast with
+CircuitOpenError instead of waiting on timeouts. After COOLDOWN_SECONDS
+one probe request is let through: if it succeeds the circuit closes,
+otherwise it stays open for another cooldown. A probe that is never
+recorded (its caller died) is given up after PROBE_SECONDS. Long-lived processes (the
+worker, queue workers) thus recover from a bad stretch on their own.
+"""
+import time
+import threading
+from urllib.parse import urlparse
+
+# Requests per second: (initial, min, max). Initial values match the
+# fixed delays the scrapers used before.
+HOST_LIMITS = {
+    "www.chittorgarh.com": (1 / 1.2, 0.2, 4.0),
+    "www.sptulsian.com": (1.0, 0.2, 4.0),
+    "webnodejs.investorgain.com": (2.0, 0.5, 5.0),
+    "www.investorgain.com": (0.5, 0.1, 2.0),
+    "groww.in": (0.5, 0.1, 2.0),
+}
+DEFAULT_LIMITS = (1.0, 0.2, 4.0)
+
+RATE_STEP = 0.1           # additive increase per healthy response (req/s)
+SLOW_SECONDS = 5.0        # a response slower than this counts against the host
+FAILURE_THRESHOLD = 5     # consecutive failures before the circuit opens
+COOLDOWN_SECONDS = 300    # open circuit lets a probe through after this
+PROBE_SECONDS = 120       # a probe not recorded within this is given up
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    """The host failed repeatedly and is skipped until its circuit cools down"""
+
+
+class HostLimiter:
+    def __init__(self, host, rate, min_rate, max_rate):
+        self.host = host
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.tokens = 1.0
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.failures = 0
+        self.open = False
+        self.opened_at = 0.0
+        self.probe_owner = None   # thread sending the half-open probe
+        self.probe_deadline = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Blocks until the host may be called again"""
+        me = threading.get_ident()
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                # The probe itself may wait here (Retry-After) without failing on its own probe
+                if self.open and self.probe_owner != me:
+                    probing = self.probe_owner is not None and now < self.probe_deadline
+                    if probing or now - self.opened_at < COOLDOWN_SECONDS:
+                        raise CircuitOpenError(f"{self.host}: circuit open after {self.failures} failures")
+                    # Half-open: this caller is the probe, everyone else still fails fast
+                    self.probe_owner = me
+                    self.probe_deadline = float("inf")
+                    self.tokens = 1.0
+
+                self.tokens = min(1.0, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+
+                if now >= self.paused_until and self.tokens >= 1.0:
+                    self.tokens -= 1.0
+                    if self.probe_owner == me:
+                        self.probe_deadline = now + PROBE_SECONDS
+                    return
+                wait = max(self.paused_until - now, (1.0 - self.tokens) / self.rate)
+            time.sleep(wait)
+
+    def record(self, seconds, status=None, error=False, retry_after=None):
+        """Feeds one response (or failure) back into the rate and the breaker"""
+        failed = error or status in RETRY_STATUSES
+        with self.lock:
+            probe = self.open and self.probe_owner == threading.get_ident()
+            if probe:
+                self.probe_owner = None
+                if not failed:
+                    self.open = False
+                    self.failures = 0
+            if failed:
+                self.failures += 1
+                self.rate = max(self.min_rate, self.rate / 2)
+                if retry_after:
+                    self.paused_until = time.monotonic() + retry_after
+                # A failed probe starts another cooldown
+                if probe or (self.failures >= FAILURE_THRESHOLD and not self.open):
+                    self.open = True
+                    self.opened_at = time.monotonic()
+            elif seconds > SLOW_SECONDS:
+                self.failures = 0
+                self.rate = max(self.min_rate, self.rate / 2)
+            else:
+                self.failures = 0
+                self.rate = min(self.max_rate, self.rate + RATE_STEP)
+
+
+_limiters = {}
+_registry_lock = threading.Lock()
+
+
+def limiter_for(url):
+    host = urlparse(url).hostname or ""
+    with _registry_lock:
+        if host not in _limiters:
+            _limiters[host] = HostLimiter(host, *HOST_LIMITS.get(host, DEFAULT_LIMITS))
+        return _limiters[host]
+
+
+def retry_after_seconds(response):
+    value = response.headers.get("Retry-After")
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+def snapshot():
+    """{host: {rate, open}} for reports"""
+    with _registry_lock:
+        return {h: {"rate": round(l.rate, 2), "open": l.open} for h, l in _limiters.items()}
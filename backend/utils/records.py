@@ -0,0 +1,140 @@
+"""
+Compact, typed IPO records for code that reads IPOs in bulk (digests,
+admin report, duplicate check).
+
+An IPORecord holds only the list-view fields, with the scrapers'
+fallback keys (`gmp` / `gmp(₹)`, `subscription` / `overall subscription`,
+...) already resolved, in __slots__ instead of nested dicts. Records are
+decoded from `ipo_summaries`, where the fallbacks were resolved at write
+time, or from `ipos` documents read with the projection for the fields
+the caller needs. An ipos record decodes each attribute on first access,
+so reading names does not parse prices or dates:
+
+    for ipo in load(db.ipos, fields=["name", "status"]):
+        ipo.name, ipo.status
+"""
+from utils import summaries, ipocalendar
+
+# Record attribute -> summary field
+SUMMARY_FIELDS = {
+    "id": "ipo_id",
+    "name": "ipo_name",
+    "status": "status",
+    "price": "price",
+    "price_max": "price_max",
+    "gmp": "gmp",
+    "gmp_value": "gmp_value",
+    "subscription": "subscription",
+    "subscription_times": "subscription_times",
+    "open_date": "open_date",
+    "close_date": "close_date",
+    "listing_date": "listing_date",
+    "dates": "dates",
+}
+
+SUMMARY_PROJECTION = dict({field: 1 for field in SUMMARY_FIELDS.values()}, _id=0)
+
+# Record attribute -> ipos fields it is resolved from (see summaries.build_summary)
+IPO_SOURCES = {
+    "name": ["ipo_name"],
+    "status": ["status"],
+    "price": ["values.price band", "values.issue price"],
+    "gmp": ["values.gmp", "values.gmp(₹)"],
+    "subscription": ["values.subscription", "values.overall subscription"],
+    "open_date": ["values.ipo date", "opening_date"],
+    "close_date": ["values.ipo date"],
+    "listing_date": ["values.listing date", "values.listed on"],
+}
+IPO_SOURCES["price_max"] = IPO_SOURCES["price"]
+IPO_SOURCES["gmp_value"] = IPO_SOURCES["gmp"]
+IPO_SOURCES["subscription_times"] = IPO_SOURCES["subscription"]
+
+
+def _price(values):
+    return summaries._first(values, "price band", "issue price")
+
+
+def _gmp(values):
+    return summaries._first(values, "gmp", "gmp(₹)")
+
+
+def _subscription(values):
+    return summaries._first(values, "subscription", "overall subscription")
+
+
+# Record attribute -> decoder(ipos document, its values), as summaries.build_summary resolves it
+IPO_DECODERS = {
+    "id": lambda doc, values: doc.get("_id"),
+    "name": lambda doc, values: doc.get("ipo_name", ""),
+    "status": lambda doc, values: doc.get("status") or "unknown",
+    "price": lambda doc, values: _price(values),
+    "price_max": lambda doc, values: summaries.parse_number(_price(values), last=True),
+    "gmp": lambda doc, values: _gmp(values),
+    "gmp_value": lambda doc, values: summaries.parse_number(_gmp(values)),
+    "subscription": lambda doc, values: _subscription(values),
+    "subscription_times": lambda doc, values: summaries.parse_number(_subscription(values)),
+    "open_date": lambda doc, values: summaries.ipo_date_range(values)[0] or doc.get("opening_date"),
+    "close_date": lambda doc, values: summaries.ipo_date_range(values)[1],
+    "listing_date": lambda doc, values: summaries._first(values, "listing date", "listed on"),
+    "dates": lambda doc, values: ipocalendar.parse_dates(doc),
+}
+
+
+class IPORecord:
+    __slots__ = tuple(SUMMARY_FIELDS) + ("_doc",)
+
+    @classmethod
+    def from_summary(cls, doc):
+        """Decodes an ipo_summaries document"""
+        record = cls.__new__(cls)
+        record._doc = None
+        get = doc.get
+        for attr, field in SUMMARY_FIELDS.items():
+            setattr(record, attr, get(field))
+        return record
+
+    @classmethod
+    def from_ipo(cls, doc):
+        """Wraps an ipos document; its fallback keys are resolved when an attribute is read"""
+        record = cls.__new__(cls)
+        record._doc = doc
+        return record
+
+    def __getattr__(self, attr):
+        # Only reached for slots not set yet: decode the attribute once, then it is a plain slot
+        decode = IPO_DECODERS.get(attr)
+        doc = self._doc if decode else None
+        if doc is None:
+            raise AttributeError(attr)
+        value = decode(doc, doc.get("values") or {})
+        setattr(self, attr, value)
+        return value
+
+    def __repr__(self):
+        return f"IPORecord({self.name!r}, {self.status!r})"
+
+
+def ipo_projection(fields=None):
+    """Projection of ipos that covers the given record attributes (default all)"""
+    if fields is None:
+        return {path: 1 for path in summaries.SOURCE_FIELDS}
+    projection = {"ipo_name": 1}
+    for attr in fields:
+        if attr == "dates":
+            projection.update({path: 1 for path in ipocalendar.SOURCE_FIELDS})
+        elif attr != "id":
+            projection.update({path: 1 for path in IPO_SOURCES[attr]})
+    return projection
+
+
+def from_summaries(docs):
+    return [IPORecord.from_summary(doc) for doc in docs]
+
+
+def load(collection, query=None, fields=None):
+    """IPORecords of the ipos matching `query`, reading only what `fields` needs"""
+    return [IPORecord.from_ipo(doc) for doc in collection.find(query or {}, ipo_projection(fields))]
+
+
+def load_summaries(collection, query=None):
+    return from_summaries(collection.find(query or {}, SUMMARY_PROJECTION))
@@ -0,0 +1,273 @@
+"""
+Full-text search over the expert analysis and strengths/risks of IPOs.
+
+An inverted index with BM25 ranking over SP Tulsian's expert summary
+and description, Groww's strengths and risks, and the IPO name. It is
+built once from `ipos`, then kept up to date from the change log
+(utils/store.py): update() re-indexes only the IPOs whose text changed
+since the index's change-log version. The index is saved as a pickle of
+plain dicts and lists under logs/search, which loads in milliseconds.
+
+    cd backend
+    python -m utils.search build
+    python -m utils.search update
+    python -m utils.search query "strong order book"
+
+The resident worker keeps the index in memory and answers
+`search <query>` on its control socket, which the server's /api/search
+uses.
+"""
+import os
+import re
+import sys
+import time
+import heapq
+import math
+import pickle
+import threading
+from collections import Counter
+
+from utils import store, tiering
+from utils.metrics import LOG_DIR
+
+INDEX_PATH = os.path.join(LOG_DIR, "search", "index.pkl")
+FORMAT = 2
+
+# Indexed fields and how much a term occurrence in them counts
+FIELDS = {
+    "ipo_name": 3.0,
+    "values.expert_description": 1.5,
+    "values.expert_summary": 1.0,
+    "values.strengths": 1.0,
+    "values.risks": 1.0,
+}
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+# A query reloads changes from the change log at most this often
+REFRESH_SECONDS = 30
+
+TOKEN = re.compile(r"[a-z0-9]+")
+STOPWORDS = set("""
+a an and are as at be by for from has have in is it its of on or that the
+this to was were will with which ipo ltd limited company
+""".split())
+
+
+def tokens(text):
+    words = []
+    for word in TOKEN.findall(text.lower()):
+        if len(word) < 2 or word in STOPWORDS:
+            continue
+        # Crude plural folding: "risks" and "risk" are one term
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        words.append(word)
+    return words
+
+
+def _field(doc, path):
+    for part in path.split("."):
+        if not isinstance(doc, dict):
+            return ""
+        doc = doc.get(part)
+    if isinstance(doc, list):
+        return " ".join(str(item) for item in doc)
+    return str(doc) if doc else ""
+
+
+def term_weights(ipo):
+    """{term: weighted frequency} of an ipos document"""
+    weights = Counter()
+    for path, weight in FIELDS.items():
+        for term in tokens(_field(ipo, path)):
+            weights[term] += weight
+    return weights
+
+
+def touches_index(fields):
+    return any(field == path or path.startswith(field + ".") for field in fields for path in FIELDS)
+
+
+# ---------------- INDEX ----------------
+
+class SearchIndex:
+    def __init__(self):
+        self.version = 0      # change-log version the index is current with
+        self.docs = {}        # ipo_name -> (ipo_id, length, terms)
+        self.postings = {}    # term -> {ipo_name: weighted tf}
+        self.total_length = 0.0
+        self.refreshed = 0.0
+        self.lock = threading.Lock()
+
+    def add(self, ipo):
+        name = ipo["ipo_name"]
+        self.remove(name)
+        weights = term_weights(ipo)
+        if not weights:
+            return
+        length = sum(weights.values())
+        self.docs[name] = (str(ipo["_id"]), length, tuple(weights))
+        self.total_length += length
+        for term, tf in weights.items():
+            self.postings.setdefault(term, {})[name] = tf
+
+    def remove(self, name):
+        if name not in self.docs:
+            return
+        _, length, terms = self.docs.pop(name)
+        self.total_length -= length
+        # Only the document's own postings, not the whole vocabulary
+        for term in terms:
+            posting = self.postings.get(term)
+            if posting is not None and posting.pop(name, None) is not None and not posting:
+                del self.postings[term]
+
+    def search(self, query, limit=10):
+        """[(ipo_id, ipo_name, score)] best first"""
+        if not self.docs:
+            return []
+        n = len(self.docs)
+        average = self.total_length / n
+        scores = Counter()
+        for term in set(tokens(query)):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1 + (n - len(posting) + 0.5) / (len(posting) + 0.5))
+            for name, tf in posting.items():
+                length = self.docs[name][1]
+                scores[name] += idf * tf * (K1 + 1) / (tf + K1 * (1 - B + B * length / average))
+        best = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+        return [(self.docs[name][0], name, round(score, 4)) for name, score in best]
+
+    # ---------------- PERSISTENCE ----------------
+
+    def save(self, path=INDEX_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        state = {
+            "format": FORMAT, "version": self.version, "docs": self.docs,
+            "postings": self.postings, "total_length": self.total_length,
+        }
+        with open(path + ".tmp", "wb") as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, path=INDEX_PATH):
+        """The saved index, or None if there is none (or it has an old format)"""
+        if not os.path.exists(path):
+            return None
+        with open(path, "rb") as f:
+            state = pickle.load(f)
+        if state.get("format") != FORMAT:
+            return None
+        index = cls()
+        index.version = state["version"]
+        index.docs = state["docs"]
+        index.postings = state["postings"]
+        index.total_length = state["total_length"]
+        return index
+
+
+# ---------------- BUILD / UPDATE ----------------
+
+PROJECTION = dict({path: 1 for path in FIELDS}, ipo_name=1)
+
+
+def build(db):
+    index = SearchIndex()
+    # Changes after this version are applied by the next update
+    index.version = store.current_version(db)
+    for ipo in tiering.find(db, {}, PROJECTION):
+        index.add(ipo)
+    return index
+
+
+def refresh(index, db):
+    """Re-indexes the IPOs whose text changed since the index's version; returns how many"""
+    names, version = store.changed_names(db, index.version, touches_index)
+    with index.lock:
+        if names:
+            found = set()
+            for ipo in tiering.find(db, {"ipo_name": {"$in": sorted(names)}}, PROJECTION):
+                index.add(ipo)
+                found.add(ipo["ipo_name"])
+            for name in names - found:
+                index.remove(name)  # merged away or deleted
+        index.version = version
+        index.refreshed = time.time()
+    return len(names)
+
+
+_index = None
+
+
+def get_index(db):
+    """The process-wide index: loaded from disk (or built) once, refreshed when queried"""
+    global _index
+    if _index is None:
+        _index = SearchIndex.load() or build(db)
+    if time.time() - _index.refreshed > REFRESH_SECONDS:
+        refresh(_index, db)
+    return _index
+
+
+def search(query, limit=10, db=None):
+    from utils.db import get_db
+
+    index = get_index(db or get_db())
+    with index.lock:
+        return index.search(query, limit)
+
+
+def update():
+    """Brings the saved index up to date (worker job / end of a scrape cycle)"""
+    from utils.db import get_db
+
+    db = get_db()
+    index = SearchIndex.load()
+    if index is None:
+        index = build(db)
+        print(f"✅ Built search index: {len(index.docs)} IPOs, {len(index.postings)} terms")
+    else:
+        print(f"✅ Re-indexed {refresh(index, db)} IPOs")
+    index.save()
+
+    global _index
+    _index = index
+    return len(index.docs)
+
+
+def main(argv=None):
+    import argparse
+    from utils.db import get_db
+
+    parser = argparse.ArgumentParser(prog="python -m utils.search", description="IPO full-text search")
+    parser.add_argument("command", choices=["build", "update", "query"])
+    parser.add_argument("query", nargs="?", help="query: search terms")
+    parser.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        index = build(get_db())
+        index.save()
+        print(f"✅ Built search index: {len(index.docs)} IPOs, {len(index.postings)} terms")
+    elif args.command == "update":
+        update()
+    else:
+        if not args.query:
+            parser.error("query needs search terms")
+        started = time.perf_counter()
+        results = search(args.query, args.limit)
+        elapsed = (time.perf_counter() - started) * 1000
+        for ipo_id, name, score in results:
+            print(f"{score:8.3f}  {name}  ({ipo_id})")
+        print(f"🔎 {len(results)} results in {elapsed:.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,433 @@
+"""
+Staged writes: a scrape cycle's IPO updates, published together at its end.
+
+With staging on (STAGED_WRITES=1, or run_all.py --staged), store.save_ipo
+does not touch `ipos` during the cycle. Writes are buffered and inserted
+into `ipos_staging` with unacknowledged (w=0) bulk inserts, so the
+scrapers never wait on Mongo. When the scrapers are done, publish():
+
+  1. waits until every writer's inserts have landed (each writer leaves
+     an acknowledged manifest with its count when it closes); writers
+     whose inserts were lost, or that died without a manifest, are
+     reported and their writes left in staging, the rest is published,
+  2. dedupes the cycle: one patch per IPO, applied in write order, with
+     names that differ only in case or spacing mapped onto one IPO,
+  3. validates the patches; rejected ones stay in staging with the reason,
+  4. publishes all valid patches with a single $merge aggregation into
+     `ipos`, run on the server,
+  5. appends the change log and refreshes summaries, as save_ipo would.
+
+Until step 4, readers see `ipos` as of the previous cycle. The $merge is
+not atomic across documents: while it runs, and until the change log,
+summaries and archived IPOs are written after it, readers can see part
+of the cycle. Archived IPOs (utils/tiering.py) are published through
+save_ipo instead, so their cold fields go to the archive. A $set of a
+whole sub-document is merged into the existing one when published, not
+replaced; where the existing value is not a sub-document (null, a
+string) it is replaced.
+
+    cd backend
+    python -m utils.staging status
+    python -m utils.staging publish <cycle>   # retry a cycle that did not publish
+"""
+import os
+import sys
+import time
+import uuid
+import atexit
+import socket
+import threading
+from datetime import datetime, timezone
+
+from utils import store, summaries, indexes
+from utils.metrics import current
+
+STAGING_COLLECTION = "ipos_staging"
+CYCLE_ENV = "IPO_RADAR_STAGING"
+
+# Writes buffered per unacknowledged insert
+BUFFER = 50
+
+# How long publish() waits for unacknowledged writes to land
+WAIT_SECONDS = 60
+
+# IPOs read per query while publishing
+CHUNK = 500
+
+MAX_NAME_LENGTH = 200
+
+
+def enabled():
+    return os.getenv("STAGED_WRITES", "").lower() in ("1", "true", "yes")
+
+
+# ---------------- STAGE ----------------
+
+class Stage:
+    """One process's writes to a cycle"""
+
+    def __init__(self, db, cycle):
+        from pymongo import WriteConcern
+
+        self.db = db
+        self.cycle = cycle
+        indexes.collection(db, STAGING_COLLECTION)  # TTL on `at` cleans up abandoned cycles
+        self.collection = db.get_collection(STAGING_COLLECTION, write_concern=WriteConcern(w=0))
+        self.writer = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.buffer = []
+        self.count = 0
+        self.closed = False
+        self.lock = threading.Lock()
+
+    def add(self, ipo_name, fields, upsert):
+        with self.lock:
+            self.buffer.append({
+                "cycle": self.cycle,
+                "kind": "write",
+                "writer": self.writer,
+                "seq": self.count,
+                "at": datetime.now(timezone.utc),
+                "source": current().source,
+                "ipo_name": ipo_name,
+                # Dotted paths are not valid field names, so the $set is kept as pairs
+                "fields": [[path, value] for path, value in fields.items()],
+                "upsert": upsert,
+            })
+            self.count += 1
+            if len(self.buffer) >= BUFFER:
+                self._flush()
+
+    def _flush(self):
+        if not self.buffer:
+            return
+        started = time.perf_counter()
+        with current().phase("write"):
+            self.collection.insert_many(self.buffer, ordered=False)
+        current().record_write(len(self.buffer), time.perf_counter() - started)
+        self.buffer = []
+
+    def close(self):
+        """Flushes and writes the manifest; later calls (e.g. at exit) do nothing"""
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            self._flush()
+            # Acknowledged, unlike the writes: publish() waits for `count` of them
+            self.db[STAGING_COLLECTION].update_one({"_id": f"{self.cycle}:{self.writer}"}, {"$set": {
+                "cycle": self.cycle,
+                "kind": "manifest",
+                "writer": self.writer,
+                "count": self.count,
+                "at": datetime.now(timezone.utc),
+            }}, upsert=True)
+
+
+_stage = None
+
+
+def active():
+    """The Stage of the current cycle, or None when writes go straight to `ipos`"""
+    global _stage
+    cycle = os.getenv(CYCLE_ENV)
+    if not cycle:
+        return None
+    if _stage is None or _stage.cycle != cycle:
+        from utils.db import get_db
+
+        if _stage is not None:
+            _stage.close()
+            atexit.unregister(_stage.close)
+        _stage = Stage(get_db(), cycle)
+        # Scrapers run as scripts do not know about the cycle; close on exit
+        atexit.register(_stage.close)
+    return _stage
+
+
+def begin(cycle=None):
+    """Stages this process's writes, and those of processes it starts, under a new cycle"""
+    cycle = cycle or f"{datetime.now(timezone.utc):%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:6]}"
+    os.environ[CYCLE_ENV] = cycle
+    return cycle
+
+
+def end():
+    """Stops staging; returns the cycle that was staged, if any"""
+    global _stage
+    cycle = os.environ.pop(CYCLE_ENV, None)
+    if _stage is not None:
+        _stage.close()
+        atexit.unregister(_stage.close)
+        _stage = None
+    return cycle
+
+
+# ---------------- DEDUPE / VALIDATE ----------------
+
+def normalize(name):
+    return " ".join(name.split()).casefold()
+
+
+def flatten(doc, prefix=""):
+    """{dotted path: value} of the leaves of a nested document"""
+    fields = {}
+    for key, value in doc.items():
+        path = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict) and value:
+            fields.update(flatten(value, path))
+        else:
+            fields[path] = value
+    return fields
+
+
+def validate(name, fields):
+    """Why a patch cannot be published, or None"""
+    if not isinstance(name, str) or not name.strip():
+        return "missing ipo_name"
+    if len(name) > MAX_NAME_LENGTH:
+        return "ipo_name too long"
+    if not fields:
+        return "no fields"
+    for path in fields:
+        if any(not part or part.startswith("$") for part in path.split(".")):
+            return f"invalid field {path!r}"
+    if fields.get("ipo_name", name) != name:
+        return "renames the IPO"
+    return None
+
+
+def collapse(writes, live_names):
+    """
+    ({ipo_name: {"nested", "upsert", "sources"}}, [(ipo_name, error)]):
+    the cycle's writes folded into one nested patch per IPO, in order
+    """
+    canonical = {normalize(name): name for name in live_names}
+    patches, rejected = {}, []
+    for write in writes:
+        name = write.get("ipo_name")
+        if not isinstance(name, str) or not name.strip():
+            rejected.append((name, "missing ipo_name"))
+            continue
+        name = canonical.setdefault(normalize(name), name)
+        patch = patches.setdefault(name, {"nested": {}, "upsert": False, "sources": set()})
+        for path, value in write["fields"]:
+            if path == "ipo_name" and isinstance(value, str) and normalize(value) == normalize(name):
+                value = name  # folded onto the canonical spelling, not a rename
+            store._set(patch["nested"], path, value)
+        patch["upsert"] = patch["upsert"] or write["upsert"]
+        patch["sources"].add(write.get("source"))
+    return patches, rejected
+
+
+# ---------------- PUBLISH ----------------
+
+def wait_for_writes(staging, cycle, timeout=WAIT_SECONDS):
+    """
+    (complete, incomplete): the writers all of whose manifested writes are
+    in staging, and {writer: reason} for those whose unacknowledged writes
+    were lost or that died without leaving a manifest.
+    """
+    deadline = time.time() + timeout
+    while True:
+        expected = {m["writer"]: m["count"] for m in staging.find({"cycle": cycle, "kind": "manifest"})}
+        landed = {row["_id"]: row["count"] for row in staging.aggregate([
+            {"$match": {"cycle": cycle, "kind": "write"}},
+            {"$group": {"_id": "$writer", "count": {"$sum": 1}}},
+        ])}
+        short = {writer: count - landed.get(writer, 0) for writer, count in expected.items()
+                 if landed.get(writer, 0) < count}
+        if not short or time.time() > deadline:
+            break
+        time.sleep(0.5)
+
+    incomplete = {writer: f"{missing} of {expected[writer]} writes never arrived" for writer, missing in short.items()}
+    for writer, count in landed.items():
+        if writer not in expected:
+            incomplete[writer] = f"{count} writes but no manifest (killed before closing its stage?)"
+    return set(expected) - set(short), incomplete
+
+
+def subdocuments(nested, tree=None):
+    """Tree of the sub-document paths in a nested patch"""
+    tree = {} if tree is None else tree
+    for key, value in nested.items():
+        if isinstance(value, dict) and value:
+            subdocuments(value, tree.setdefault(key, {}))
+    return tree
+
+
+def merge_expression(tree, path=""):
+    """
+    The matched document with $$new deep-merged into it along `tree`.
+    Each level is merged only where both sides are sub-documents: a patch
+    that does not touch the path keeps the current value, and anything
+    else ($set of a scalar, or a current null or string) takes the patch's
+    value, so one odd document cannot fail the whole $merge.
+    """
+    nested = {key: merge_expression(sub, f"{path}.{key}" if path else key) for key, sub in tree.items()}
+    if not path:
+        return {"$mergeObjects": ["$$ROOT", "$$new", nested, {"_id": "$_id"}]}
+
+    current_value, new_value = f"${path}", f"$$new.{path}"
+    merged = {"$mergeObjects": [current_value, new_value, nested] if nested else [current_value, new_value]}
+    return {"$switch": {
+        "branches": [
+            {"case": {"$eq": [{"$type": new_value}, "missing"]}, "then": current_value},
+            {"case": {"$and": [
+                {"$eq": [{"$type": new_value}, "object"]},
+                {"$eq": [{"$type": current_value}, "object"]},
+            ]}, "then": merged},
+        ],
+        "default": new_value,
+    }}
+
+
+def publish(db, cycle):
+    """Publishes a staged cycle into `ipos`; returns the number of IPOs published"""
+    staging = indexes.collection(db, STAGING_COLLECTION)
+    now = datetime.now(timezone.utc)
+
+    with current().phase("fetch"):
+        complete, incomplete = wait_for_writes(staging, cycle)
+        writes = list(staging.find({"cycle": cycle, "kind": "write", "writer": {"$in": sorted(complete)}})
+                      .sort([("at", 1), ("writer", 1), ("seq", 1)]))
+        live_names = [doc["ipo_name"] for doc in db.ipos.find({}, {"_id": 0, "ipo_name": 1})]
+    if incomplete:
+        current().record_error()
+        print(f"❌ Cycle {cycle}: {len(incomplete)} writers incomplete, their writes are left in staging")
+        for writer, reason in sorted(incomplete.items()):
+            print(f"   ❌ {writer}: {reason}")
+    if not writes:
+        print(f"ℹ️ Cycle {cycle} staged no complete writes")
+        return 0
+
+    patches, rejected = collapse(writes, live_names)
+    fields = {name: flatten(patch["nested"]) for name, patch in patches.items()}
+    for name in list(patches):
+        error = validate(name, fields[name])
+        if error:
+            rejected.append((name, error))
+            del patches[name]
+
+    # Current values of everything the cycle touches, for the change log and summaries
+    paths = sorted({path for name in patches for path in fields[name]} | set(summaries.SOURCE_FIELDS) | {"dates", "archived"})
+    names = sorted(patches)
+    before = {}
+    with current().phase("fetch"):
+        for i in range(0, len(names), CHUNK):
+            for doc in db.ipos.find({"ipo_name": {"$in": names[i:i + CHUNK]}}, store._projection(paths)):
+                before[doc["ipo_name"]] = doc
+
+    merged, archived, skipped = [], [], 0
+    for name in names:
+        doc = before.get(name)
+        if doc is None and not patches[name]["upsert"]:
+            skipped += 1  # update-only write of an IPO that does not exist
+        elif doc is not None and doc.get("archived"):
+            archived.append(name)
+        else:
+            merged.append(name)
+
+    started = time.perf_counter()
+    with current().phase("write"):
+        staging.delete_many({"cycle": cycle, "kind": {"$in": ["patch", "rejected"]}})
+        if rejected:
+            staging.insert_many([
+                {"cycle": cycle, "kind": "rejected", "at": now, "ipo_name": name, "error": error}
+                for name, error in rejected
+            ])
+        if merged:
+            staging.insert_many([
+                {"cycle": cycle, "kind": "patch", "at": now, "patch": dict(patches[name]["nested"], ipo_name=name)}
+                for name in merged
+            ])
+            tree = {}
+            for name in merged:
+                subdocuments(patches[name]["nested"], tree)
+            # One aggregation for every patch, merged on the server (per document, not atomic)
+            list(staging.aggregate([
+                {"$match": {"cycle": cycle, "kind": "patch"}},
+                {"$replaceWith": "$patch"},
+                {"$merge": {
+                    "into": "ipos",
+                    "on": "ipo_name",
+                    "whenMatched": [{"$replaceWith": merge_expression(tree)}],
+                    "whenNotMatched": "insert",
+                }},
+            ]))
+    current().record_write(len(merged), time.perf_counter() - started)
+
+    for name in archived:
+        store.save_ipo(db.ipos, name, fields[name], upsert=False)
+
+    changes = 0
+    with current().phase("write"):
+        for name in merged:
+            change = store.record_change(db, name, before.get(name), fields[name])
+            if change:
+                changes += 1
+                if summaries.touches_summary(change["changed"]):
+                    store.refresh_summary(db.ipos, name, before.get(name), fields[name])
+
+    staging.delete_many({"cycle": cycle, "kind": "patch"})
+    staging.delete_many({"cycle": cycle, "kind": {"$in": ["write", "manifest"]}, "writer": {"$in": sorted(complete)}})
+    print(f"✅ Published cycle {cycle}: {len(merged) + len(archived)} IPOs from {len(writes)} writes "
+          f"({changes} changed, {skipped} skipped, {len(rejected)} rejected)")
+    for name, error in rejected:
+        print(f"   ❌ {name}: {error}")
+    return len(merged) + len(archived)
+
+
+# ---------------- WORKER / CLI ----------------
+
+def start_cycle():
+    """Starts staging when STAGED_WRITES is set (worker job before the scrapers)"""
+    if enabled():
+        print(f"📥 Staging writes of cycle {begin()}")
+
+
+def publish_cycle():
+    """Publishes the staged cycle, if one is active (worker job after the scrapers)"""
+    from utils.db import get_db
+
+    cycle = end()
+    if cycle:
+        return publish(get_db(), cycle)
+    return 0
+
+
+def status(db):
+    """{cycle: {kind: count}} of everything in staging"""
+    cycles = {}
+    for row in db[STAGING_COLLECTION].aggregate([
+        {"$group": {"_id": {"cycle": "$cycle", "kind": "$kind"}, "count": {"$sum": 1}}},
+    ]):
+        cycles.setdefault(row["_id"]["cycle"], {})[row["_id"]["kind"]] = row["count"]
+    return cycles
+
+
+def main(argv=None):
+    import argparse
+    from utils.db import get_db
+
+    parser = argparse.ArgumentParser(prog="python -m utils.staging", description="Staged scrape cycles")
+    parser.add_argument("command", choices=["status", "publish"])
+    parser.add_argument("cycle", nargs="?", help="publish: cycle id (see status)")
+    args = parser.parse_args(argv)
+
+    db = get_db()
+    if args.command == "status":
+        cycles = status(db)
+        if not cycles:
+            print("ℹ️ Nothing staged")
+        for cycle, kinds in sorted(cycles.items()):
+            print(f"{cycle}: " + ", ".join(f"{count} {kind}" for kind, count in sorted(kinds.items())))
+    else:
+        if not args.cycle:
+            parser.error("publish needs a cycle id")
+        publish(db, args.cycle)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,225 @@
+"""
+Shared write path for all scrapers.
+
+Every effective update of an IPO is also appended to the `ipo_changes`
+collection with a monotonically increasing version, so consumers can
+poll for what changed instead of re-reading `ipos`:
+
+    for change in changes_since(db, last_seen):
+        ...  # {version, ipo_name, created, changed: {field: value}, at}
+
+Updates that touch list-view fields also refresh the IPO's document in
+`ipo_summaries` (see utils/summaries.py) and its parsed `dates`
+(see utils/ipocalendar.py). Updates of archived IPOs are applied to
+their archive copy (see utils/tiering.py). With staged writes on, all
+of this happens when the cycle is published (see utils/staging.py).
+"""
+import time
+from datetime import datetime, timedelta, timezone
+
+from utils.metrics import current
+from utils import summaries, ipocalendar, indexes
+
+CHANGES_COLLECTION = "ipo_changes"
+COUNTERS_COLLECTION = "counters"
+CHANGES_COUNTER = "ipo_changes"
+
+# Timestamps every scraper rewrites; a write that only touches these is not a change
+VOLATILE_FIELDS = {"updated_at", "updatedAt"}
+
+# A version missing for longer than this was abandoned by its writer and is skipped
+GAP_GRACE_SECONDS = 30
+
+
+def save_ipo(collection, ipo_name, fields, upsert=True):
+    """
+    $set the given (dotted) fields on the IPO matched by name, creating
+    it unless upsert is False. Returns the change-log entry, or None when
+    nothing changed. While a cycle is staged (utils/staging.py) the write
+    is queued for its publish instead, and None is returned.
+    """
+    from utils import staging
+
+    stage = staging.active()
+    if stage is not None:
+        stage.add(ipo_name, fields, upsert)
+        return None
+
+    # Summary fields are read along so the summary can be rebuilt without another query
+    with_summary = summaries.touches_summary(fields)
+    paths = list(fields) + (summaries.SOURCE_FIELDS + ["dates"] if with_summary else [])
+
+    started = time.perf_counter()
+    with current().phase("write"):
+        before = _write(collection, ipo_name, fields, paths, upsert)
+        if before is None and not upsert:
+            change = None  # no such IPO, nothing written
+        else:
+            change = record_change(collection.database, ipo_name, before, fields)
+        if change and with_summary and summaries.touches_summary(change["changed"]):
+            refresh_summary(collection, ipo_name, before, fields)
+    current().record_write(1, time.perf_counter() - started)
+    return change
+
+
+def _write(collection, ipo_name, fields, paths, upsert):
+    """
+    $sets `fields` on the IPO and returns its previous values of `paths`.
+    An archived IPO only gets their hot part in `ipos`; the rest goes
+    straight to its archive copy (utils/tiering.py).
+    """
+    from utils import tiering
+
+    projection = _projection(paths + ["archived"])
+    hot = tiering.hot_fields(fields)
+    if hot == fields:
+        return collection.find_one_and_update(
+            {"ipo_name": ipo_name}, {"$set": fields}, projection=projection, upsert=upsert
+        )
+
+    before = collection.find_one_and_update(
+        {"ipo_name": ipo_name, "archived": {"$ne": True}}, {"$set": fields}, projection=projection
+    )
+    if before is not None:
+        return before
+
+    # Archived or missing: only the hot part goes to `ipos` ($set of the name when there is none)
+    before = collection.find_one_and_update(
+        {"ipo_name": ipo_name}, {"$set": hot or {"ipo_name": ipo_name}}, projection=projection, upsert=upsert
+    )
+    if before is not None and before.get("archived"):
+        return tiering.merge(tiering.save_cold(collection, before["_id"], fields, paths), before)
+    if before is not None or upsert:
+        # Just inserted, or restored in between: the whole write belongs in `ipos`
+        collection.update_one({"ipo_name": ipo_name, "archived": {"$ne": True}}, {"$set": fields})
+    return before
+
+
+def refresh_summary(collection, ipo_name, before, fields):
+    if before is None:
+        # Just inserted: the upsert only wrote `fields`
+        after = {"ipo_name": ipo_name}
+        ipo_id = collection.find_one({"ipo_name": ipo_name}, {"_id": 1})["_id"]
+    else:
+        after = before
+        ipo_id = before["_id"]
+    for path, value in fields.items():
+        _set(after, path, value)
+    summary = summaries.save_summary(collection.database, ipo_id, after)
+    if not ipocalendar.same_dates(after.get("dates"), summary["dates"]):
+        collection.update_one({"_id": ipo_id}, {"$set": {"dates": summary["dates"]}})
+
+
+def _projection(paths):
+    """Projection of the given paths (skipping paths already covered by a parent)"""
+    paths = sorted(paths)
+    projection = {"_id": 1}
+    for path in paths:
+        if not any(path.startswith(parent + ".") for parent in projection):
+            projection[path] = 1
+    return projection
+
+
+def _set(doc, path, value):
+    parts = path.split(".")
+    for part in parts[:-1]:
+        if not isinstance(doc.get(part), dict):
+            doc[part] = {}
+        doc = doc[part]
+    doc[parts[-1]] = value
+
+
+def _get(doc, path):
+    for part in path.split("."):
+        if not isinstance(doc, dict) or part not in doc:
+            return None
+        doc = doc[part]
+    return doc
+
+
+def diff(before, fields):
+    """{field: new value} for the fields whose value actually changes"""
+    if before is None:
+        return {k: v for k, v in fields.items() if k not in VOLATILE_FIELDS}
+    return {
+        k: v for k, v in fields.items()
+        if k not in VOLATILE_FIELDS and _get(before, k) != v
+    }
+
+
+# ---------------- CHANGE LOG ----------------
+
+def next_version(db):
+    from pymongo import ReturnDocument
+
+    counter = db[COUNTERS_COLLECTION].find_one_and_update(
+        {"_id": CHANGES_COUNTER},
+        {"$inc": {"seq": 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return counter["seq"]
+
+
+def record_change(db, ipo_name, before, fields):
+    changed = diff(before, fields)
+    if not changed:
+        return None
+
+    entry = {
+        "version": next_version(db),
+        "ipo_name": ipo_name,
+        "created": before is None,
+        "changed": changed,
+        "at": datetime.now(timezone.utc),
+    }
+    # Unique version and the TTL on `at` (utils/indexes.py)
+    indexes.collection(db, CHANGES_COLLECTION).insert_one(entry)
+    return entry
+
+
+def current_version(db):
+    counter = db[COUNTERS_COLLECTION].find_one({"_id": CHANGES_COUNTER})
+    return counter["seq"] if counter else 0
+
+
+def changes_since(db, version, limit=500):
+    """
+    Change-log entries after `version`, oldest first. Stops before a
+    version that another writer has taken but not inserted yet, so a
+    caller that resumes from the last returned version never skips one.
+    """
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=GAP_GRACE_SECONDS)
+    expected = version + 1
+    changes = []
+
+    for entry in db[CHANGES_COLLECTION].find({"version": {"$gt": version}}, {"_id": 0}).sort("version", 1).limit(limit):
+        if entry["version"] != expected and _aware(entry["at"]) > cutoff:
+            break
+        changes.append(entry)
+        expected = entry["version"] + 1
+    return changes
+
+
+def changed_names(db, since, touches=None):
+    """
+    (Names of IPOs changed after `since`, last change-log version read).
+    With `touches`, only changes that create an IPO or for which
+    touches(changed fields) is true count.
+    """
+    names = set()
+    version = since
+    while True:
+        changes = changes_since(db, version)
+        if not changes:
+            return names, version
+        names.update(
+            change["ipo_name"] for change in changes
+            if touches is None or change["created"] or touches(change["changed"])
+        )
+        version = changes[-1]["version"]
+
+
+def _aware(dt):
+    # pymongo returns naive UTC datetimes unless the client is tz_aware
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
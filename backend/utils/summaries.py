@@ -0,0 +1,150 @@
+"""
+Compact per-IPO documents for list views and email digests.
+
+`ipo_summaries` holds one small, already normalised document per IPO
+(name, status, price, GMP, subscription, display and parsed dates), kept
+in step with `ipos` by save_ipo. Readers that only need the list-view fields read
+this collection instead of full IPO documents with their raw HTML.
+
+    cd backend
+    python -m utils.summaries rebuild     # (re)build from ipos
+"""
+import re
+import sys
+from datetime import datetime, timezone
+
+from utils import ipocalendar, indexes
+
+SUMMARIES_COLLECTION = "ipo_summaries"
+
+# Fields of an ipos document a summary is built from
+SOURCE_FIELDS = [
+    "ipo_name", "status", "opening_date",
+    "values.price band", "values.issue price",
+    "values.gmp", "values.gmp(₹)",
+    "values.subscription", "values.overall subscription",
+    "values.ipo date", "values.listing date", "values.listed on",
+    "values.logo_url", "values.expert_description",
+]
+SOURCE_FIELDS += [field for field in ipocalendar.SOURCE_FIELDS if field not in SOURCE_FIELDS]
+
+NUMBER = re.compile(r"-?\d[\d,]*(?:\.\d+)?")
+
+
+def _first(values, *keys):
+    for key in keys:
+        value = values.get(key)
+        if value not in (None, ""):
+            return str(value).strip()
+    return None
+
+
+def parse_number(text, last=False):
+    """First (or last) number in a display string like '₹95 to ₹100' or '12.5x'"""
+    if not text:
+        return None
+    matches = NUMBER.findall(text)
+    if not matches:
+        return None
+    try:
+        return float(matches[-1 if last else 0].replace(",", ""))
+    except ValueError:
+        return None
+
+
+def ipo_date_range(values):
+    """(open, close) display strings from an "<open> to <close>" IPO date"""
+    ipo_date = _first(values, "ipo date")
+    if ipo_date and " to " in ipo_date:
+        opening, closing = ipo_date.split(" to ", 1)
+        return opening.strip(), closing.strip()
+    return None, None
+
+
+def build_summary(ipo):
+    """Summary document for an ipos document (or the SOURCE_FIELDS part of one)"""
+    values = ipo.get("values") or {}
+
+    price = _first(values, "price band", "issue price")
+    gmp = _first(values, "gmp", "gmp(₹)")
+    subscription = _first(values, "subscription", "overall subscription")
+
+    open_date, close_date = ipo_date_range(values)
+
+    return {
+        "ipo_name": ipo["ipo_name"],
+        "status": ipo.get("status") or "unknown",
+        "price": price,
+        "price_max": parse_number(price, last=True),
+        "gmp": gmp,
+        "gmp_value": parse_number(gmp),
+        "subscription": subscription,
+        "subscription_times": parse_number(subscription),
+        "open_date": open_date or ipo.get("opening_date"),
+        "close_date": close_date,
+        "listing_date": _first(values, "listing date", "listed on"),
+        "logo_url": _first(values, "logo_url"),
+        "expert_description": _first(values, "expert_description"),
+        "dates": ipocalendar.parse_dates(ipo),
+    }
+
+
+def touches_summary(fields):
+    """True if a $set of these (dotted) fields can change the summary"""
+    return any(
+        field == source or source.startswith(field + ".")
+        for field in fields for source in SOURCE_FIELDS
+    )
+
+
+# ---------------- WRITING ----------------
+
+def save_summary(db, ipo_id, ipo):
+    summary = build_summary(ipo)
+    summary["ipo_id"] = ipo_id
+    summary["updatedAt"] = datetime.now(timezone.utc)
+    indexes.collection(db, SUMMARIES_COLLECTION).update_one(
+        {"ipo_name": summary["ipo_name"]},
+        {"$set": summary},
+        upsert=True
+    )
+    return summary
+
+
+def rebuild(db):
+    """Rebuilds every summary from ipos and drops summaries of removed IPOs"""
+    from pymongo import UpdateOne
+
+    projection = {field: 1 for field in SOURCE_FIELDS}
+    now = datetime.now(timezone.utc)
+    ops = []
+    names = []
+    for ipo in db.ipos.find({}, projection):
+        summary = build_summary(ipo)
+        summary["ipo_id"] = ipo["_id"]
+        summary["updatedAt"] = now
+        names.append(summary["ipo_name"])
+        ops.append(UpdateOne({"ipo_name": summary["ipo_name"]}, {"$set": summary}, upsert=True))
+
+    collection = indexes.collection(db, SUMMARIES_COLLECTION)
+    if ops:
+        collection.bulk_write(ops, ordered=False)
+    removed = collection.delete_many({"ipo_name": {"$nin": names}}).deleted_count
+    print(f"✅ Rebuilt {len(ops)} IPO summaries ({removed} stale removed)")
+    return len(ops)
+
+
+def main(argv=None):
+    import argparse
+    from utils.db import get_db
+
+    parser = argparse.ArgumentParser(prog="python -m utils.summaries", description="Maintain ipo_summaries")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.parse_args(argv)
+
+    rebuild(get_db())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
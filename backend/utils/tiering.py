@@ -0,0 +1,237 @@
+"""
+Hot/cold tiering of old IPOs.
+
+IPOs listed more than ARCHIVE_AFTER_DAYS ago are moved to `ipos_archive`.
+Their `ipos` document keeps only HOT_FIELDS (what summaries, the
+calendar and live prices need) plus `archived: true`, so the raw HTML,
+trend arrays and analysis text of the whole history stop weighing on
+`ipos`.
+
+The archive copy is the complete document, except that HOT_FIELDS are
+authoritative in `ipos`. Scraper writes to an archived IPO go through
+store.save_ipo, which splits them before writing: the hot part goes to
+`ipos`, the rest only to the archive copy. Readers that need the complete documents
+(search, neighbours, export, /api/ipos?tiers=all) merge the tiers:
+
+    for ipo in tiering.find(db, {}, {"ipo_name": 1, "values.risks": 1}):
+        ...
+
+    cd backend
+    python -m utils.tiering run [--dry-run]
+    python -m utils.tiering stats
+    python -m utils.tiering restore "Example Ltd"
+"""
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+from utils import store, summaries, indexes
+from utils.metrics import current
+
+ARCHIVE_COLLECTION = "ipos_archive"
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "90"))
+
+# Fields that stay in `ipos` when an IPO is archived
+HOT_FIELDS = summaries.SOURCE_FIELDS + [
+    "url", "groww_url", "dates", "live", "values.symbol", "createdAt", "updatedAt",
+    "archived", "archivedAt",
+]
+
+# IPOs moved / merged per query
+BATCH = 200
+
+
+def is_hot(path):
+    return any(path == hot or path.startswith(hot + ".") for hot in HOT_FIELDS)
+
+
+def hot_part(doc, prefix=""):
+    """The HOT_FIELDS of a document (or of the sub-document at `prefix`)"""
+    part = {}
+    for hot in HOT_FIELDS:
+        if prefix and not hot.startswith(prefix + "."):
+            continue
+        path = hot[len(prefix) + 1:] if prefix else hot
+        value = store._get(doc, path)
+        if value is not None:
+            store._set(part, path, value)
+    return part
+
+
+def merge(cold, hot):
+    """The archive copy overlaid with the hot document"""
+    if cold is None:
+        return hot
+    merged = dict(cold)
+    for key, value in hot.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = merge(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+
+# ---------------- WRITES ----------------
+
+def hot_fields(fields):
+    """The part of a save_ipo $set that an archived IPO keeps in `ipos`"""
+    hot = {}
+    for path, value in fields.items():
+        if is_hot(path):
+            hot[path] = value
+        elif isinstance(value, dict) and any(hot_path.startswith(path + ".") for hot_path in HOT_FIELDS):
+            hot[path] = hot_part(value, path)
+    return hot
+
+
+def save_cold(collection, ipo_id, fields, paths):
+    """
+    Applies a save_ipo $set to the archive copy of an archived IPO.
+    Returns the archive copy's previous values of `paths`, for the
+    change log.
+    """
+    return indexes.collection(collection.database, ARCHIVE_COLLECTION).find_one_and_update(
+        {"_id": ipo_id}, {"$set": fields}, projection=store._projection(paths)
+    )
+
+
+def candidates(db, now=None, days=ARCHIVE_AFTER_DAYS):
+    """Ids of hot IPOs listed more than `days` ago"""
+    now = now or datetime.now(timezone.utc)
+    return [doc["_id"] for doc in db.ipos.find({
+        "dates.listing": {"$lte": now - timedelta(days=days)},
+        "archived": {"$ne": True},
+        "status": {"$ne": "open"},
+    }, {"_id": 1})]
+
+
+def archive(db, days=ARCHIVE_AFTER_DAYS, dry_run=False):
+    """Moves old IPOs to the archive; returns how many were moved"""
+    from pymongo import ReplaceOne
+
+    ids = candidates(db, days=days)
+    if dry_run:
+        print(f"📝 Dry run: would archive {len(ids)} IPOs")
+        return len(ids)
+
+    moved = 0
+    now = datetime.now(timezone.utc)
+    for i in range(0, len(ids), BATCH):
+        with current().phase("fetch"):
+            docs = list(db.ipos.find({"_id": {"$in": ids[i:i + BATCH]}}))
+        if not docs:
+            continue
+        started = time.perf_counter()
+        with current().phase("write"):
+            # Archive copy first: a crash in between leaves a complete hot document
+            indexes.collection(db, ARCHIVE_COLLECTION).bulk_write([
+                ReplaceOne({"_id": doc["_id"]}, doc, upsert=True) for doc in docs
+            ], ordered=False)
+            # Skipped if anything wrote to the IPO in between (scrapers stamp
+            # different timestamp fields, live prices none), so the guard is
+            # the whole fetched document; the next run archives it again
+            result = db.ipos.bulk_write([
+                ReplaceOne(
+                    {"_id": doc["_id"], "$expr": {"$eq": ["$$ROOT", {"$literal": doc}]}},
+                    dict(hot_part(doc), _id=doc["_id"], archived=True, archivedAt=now),
+                ) for doc in docs
+            ], ordered=False)
+        current().record_write(2 * len(docs), time.perf_counter() - started)
+        moved += result.modified_count
+
+    print(f"✅ Archived {moved} IPOs listed more than {days} days ago")
+    return moved
+
+
+def update():
+    """Archives old IPOs (worker job / end of a scrape cycle)"""
+    from utils.db import get_db
+
+    return archive(get_db())
+
+
+def restore(db, ipo_name):
+    """Moves an archived IPO back to `ipos` in full"""
+    hot = db.ipos.find_one({"ipo_name": ipo_name})
+    if not hot or not hot.get("archived"):
+        return False
+    doc = merge(db[ARCHIVE_COLLECTION].find_one({"_id": hot["_id"]}), hot)
+    doc.pop("archived", None)
+    doc.pop("archivedAt", None)
+    db.ipos.replace_one({"_id": hot["_id"]}, doc)
+    db[ARCHIVE_COLLECTION].delete_one({"_id": hot["_id"]})
+    return True
+
+
+# ---------------- READS ----------------
+
+def find(db, query=None, projection=None):
+    """
+    ipos documents matching `query` (which only sees HOT_FIELDS of
+    archived IPOs), with archived ones completed from the archive.
+    """
+    if projection is not None:
+        projection = dict(projection, archived=1)
+    batch = []
+    for doc in db.ipos.find(query or {}, projection).batch_size(BATCH):
+        batch.append(doc)
+        if len(batch) == BATCH:
+            yield from _complete(db, batch, projection)
+            batch = []
+    yield from _complete(db, batch, projection)
+
+
+def _complete(db, docs, projection):
+    ids = [doc["_id"] for doc in docs if doc.get("archived")]
+    if not ids:
+        return docs
+    cold = {doc["_id"]: doc for doc in db[ARCHIVE_COLLECTION].find({"_id": {"$in": ids}}, projection)}
+    return [merge(cold.get(doc["_id"]), doc) if doc.get("archived") else doc for doc in docs]
+
+
+def stats(db):
+    from pymongo.errors import OperationFailure
+
+    def collstats(name):
+        try:
+            return db.command("collstats", name)
+        except OperationFailure:
+            return {}  # not created yet
+
+    hot, cold = collstats("ipos"), collstats(ARCHIVE_COLLECTION)
+    return {
+        "hot_documents": hot.get("count", 0),
+        "hot_bytes": hot.get("size", 0),
+        "archived_documents": cold.get("count", 0),
+        "archived_bytes": cold.get("size", 0),
+    }
+
+
+def main(argv=None):
+    import argparse
+    from utils.db import get_db
+
+    parser = argparse.ArgumentParser(prog="python -m utils.tiering", description="Hot/cold tiering of old IPOs")
+    parser.add_argument("command", choices=["run", "stats", "restore"])
+    parser.add_argument("name", nargs="?", help="restore: IPO name")
+    parser.add_argument("--days", type=int, default=ARCHIVE_AFTER_DAYS, help="archive IPOs listed longer ago than this")
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args(argv)
+
+    db = get_db()
+    if args.command == "run":
+        archive(db, days=args.days, dry_run=args.dry_run)
+    elif args.command == "stats":
+        for key, value in stats(db).items():
+            print(f"{key}: {value}")
+    else:
+        if not restore(db, args.name):
+            print(f"❌ {args.name} is not archived")
+            return 1
+        print(f"✅ Restored {args.name}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,282 @@
+"""
+Record/replay transport under utils.http and the Selenium driver.
+
+    IPO_RADAR_TRANSPORT=passthrough   normal network access (default)
+    IPO_RADAR_TRANSPORT=record        also save every HTTP response, page
+                                      source and extraction-script result
+    IPO_RADAR_TRANSPORT=replay        serve them back from the archive, with
+                                      no network, browser or rate limiting
+
+The archive (IPO_RADAR_ARCHIVE) is a directory of gzipped JSON-lines
+files, one per recording process, so run_all and its scrapers can record
+into the same archive. Replay serves the responses for a request in the
+order they were recorded, optionally with latency (IPO_RADAR_REPLAY_LATENCY:
+seconds, or "recorded" for the original timings).
+
+    python -m scrapers chittorgarh --record            # logs/recordings/<ts>
+    python -m scrapers chittorgarh --replay logs/recordings/<ts> --dry-run
+"""
+import os
+import json
+import gzip
+import glob
+import socket
+import hashlib
+import threading
+from datetime import datetime
+
+from utils.metrics import LOG_DIR
+
+RECORDINGS_DIR = os.path.join(LOG_DIR, "recordings")
+
+
+class ReplayMissError(LookupError):
+    """The archive has no (more) recorded responses for this request"""
+
+
+def mode():
+    return os.getenv("IPO_RADAR_TRANSPORT", "passthrough")
+
+
+def recording():
+    return mode() == "record"
+
+
+def replaying():
+    return mode() == "replay"
+
+
+def archive_dir():
+    return os.getenv("IPO_RADAR_ARCHIVE") or os.path.join(RECORDINGS_DIR, "latest")
+
+
+def enable(new_mode, archive=None):
+    """Selects the mode for this process and the processes it starts"""
+    if new_mode == "record" and not archive:
+        archive = os.path.join(RECORDINGS_DIR, datetime.now().strftime("%Y%m%d_%H%M%S"))
+    os.environ["IPO_RADAR_TRANSPORT"] = new_mode
+    if archive:
+        os.environ["IPO_RADAR_ARCHIVE"] = os.path.abspath(archive)
+
+
+def add_arguments(parser):
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--record", nargs="?", const="", metavar="DIR",
+                       help="save all responses and page sources to an archive (default logs/recordings/<ts>)")
+    group.add_argument("--replay", metavar="DIR", help="serve responses from a recorded archive instead of the network")
+
+
+def enable_from_args(args):
+    if args.record is not None:
+        enable("record", args.record or None)
+        print(f"⏺️ Recording to {archive_dir()}")
+    elif args.replay:
+        enable("replay", args.replay)
+        print(f"⏯️ Replaying from {archive_dir()}")
+
+
+def script_key(script, args):
+    # Elements (click targets) are not serialisable and do not identify the call
+    return hashlib.sha1(
+        (script + json.dumps(args, default=lambda o: "<element>")).encode()
+    ).hexdigest()[:16]
+
+
+# ---------------- RECORD ----------------
+
+class Recorder:
+    def __init__(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{socket.gethostname()}-{os.getpid()}.jsonl.gz")
+        self.file = gzip.open(path, "at", encoding="utf-8")
+        self.lock = threading.Lock()
+
+    def write(self, entry):
+        with self.lock:
+            self.file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            # Sync-flush so a crashed run keeps what it recorded
+            self.file.flush()
+
+
+_recorder = None
+_recorder_lock = threading.Lock()
+
+
+def recorder():
+    global _recorder
+    with _recorder_lock:
+        if _recorder is None:
+            _recorder = Recorder(archive_dir())
+        return _recorder
+
+
+def record_http(method, url, response, elapsed):
+    import base64
+
+    recorder().write({
+        "kind": "http",
+        "key": f"{method} {url}",
+        "status": response.status_code,
+        "reason": response.reason,
+        "url": response.url,
+        "headers": dict(response.headers),
+        "encoding": response.encoding,
+        "elapsed": round(elapsed, 4),
+        "body": base64.b64encode(response.content).decode("ascii"),
+    })
+
+
+class RecordingDriver:
+    """Passes everything to the real driver and records what the scrapers read"""
+
+    def __init__(self, driver):
+        self._driver = driver
+        self._url = None
+
+    def __getattr__(self, name):
+        return getattr(self._driver, name)
+
+    def get(self, url):
+        import time
+
+        self._url = url
+        started = time.perf_counter()
+        self._driver.get(url)
+        recorder().write({"kind": "load", "key": url, "elapsed": round(time.perf_counter() - started, 4)})
+
+    @property
+    def page_source(self):
+        html = self._driver.page_source
+        recorder().write({"kind": "page", "key": self._url, "html": html})
+        return html
+
+    def execute_script(self, script, *args):
+        return self._record_script(self._driver.execute_script(script, *args), script, args)
+
+    def execute_async_script(self, script, *args):
+        return self._record_script(self._driver.execute_async_script(script, *args), script, args)
+
+    def _record_script(self, result, script, args):
+        try:
+            value = json.loads(json.dumps(result))
+        except TypeError:
+            value = None  # an element handle; scrapers only read JSON results
+        recorder().write({"kind": "script", "key": f"{self._url} {script_key(script, args)}", "result": value})
+        return result
+
+
+# ---------------- REPLAY ----------------
+
+class Archive:
+    """Recorded entries by (kind, key), served in recording order"""
+
+    def __init__(self, directory):
+        self.entries = {}
+        self.served = {}
+        self.lock = threading.Lock()
+        files = sorted(glob.glob(os.path.join(directory, "*.jsonl.gz")))
+        if not files:
+            raise FileNotFoundError(f"No recordings in {directory}")
+        for path in files:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # truncated last line of a crashed recording
+                    self.entries.setdefault((entry["kind"], entry["key"]), []).append(entry)
+
+    def next(self, kind, key):
+        """The next recorded entry; the last one repeats once they run out"""
+        with self.lock:
+            entries = self.entries.get((kind, key))
+            if not entries:
+                raise ReplayMissError(f"Not in the recording: {kind} {key}")
+            index = self.served.get((kind, key), 0)
+            self.served[(kind, key)] = index + 1
+            return entries[min(index, len(entries) - 1)]
+
+
+_archive = None
+_archive_lock = threading.Lock()
+
+
+def archive():
+    global _archive
+    with _archive_lock:
+        if _archive is None:
+            _archive = Archive(archive_dir())
+        return _archive
+
+
+def simulate_latency(entry):
+    import time
+
+    latency = os.getenv("IPO_RADAR_REPLAY_LATENCY", "0")
+    seconds = entry.get("elapsed", 0) if latency == "recorded" else float(latency)
+    if seconds:
+        time.sleep(seconds)
+
+
+def replay_http(method, url):
+    import base64
+    import requests
+    from requests.structures import CaseInsensitiveDict
+
+    entry = archive().next("http", f"{method} {url}")
+    simulate_latency(entry)
+
+    response = requests.Response()
+    response.status_code = entry["status"]
+    response.reason = entry.get("reason")
+    response.url = entry["url"]
+    response.headers = CaseInsensitiveDict(entry["headers"])
+    response.encoding = entry["encoding"]
+    response._content = base64.b64decode(entry["body"])
+    return response
+
+
+class ReplayElement:
+    """Stands in for elements the scrapers wait for and click"""
+
+    def is_displayed(self):
+        return True
+
+    def is_enabled(self):
+        return True
+
+
+class ReplayDriver:
+    """A driver that serves recorded pages and script results without a browser"""
+
+    def __init__(self):
+        self.current_url = None
+
+    def get(self, url):
+        self.current_url = url
+        try:
+            simulate_latency(archive().next("load", url))
+        except ReplayMissError:
+            pass
+
+    @property
+    def page_source(self):
+        return archive().next("page", self.current_url)["html"]
+
+    def execute_script(self, script, *args):
+        return archive().next("script", f"{self.current_url} {script_key(script, args)}")["result"]
+
+    execute_async_script = execute_script
+
+    def find_element(self, *args, **kwargs):
+        return ReplayElement()
+
+    def quit(self):
+        pass
+
+
+def wrap_driver(driver):
+    """The driver for the current mode (called by utils.browser.setup_driver)"""
+    if recording():
+        return RecordingDriver(driver)
+    return driver
@@ -0,0 +1,105 @@
+"""
+Persistent URL validity cache.
+
+Scrapers that guess detail URLs (Groww slugs built from company names)
+check each URL here before spending a browser visit on it. A URL is
+probed once with a plain HTTP request; the outcome is kept in the
+`url_checks` collection until it expires:
+
+    ok        the page exists (canonical = final URL after redirects)
+    missing   the site answered 404/410
+    empty     the page loaded but had nothing to scrape
+
+Expired entries are removed by a TTL index on `expires_at`.
+"""
+from datetime import datetime, timedelta, timezone
+
+from utils import http
+
+CACHE_COLLECTION = "url_checks"
+
+OK_TTL = timedelta(days=1)
+MISSING_TTL = timedelta(days=7)
+EMPTY_TTL = timedelta(hours=12)
+
+MISSING_STATUSES = {404, 410}
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0"
+}
+
+
+def now():
+    return datetime.now(timezone.utc)
+
+
+_indexed = False
+
+
+def ensure_indexes(collection):
+    # TTL index on expires_at, declared in utils/indexes.py
+    from utils import indexes
+    indexes.ensure_indexes(collection)
+
+
+def cache_for(collection):
+    """The url_checks collection in the same database as `collection` (None stays None)"""
+    global _indexed
+    if collection is None:
+        return None
+    cache = collection.database[CACHE_COLLECTION]
+    if not _indexed:
+        ensure_indexes(cache)
+        _indexed = True
+    return cache
+
+
+def remember(collection, url, state, canonical=None, ttl=OK_TTL):
+    if collection is None:
+        return
+    ts = now()
+    collection.update_one(
+        {"_id": url},
+        {"$set": {
+            "state": state,
+            "canonical": canonical or url,
+            "checked_at": ts,
+            "expires_at": ts + ttl,
+        }},
+        upsert=True
+    )
+
+
+def remember_empty(collection, url):
+    remember(collection, url, "empty", ttl=EMPTY_TTL)
+
+
+def probe(url):
+    """
+    Checks the URL without a browser: HEAD first, GET when the server
+    does not answer HEAD. Returns (state, canonical_url).
+    """
+    response = http.head(url, headers=HEADERS, timeout=10, allow_redirects=True)
+    if response.status_code in (403, 405, 501):
+        response = http.get(url, headers=HEADERS, timeout=10, allow_redirects=True)
+
+    if response.status_code in MISSING_STATUSES:
+        return "missing", url
+    response.raise_for_status()
+    return "ok", response.url
+
+
+def check(collection, url):
+    """
+    Returns (state, canonical_url) for the URL, probing it only when
+    there is no unexpired entry. `collection` may be None (dry runs):
+    the URL is then probed every time and nothing is stored.
+    """
+    if collection is not None:
+        cached = collection.find_one({"_id": url, "expires_at": {"$gt": now()}})
+        if cached:
+            return cached["state"], cached["canonical"]
+
+    state, canonical = probe(url)
+    remember(collection, url, state, canonical, MISSING_TTL if state == "missing" else OK_TTL)
+    return state, canonical
@@ -0,0 +1,342 @@
+"""
+IPO Radar resident worker.
+
+Keeps scrapers and notifiers loaded in one long-running Python process
+instead of spawning a fresh interpreter per job. The Mongo pool and a
+headless Chrome instance stay warm between runs.
+
+Usage:
+    python3 worker.py                 # start the worker
+    python3 worker.py run cycle       # ask a running worker to run a job
+    python3 worker.py status          # show queue / last results
+"""
+import os
+import sys
+import json
+import time
+import queue
+import socket
+import logging
+import importlib
+import threading
+import socketserver
+from datetime import datetime, timedelta, timezone
+from dotenv import load_dotenv
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(BACKEND_DIR)
+
+from utils.db import close_client
+
+load_dotenv()
+
+log_dir = os.path.join(BACKEND_DIR, 'logs')
+os.makedirs(log_dir, exist_ok=True)
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler(os.path.join(log_dir, f'worker_{datetime.now().strftime("%Y%m%d")}.log')),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger("worker")
+
+SOCKET_PATH = os.getenv("WORKER_SOCKET", os.path.join(log_dir, "worker.sock"))
+
+# Recycle Chrome after this many jobs to cap its memory growth
+BROWSER_MAX_USES = int(os.getenv("WORKER_BROWSER_MAX_USES", "10"))
+
+# job name -> (module, function, needs_browser). Modules are named from
+# backend/, as queue_worker and `python -m scrapers` import them, so a
+# process never holds two copies of a scraper (and of its limiter/session)
+PLUGINS = {
+    "chittorgarh": ("scrapers.chittorgarh_scraper", "main", False),
+    "investorgain": ("scrapers.investorgain_scraper", "main", True),
+    "sptulsian": ("scrapers.sptulsian_scraper", "main", False),
+    "groww": ("scrapers.groww_scraper", "main", True),
+    "notify_subscribers": ("notifications.notify_subscribers", "main", False),
+    "notify_admin": ("notifications.notify_admin", "send_scraper_summary", False),
+    "allotment_checker": ("notifications.allotment_checker", "main", False),
+    "staging_begin": ("utils.staging", "start_cycle", False),
+    "staging_publish": ("utils.staging", "publish_cycle", False),
+    "search_index": ("utils.search", "update", False),
+    "neighbors": ("utils.neighbors", "update", False),
+    "tiering": ("utils.tiering", "update", False),
+}
+
+# Composite jobs run their steps in order (mirrors run_all.py)
+PIPELINES = {
+    "cycle": ["staging_begin", "chittorgarh", "investorgain", "sptulsian", "groww", "staging_publish",
+              "search_index", "neighbors", "notify_subscribers", "allotment_checker", "tiering",
+              "notify_admin"],
+}
+
+# Daily run times in UTC (9 AM & 6 PM IST). Override with
+# WORKER_SCHEDULE="cycle=03:30,12:30;notify_subscribers=04:00"
+DEFAULT_SCHEDULE = {
+    "cycle": ["03:30", "12:30"],
+}
+
+
+def parse_schedule(spec):
+    """Parses a WORKER_SCHEDULE string into {job: ["HH:MM", ...]}"""
+    if not spec:
+        return dict(DEFAULT_SCHEDULE)
+
+    schedule = {}
+    for entry in spec.split(";"):
+        if "=" not in entry:
+            continue
+        job, times = entry.split("=", 1)
+        schedule[job.strip()] = [t.strip() for t in times.split(",") if t.strip()]
+    return schedule
+
+
+def next_run_after(now, hhmm):
+    hour, minute = (int(x) for x in hhmm.split(":"))
+    candidate = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if candidate <= now:
+        candidate += timedelta(days=1)
+    return candidate
+
+
+# ---------------- BROWSER POOL ----------------
+
+class BrowserPool:
+    """Keeps one headless Chrome alive across jobs"""
+
+    def __init__(self, max_uses=BROWSER_MAX_USES):
+        self.max_uses = max_uses
+        self.driver = None
+        self.uses = 0
+
+    def acquire(self):
+        if self.driver is not None and (self.uses >= self.max_uses or not self._alive()):
+            self.discard()
+
+        if self.driver is None:
+            setup_driver = load_plugin("scrapers.groww_scraper").setup_driver
+            logger.info("Starting headless Chrome")
+            self.driver = setup_driver()
+            self.uses = 0
+
+        self.uses += 1
+        return self.driver
+
+    def discard(self):
+        if self.driver is not None:
+            try:
+                self.driver.quit()
+            except Exception:
+                pass
+            self.driver = None
+
+    def _alive(self):
+        try:
+            self.driver.current_url
+            return True
+        except Exception:
+            return False
+
+
+# ---------------- PLUGINS ----------------
+
+_modules = {}
+
+
+def load_plugin(module_name):
+    """Imports a scraper/notifier module once and keeps it resident"""
+    if module_name not in _modules:
+        started = time.time()
+        _modules[module_name] = importlib.import_module(module_name)
+        logger.info(f"Loaded plugin {module_name} in {time.time() - started:.2f}s")
+    return _modules[module_name]
+
+
+# ---------------- WORKER ----------------
+
+class Worker:
+    def __init__(self, schedule):
+        self.schedule = schedule
+        self.jobs = queue.Queue()
+        self.pending = set()
+        self.running = None
+        self.last_results = {}
+        self.browsers = BrowserPool()
+        self.stopping = threading.Event()
+        self.lock = threading.Lock()
+
+    def submit(self, job):
+        if job not in PLUGINS and job not in PIPELINES:
+            return f"unknown job: {job}"
+
+        with self.lock:
+            if job in self.pending:
+                return f"already queued: {job}"
+            self.pending.add(job)
+        self.jobs.put(job)
+        return f"queued: {job}"
+
+    def status(self):
+        with self.lock:
+            return {
+                "running": self.running,
+                "queued": sorted(self.pending - {self.running}),
+                "last_results": self.last_results,
+                "browser_uses": self.browsers.uses,
+                "loaded_plugins": sorted(_modules),
+            }
+
+    def run_step(self, name):
+        module_name, func_name, needs_browser = PLUGINS[name]
+        func = getattr(load_plugin(module_name), func_name)
+
+        started = time.time()
+        try:
+            if needs_browser:
+                func(driver=self.browsers.acquire())
+            else:
+                func()
+            result = "ok"
+        except Exception as e:
+            logger.exception(f"{name} failed: {e}")
+            result = f"error: {e}"
+            if needs_browser:
+                # A crashed page can leave Chrome unusable; start fresh next time
+                self.browsers.discard()
+
+        duration = time.time() - started
+        logger.info(f"{name} finished in {duration:.2f}s ({result})")
+        self.last_results[name] = {
+            "result": result,
+            "duration": round(duration, 2),
+            "finished_at": datetime.now(timezone.utc).isoformat(),
+        }
+
+    def run_jobs(self):
+        while not self.stopping.is_set():
+            try:
+                job = self.jobs.get(timeout=1)
+            except queue.Empty:
+                continue
+
+            with self.lock:
+                self.running = job
+
+            logger.info(f"Running job {job}")
+            for step in PIPELINES.get(job, [job]):
+                if self.stopping.is_set():
+                    break
+                self.run_step(step)
+
+            with self.lock:
+                self.pending.discard(job)
+                self.running = None
+
+    def run_schedule(self):
+        upcoming = {}
+        while not self.stopping.is_set():
+            now = datetime.now(timezone.utc)
+            for job, times in self.schedule.items():
+                for hhmm in times:
+                    key = (job, hhmm)
+                    if key not in upcoming:
+                        upcoming[key] = next_run_after(now, hhmm)
+                    elif now >= upcoming[key]:
+                        logger.info(f"Scheduled run of {job} ({hhmm} UTC): {self.submit(job)}")
+                        upcoming[key] = next_run_after(now, hhmm)
+            self.stopping.wait(30)
+
+    def shutdown(self):
+        self.stopping.set()
+
+
+# ---------------- CONTROL SOCKET ----------------
+
+class ControlHandler(socketserver.StreamRequestHandler):
+    """
+    Line protocol:
+        run <job>   -> queues a job or pipeline
+        status      -> JSON status
+        jobs        -> available job names
+        search <q>  -> JSON [[ipo_id, ipo_name, score], ...] from the search index
+        stop        -> finishes the current step and exits
+    """
+
+    def handle(self):
+        worker = self.server.worker
+        line = self.rfile.readline().decode().strip()
+        command, _, arg = line.partition(" ")
+
+        if command == "run":
+            reply = worker.submit(arg.strip())
+        elif command == "status":
+            reply = json.dumps(worker.status())
+        elif command == "jobs":
+            reply = " ".join(sorted(list(PLUGINS) + list(PIPELINES)))
+        elif command == "search":
+            try:
+                reply = json.dumps(load_plugin("utils.search").search(arg.strip(), limit=20))
+            except Exception as e:
+                logger.exception(f"search failed: {e}")
+                reply = json.dumps({"error": str(e)})
+        elif command == "stop":
+            worker.shutdown()
+            reply = "stopping"
+        else:
+            reply = f"unknown command: {line}"
+
+        self.wfile.write((reply + "\n").encode())
+
+
+class ControlServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def send_command(command):
+    """Sends one command to a running worker and returns its reply"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(SOCKET_PATH)
+        sock.sendall((command + "\n").encode())
+        return sock.makefile().readline().strip()
+
+
+# ---------------- MAIN ----------------
+
+def serve():
+    worker = Worker(parse_schedule(os.getenv("WORKER_SCHEDULE")))
+
+    if os.path.exists(SOCKET_PATH):
+        os.remove(SOCKET_PATH)
+    server = ControlServer(SOCKET_PATH, ControlHandler)
+    server.worker = worker
+
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    threading.Thread(target=worker.run_schedule, daemon=True).start()
+    logger.info(f"Worker listening on {SOCKET_PATH} (schedule: {worker.schedule})")
+
+    try:
+        worker.run_jobs()
+    except KeyboardInterrupt:
+        worker.shutdown()
+    finally:
+        server.shutdown()
+        server.server_close()
+        if os.path.exists(SOCKET_PATH):
+            os.remove(SOCKET_PATH)
+        worker.browsers.discard()
+        close_client()
+        logger.info("Worker stopped")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        try:
+            print(send_command(" ".join(sys.argv[1:])))
+        except (FileNotFoundError, ConnectionRefusedError):
+            print(f"❌ No worker listening on {SOCKET_PATH}")
+            sys.exit(1)
+    else:
+        serve()